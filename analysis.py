@@ -1,8 +1,18 @@
+import argparse
+import concurrent.futures
+import constants
 import die_or_dare
 import inspect
-import jsonpickle
 import os
 
+COLUMN_NAMES = ('winner_class', 'loser_class', 'winner_alias', 'game_result',
+                'duel_index', 'winner_joker_value_strategy',
+                'loser_joker_value_strategy', 'winner_joker_position_strategy',
+                'loser_joker_position_strategy')
+EXTENSIONS = ('.json', constants.SNAPSHOT_FILE_EXTENSION,
+              constants.REPLAY_FILE_EXTENSION)
+MANIFEST_FILE_NAME = 'analysis_manifest.tsv'
+
 
 def stringify(argument):
     if argument is None:
@@ -17,48 +27,108 @@ def stringify(argument):
         raise Exception('This is not accepted')
 
 
-def main():
-    current_file_path = os.path.abspath(__file__)
-    current_directory_path = os.path.dirname(current_file_path)
-    directory_name = 'json'
-    input_directory_path = os.path.join(current_directory_path, directory_name)
-    output_file_name = 'analysis.csv'
-    output_file_path = os.path.join(input_directory_path, output_file_name)
-    with open(output_file_path, 'w') as output:
-        column_names = ('winner_class', 'loser_class', 'winner_alias',
-                        'game_result', 'duel_index',
-                        'winner_joker_value_strategy',
-                        'loser_joker_value_strategy',
-                        'winner_joker_position_strategy',
-                        'loser_joker_position_strategy')
-        output.write(','.join(column_names) + '\n')
-        for file_name in os.listdir(input_directory_path):
-            if file_name.endswith('.json'):
-                output_handler = die_or_dare.OutputHandler()
-                file_path = os.path.join(input_directory_path, file_name)
-                output_handler.import_from_json(file_path)
-                final_state = output_handler.states[-1]
-                game = jsonpickle.decode(final_state)
-                winner = game.winner
-                loser = game.loser
-                winner_class = winner.__class__
-                loser_class = loser.__class__
-                winner_alias = winner.alias
-                game_result = game.result.name
-                duel_index = game.duel_index
-                winner_joker_value_strategy = winner.joker_value_strategy
-                loser_joker_value_strategy = loser.joker_value_strategy
-                winner_joker_position_strategy = winner.joker_position_strategy
-                loser_joker_position_strategy = loser.joker_position_strategy
-                row = (winner_class, loser_class, winner_alias, game_result,
-                       duel_index, winner_joker_value_strategy,
-                       loser_joker_value_strategy,
-                       winner_joker_position_strategy,
-                       loser_joker_position_strategy)
-                row_str = (stringify(element) for element in row)
-                output.write(','.join(row_str) + '\n')
-    print('Done!')
+def to_row(file_path):
+    """Worker entry point; turns the final state of a file into a CSV line.
+    """
+    try:
+        game = die_or_dare.OutputHandler.load_final_game(file_path)
+    except Exception as exception:
+        return None, '{}: {}'.format(os.path.basename(file_path), exception)
+    winner = game.winner
+    loser = game.loser
+    winner_class = winner.__class__
+    loser_class = loser.__class__
+    winner_alias = winner.alias
+    game_result = game.result.name
+    duel_index = game.duel_index
+    winner_joker_value_strategy = winner.joker_value_strategy
+    loser_joker_value_strategy = loser.joker_value_strategy
+    winner_joker_position_strategy = winner.joker_position_strategy
+    loser_joker_position_strategy = loser.joker_position_strategy
+    row = (winner_class, loser_class, winner_alias, game_result, duel_index,
+           winner_joker_value_strategy, loser_joker_value_strategy,
+           winner_joker_position_strategy, loser_joker_position_strategy)
+    row_str = (stringify(element) for element in row)
+    return ','.join(row_str) + '\n', None
+
+
+def scan(input_directory_path):
+    """Yield (file name, (mtime, size)) of every saved game, lazily."""
+    with os.scandir(input_directory_path) as entries:
+        for entry in entries:
+            if entry.name.endswith(EXTENSIONS) and entry.is_file():
+                stat = entry.stat()
+                yield entry.name, (stat.st_mtime_ns, stat.st_size)
+
+
+def read_manifest(manifest_path):
+    """Map each analyzed file name to the (mtime, size) it had back then.
+
+    The manifest is an append-only log written along with the CSV rows, so an
+    interrupted run loses nothing; later lines override earlier ones.
+    """
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            for line in file:
+                file_name, mtime, size = line.rstrip('\n').rsplit('\t', 2)
+                manifest[file_name] = int(mtime), int(size)
+    return manifest
+
+
+def main(input_directory_path=None, output_file_path=None, max_workers=None,
+         full=False, chunk_size=64):
+    if input_directory_path is None:
+        current_file_path = os.path.abspath(__file__)
+        current_directory_path = os.path.dirname(current_file_path)
+        directory_name = 'json'
+        input_directory_path = os.path.join(current_directory_path,
+                                            directory_name)
+    if output_file_path is None:
+        output_file_name = 'analysis.csv'
+        output_file_path = os.path.join(input_directory_path, output_file_name)
+    manifest_path = os.path.join(input_directory_path, MANIFEST_FILE_NAME)
+    files = dict(scan(input_directory_path))
+    manifest = {} if full else read_manifest(manifest_path)
+    if not os.path.exists(output_file_path):
+        manifest = {}
+    # rows of files that changed or disappeared cannot be patched in place
+    if any(files.get(file_name) != stamp for file_name, stamp in
+           manifest.items()):
+        manifest = {}
+    new_files = [file_name for file_name in files if file_name not in manifest]
+    mode = 'a' if manifest else 'w'
+    num_rows = 0
+    with open(output_file_path, mode) as output, \
+            open(manifest_path, mode) as manifest_file, \
+            concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        if mode == 'w':
+            output.write(','.join(COLUMN_NAMES) + '\n')
+        file_paths = (os.path.join(input_directory_path, file_name) for
+                      file_name in new_files)
+        results = executor.map(to_row, file_paths, chunksize=chunk_size)
+        for file_name, (row, error) in zip(new_files, results):
+            if error is not None:
+                print('Skipped {}'.format(error))
+                continue
+            output.write(row)
+            mtime, size = files[file_name]
+            manifest_file.write('{}\t{}\t{}\n'.format(file_name, mtime, size))
+            num_rows += 1
+    print('Done! {} new games, {} already analyzed.'.format(
+        num_rows, len(manifest)))
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(
+        description='Summarize saved games into a CSV file.')
+    parser.add_argument('-i', '--input', help='directory of saved games',
+                        default=None)
+    parser.add_argument('-o', '--output', help='CSV file to write',
+                        default=None)
+    parser.add_argument('-w', '--workers', help='number of worker processes',
+                        type=int, default=None)
+    parser.add_argument('--full', action='store_true',
+                        help='analyze every file again')
+    args = parser.parse_args()
+    main(args.input, args.output, args.workers, args.full)
@@ -0,0 +1,338 @@
+import abc
+import argparse
+import asyncio
+import constants
+import die_or_dare
+import seeding
+import sys
+import time
+
+
+class InputSource(abc.ABC):
+    """Where the decisions of one player come from."""
+
+    def __init__(self, player):
+        self.player = player
+
+    @abc.abstractmethod
+    async def choose_deck(self, game, is_opponent):
+        """Return the index of the offense deck, or of the opponent's deck
+        when choosing the defense deck.
+        """
+
+    @abc.abstractmethod
+    async def shout(self, game, in_turn):
+        """Return the action of the player in the current round."""
+
+
+class ComputerSource(InputSource):
+    async def choose_deck(self, game, is_opponent):
+        opponent = game.duel_ongoing.defense
+        if is_opponent:
+            deck = self.player.decide_defense_deck(opponent.decks,
+                                                   opponent.num_victory,
+                                                   opponent.num_shout_die,
+                                                   self.player.deck_in_duel)
+        else:
+            deck = self.player.decide_offense_deck(opponent.decks,
+                                                   opponent.num_victory,
+                                                   opponent.num_shout_die)
+        return deck.index
+
+    async def shout(self, game, in_turn):
+        duel = game.duel_ongoing
+        opponent = duel.defense if in_turn else duel.offense
+        shout = self.player.shout(opponent.decks, opponent.num_victory,
+                                  opponent.num_shout_die, duel.round_, in_turn)
+        return shout.action
+
+
+class Console(object):
+    """Lines typed into stdin, handed to every human player who listens."""
+
+    def __init__(self):
+        self._queues = []
+        self._transport = None
+        self._task = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        self._transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        self._task = asyncio.ensure_future(self._read(reader))
+        return self
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._transport is not None:
+            self._transport.close()
+
+    def listen(self):
+        queue = asyncio.Queue()
+        self._queues.append(queue)
+        return queue
+
+    async def _read(self, reader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            for queue in self._queues:
+                queue.put_nowait(line.decode().rstrip('\n'))
+
+    @staticmethod
+    def write(text):
+        print(constants.INDENT + text, flush=True)
+
+
+class HumanSource(InputSource):
+    """A human at the terminal; both humans may share it since their keys
+    differ.
+    """
+
+    def __init__(self, player, console):
+        super().__init__(player)
+        self.console = console
+        self._lines = console.listen()
+
+    async def _next_line(self, prompt):
+        while not self._lines.empty():  # typed before the question was asked
+            self._lines.get_nowait()
+        self.console.write(prompt)
+        return await self._lines.get()
+
+    async def choose_deck(self, game, is_opponent):
+        duel = game.duel_ongoing
+        decks = duel.defense.decks if is_opponent else self.player.decks
+        choices = [deck.index for deck in decks if deck.is_undisclosed()]
+        possessive = "your opponent's" if is_opponent else 'your'
+        prompt = '{}, choose one of {} decks. (Enter the deck number): '.format(
+            self.player.name, possessive)
+        while True:
+            line = await self._next_line(prompt)
+            try:
+                index = int(line) - 1
+            except ValueError:
+                index = None
+            if index in choices:
+                return index
+            choices_str = ', '.join(str(index + 1) for index in choices)
+            self.console.write('Enter a number among {}.'.format(choices_str))
+
+    async def shout(self, game, in_turn):
+        valid_actions = self.player.valid_actions(game.duel_ongoing.round_)
+        key_to_action = {key: action for action, key in
+                         self.player.key_settings.items() if
+                         action in valid_actions}
+        keys_settings_in_list = ['{}: \'{}\''.format(action.name, key) for
+                                 key, action in key_to_action.items()]
+        if None in valid_actions:
+            keys_settings_in_list.append('Pass: \'Enter\'')
+        prompt = '{}, what will you do? ({})'.format(
+            self.player.name, ', '.join(keys_settings_in_list))
+        while True:
+            line = await self._next_line(prompt)
+            for char in line:
+                if char in key_to_action:
+                    return key_to_action[char]
+            if None in valid_actions and not line.strip():
+                return None
+
+
+class Renderer(object):
+    """Draw the frames of a game in a task of its own.
+
+    Frames are snapshots restored into a private copy of the game, so the
+    game itself can move on while a frame is still being drawn.
+    """
+
+    def __init__(self, game):
+        players = die_or_dare.OutputHandler.describe_players(game)
+        self._game = die_or_dare.OutputHandler.build_game(players)
+        self._frames = asyncio.Queue()
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    def show(self, game=None, message=''):
+        snapshot = None if game is None else game.snapshot()
+        self._frames.put_nowait((snapshot, message))
+
+    async def close(self):
+        await self._frames.join()
+        self._task.cancel()
+
+    async def _run(self):
+        while True:
+            snapshot, message = await self._frames.get()
+            try:
+                if snapshot is None:
+                    die_or_dare.OutputHandler.display(message=message)
+                else:
+                    self._game.restore(snapshot)
+                    die_or_dare.OutputHandler.display(self._game, message)
+            finally:
+                self._frames.task_done()
+
+
+async def wait(duration, time_scale=1.):
+    """Awaitable version of the pauses of constants.Duration."""
+    await asyncio.sleep((duration or 0) * time_scale)
+
+
+async def choose_deck(game, sources, is_opponent):
+    duel = game.duel_ongoing
+    # Skip choosing deck in the last duel
+    if game.duel_index == constants.DECK_PER_PILE - 1:
+        player = duel.defense if is_opponent else duel.offense
+        return player.undisclosed_decks()[0].index
+    # the offense chooses both decks
+    return await sources[duel.offense].choose_deck(game, is_opponent)
+
+
+async def gather_shouts(game, sources, timeout):
+    """Ask both players at once and keep what is shouted within timeout."""
+    duel = game.duel_ongoing
+    tasks = []
+    for player in duel.players:
+        in_turn = player == duel.offense
+        tasks.append(asyncio.ensure_future(sources[player].shout(game,
+                                                                 in_turn)))
+    await asyncio.wait(tasks, timeout=timeout)
+    shouts = []
+    for player, task in zip(duel.players, tasks):
+        if task.done():
+            shouts.append(die_or_dare.Shout(player, task.result()))
+        else:
+            task.cancel()
+    return die_or_dare.ShoutInput(shouts)
+
+
+async def accept(game, sources):
+    """Asynchronous counterpart of Game.accept."""
+    duel = game.duel_ongoing
+    if duel.offense.deck_in_duel is None:
+        index = await choose_deck(game, sources, False)
+        return die_or_dare.OffenseDeckIndexInput(index)
+    elif duel.defense.deck_in_duel is None:
+        index = await choose_deck(game, sources, True)
+        return die_or_dare.DefenseDeckIndexInput(index)
+    elif duel.round_ in (1, 2):
+        return await gather_shouts(game, sources, constants.Duration.ACTION)
+    elif duel.round_ == 3:
+        return await gather_shouts(game, sources,
+                                   constants.Duration.FINAL_ACTION)
+    else:
+        raise ValueError('Invalid.')
+
+
+async def play(game, sources, renderer=None, time_scale=1., replay_log=None):
+    """Play a prepared game; sources maps each player to an InputSource.
+
+    Pauses are scaled by time_scale (0 to skip them), while the time given
+    to shout is not. Many games can be played on one event loop at once.
+    """
+    while not game.is_over():
+        duel = game.to_next_duel()
+        while not duel.is_over():
+            message, duration = game.prepare()
+            if renderer is not None:
+                renderer.show(game, message)
+            await wait(duration, time_scale)
+            user_input = await accept(game, sources)
+            if replay_log is None:
+                message, duration = game.process(user_input)
+            else:
+                message, duration = replay_log.process(game, user_input)
+            if renderer is not None:
+                renderer.show(game, message)
+            await wait(duration, time_scale)
+    return game
+
+
+async def play_tables(games, suppress_output=False, time_scale=1.):
+    console = None
+    if any(isinstance(player, die_or_dare.HumanPlayer) for game in games for
+           player in game.players):
+        console = await Console().start()
+    coroutines = []
+    renderers = []
+    for game in games:
+        sources = {}
+        for player in game.players:
+            if isinstance(player, die_or_dare.HumanPlayer):
+                sources[player] = HumanSource(player, console)
+            else:
+                sources[player] = ComputerSource(player)
+        renderer = None
+        if not suppress_output:
+            renderer = Renderer(game).start()
+            renderers.append(renderer)
+            message = "Let's start DieOrDare!\nHere we go!"
+            renderer.show(message=message)
+        coroutines.append(play(game, sources, renderer, time_scale))
+    try:
+        return await asyncio.gather(*coroutines)
+    finally:
+        for renderer in renderers:
+            await renderer.close()
+        if console is not None:
+            console.close()
+
+
+def main(num_human_players=0, num_games=1, suppress_output=False,
+         time_scale=1., seed=None):
+    if num_human_players and num_games > 1:
+        raise ValueError('Humans can only sit at one table.')
+    seed_stream = seeding.SeedStream(seed)
+    orders = seed_stream.shuffle_orders(num_games)
+    games = []
+    for game_index, rngs in enumerate(seed_stream.rngs(num_games, 3)):
+        game_rng, rng1, rng2 = rngs
+        if num_human_players == 2:
+            player1 = die_or_dare.HumanPlayer('Player 1, enter your name: ',
+                                              rng=rng1)
+            player2 = die_or_dare.HumanPlayer('Player 2, enter your name: ',
+                                              player1.name, rng=rng2)
+        elif num_human_players == 1:
+            player1 = die_or_dare.HumanPlayer('Player 1, enter your name: ',
+                                              rng=rng1)
+            player2 = die_or_dare.ComputerPlayer(player1.name, rng=rng2)
+        elif num_human_players == 0:
+            player1 = die_or_dare.ComputerPlayer(rng=rng1)
+            player2 = die_or_dare.ComputerPlayer(player1.name, rng=rng2)
+        else:
+            raise Exception('Invalid number of human players')
+        player_red, player_black = die_or_dare.RandomPlayerOrder(
+            player1, player2, game_rng).players
+        game = die_or_dare.Game(player_red, player_black)
+        game.distribute_piles()
+        game.build_decks(orders[game_index])
+        games.append(game)
+    start = time.perf_counter()
+    asyncio.run(play_tables(games, suppress_output, time_scale))
+    elapsed = time.perf_counter() - start
+    if suppress_output:
+        print('{} games in {:.3f} seconds'.format(num_games, elapsed))
+    return games
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Play games on an asyncio event loop.')
+    parser.add_argument('--humans', help='number of human players',
+                        type=int, choices=[0, 1, 2], default=1)
+    parser.add_argument('-q', '--quiet', help='suppress command-line output',
+                        action='store_true')
+    parser.add_argument('-n', '--games', help='number of games to play at once',
+                        type=int, default=1)
+    parser.add_argument('-t', '--time-scale', help='factor of every pause',
+                        type=float, default=1.)
+    parser.add_argument('-s', '--seed', help='master seed of the games',
+                        type=int, default=None)
+    args = parser.parse_args()
+    main(args.humans, args.games, args.quiet, args.time_scale, args.seed)
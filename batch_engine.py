@@ -0,0 +1,526 @@
+import argparse
+import collections
+import constants
+import die_or_dare
+import numpy
+import odds
+import seeding
+import time
+
+# values of a pile by index: the joker first (no value until the joker value
+# strategy gives it one), then every rank of both suits (see RedPile)
+PILE_VALUES = numpy.array([0] + [rank.value for rank in constants.Rank] * 2,
+                          dtype=numpy.int8)
+JOKER_FLAG = 16  # a card is its value | JOKER_FLAG while the decks are built
+VALUE_BITS = JOKER_FLAG - 1
+NUM_VALUES = len(constants.Rank) + 1  # 0 to 13
+CHUNK_SIZE = 1 << 16
+UNDISCLOSED, IN_DUEL, FINISHED = (state.value for state in
+                                  constants.DeckState)
+NO_SHOUT = 0
+DARE, DIE, DONE, DRAW = (action.value for action in constants.Action)
+ALL_VALUES = die_or_dare.Decks.ALL_VALUES
+
+BatchResult = collections.namedtuple(
+    'BatchResult', ('winner', 'result', 'duel_index', 'num_victory',
+                    'num_shout_die'))
+
+
+def deal(orders):
+    """Return the cards of the decks built from the pile orders of
+    SeedStream.shuffle_orders, shaped (games, 2, decks, cards), in the order
+    Player.build_decks takes them off the pile.
+    """
+    codes = numpy.where(orders == 0, JOKER_FLAG, PILE_VALUES[orders])
+    return codes[..., ::-1].reshape(orders.shape[:-1] + (
+        constants.DECK_PER_PILE, constants.CARD_PER_DECK)).astype(numpy.int8)
+
+
+def _swap(cards, i, j, where):
+    rows = numpy.flatnonzero(where)
+    i, j = i[rows], j[rows]
+    first = cards[rows, i]
+    cards[rows, i] = cards[rows, j]
+    cards[rows, j] = first
+
+
+def _joker(cards):
+    """Return the values, which card is the joker, whether there is one and
+    the values of the other cards (-1 for the joker) of rows of decks.
+    """
+    values = cards & VALUE_BITS
+    is_joker = cards >= JOKER_FLAG
+    others = numpy.where(is_joker, -1, values)
+    return values, is_joker, is_joker.any(axis=-1), others
+
+
+def _set_joker_value(cards, joker_values):
+    is_joker = cards >= JOKER_FLAG
+    return numpy.where(is_joker, JOKER_FLAG | joker_values[:, None], cards)
+
+
+# Vectorized joker value strategies: rows of 3 cards -> rows of 3 cards
+
+
+def thirteen(cards, rng):
+    return _set_joker_value(cards, numpy.full(len(cards), len(
+        constants.Rank)))
+
+
+def same_as_max(cards, rng):
+    _, _, _, others = _joker(cards)
+    return _set_joker_value(cards, others.max(axis=-1))
+
+
+def random_number(cards, rng):
+    return _set_joker_value(cards, rng.integers(1, len(constants.Rank) + 1,
+                                                len(cards)))
+
+
+def next_biggest(cards, rng):
+    _, is_joker, _, others = _joker(cards)
+    biggest = others.max(axis=-1)
+    smallest = numpy.where(is_joker, NUM_VALUES, others).min(axis=-1)
+    values = numpy.where(smallest == biggest - 1, biggest - 2, biggest - 1)
+    values = numpy.where(biggest == 2, 3 - smallest, values)
+    values = numpy.where(biggest == 1, 1, values)
+    return _set_joker_value(cards, values)
+
+
+# Vectorized joker position strategies, in place
+
+
+def joker_anywhere(cards, rng):
+    values = cards & VALUE_BITS
+    zeros = numpy.zeros(len(cards), dtype=numpy.intp)
+    _swap(cards, zeros, values.argmax(axis=-1), numpy.ones(len(cards), bool))
+    return cards
+
+
+def joker_first(cards, rng):
+    joker_anywhere(cards, rng)
+    values, is_joker, has_joker, others = _joker(cards)
+    joker_index = is_joker.argmax(axis=-1)
+    joker_value = values[numpy.arange(len(cards)), joker_index]
+    biggest = others.max(axis=-1)
+    _swap(cards, numpy.zeros_like(joker_index), joker_index,
+          has_joker & (joker_value == biggest))
+    _swap(cards, numpy.ones_like(joker_index), joker_index,
+          has_joker & (joker_value < biggest))
+    return cards
+
+
+def joker_last(cards, rng):
+    joker_anywhere(cards, rng)
+    values, is_joker, has_joker, others = _joker(cards)
+    joker_value = values[numpy.arange(len(cards)), is_joker.argmax(axis=-1)]
+    zeros = numpy.zeros(len(cards), dtype=numpy.intp)
+    _swap(cards, zeros, others.argmax(axis=-1),
+          has_joker & (joker_value <= others.max(axis=-1)))
+    joker_index = (cards >= JOKER_FLAG).argmax(axis=-1)
+    _swap(cards, numpy.full_like(joker_index, constants.CARD_PER_DECK - 1),
+          joker_index, has_joker)
+    return cards
+
+
+class BatchGames(object):
+    """Many games as arrays, advanced in lockstep one duel at a time.
+
+    Seat 0 is Player Red and seat 1 Player Black. Card arrays are shaped
+    (games, seats, decks, cards); the decks of a player are sorted by their
+    delegates as in Player.build_decks, and opened[g, s, d] is the number of
+    open cards of a deck, which are always the first ones.
+    """
+
+    def __init__(self, cards):
+        num_games = len(cards)
+        self.values = (cards & VALUE_BITS).astype(numpy.int8)
+        self.is_joker = cards >= JOKER_FLAG
+        self.bits = (1 << (self.values.astype(numpy.int32) - 1))
+        # value codes of Decks.hidden_counts: the joker is 0
+        self.codes = numpy.where(self.is_joker, 0, self.values)
+        shape = num_games, 2, constants.DECK_PER_PILE
+        self.states = numpy.full(shape, UNDISCLOSED, dtype=numpy.int8)
+        self.opened = numpy.ones(shape, dtype=numpy.int8)
+        self.in_duel = numpy.zeros((num_games, 2), dtype=numpy.intp)
+        # copies of the cards of the decks in duel, and their open cards
+        self.values_in_duel = numpy.zeros(
+            (num_games, 2, constants.CARD_PER_DECK), dtype=numpy.int8)
+        self.opened_in_duel = numpy.zeros((num_games, 2), dtype=numpy.int8)
+        self.live = numpy.ones(num_games, dtype=bool)  # duels going on
+        self.disclosed_mask = numpy.zeros((num_games, 2), dtype=numpy.int32)
+        self.num_victory = numpy.zeros((num_games, 2), dtype=numpy.int8)
+        self.num_shout_die = numpy.zeros((num_games, 2), dtype=numpy.int8)
+        self.num_shout_draw = numpy.zeros((num_games, 2), dtype=numpy.int8)
+        self.num_shout_done = numpy.zeros((num_games, 2), dtype=numpy.int8)
+        self.over = numpy.zeros(num_games, dtype=bool)
+        self.winner = numpy.full(num_games, -1, dtype=numpy.int8)
+        self.result = numpy.zeros(num_games, dtype=numpy.int8)
+        self.duel_index = numpy.full(num_games, -1, dtype=numpy.int8)
+        self.duel_states = numpy.full(
+            (num_games, constants.DECK_PER_PILE),
+            constants.DuelState.UNSTARTED.value, dtype=numpy.int8)
+        self.duel_winners = numpy.full((num_games, constants.DECK_PER_PILE),
+                                       -1, dtype=numpy.int8)
+        self.rows = numpy.arange(num_games)
+        # unopened cards per seat and value code, as in Decks.hidden_counts
+        bins = (numpy.arange(num_games * 2)[:, None] * NUM_VALUES +
+                self.codes[..., 1:].reshape(num_games * 2, -1))
+        self.hidden = numpy.bincount(
+            bins.ravel(), minlength=num_games * 2 * NUM_VALUES).reshape(
+            num_games, 2, NUM_VALUES).astype(numpy.int8)
+
+    @classmethod
+    def build(cls, orders, joker_strategies, rng):
+        """Deal and build the decks of every game.
+
+        joker_strategies holds the vectorized (value, position) strategies
+        of Player Red and Player Black.
+        """
+        cards = deal(orders)
+        for seat, (value_strategy, position_strategy) in enumerate(
+                joker_strategies):
+            decks = cards[:, seat].reshape(-1, constants.CARD_PER_DECK)
+            decks = value_strategy(decks, rng)
+            decks = position_strategy(decks, rng)
+            cards[:, seat] = decks.reshape(cards[:, seat].shape)
+        delegates = cards[..., 0] & VALUE_BITS
+        order = numpy.argsort(delegates, axis=-1, kind='stable')
+        cards = numpy.take_along_axis(cards, order[..., None], axis=2)
+        return cls(cards)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def undisclosed(self, seat):
+        return self.states[:, seat] == UNDISCLOSED
+
+    def deck_in_duel(self, seat, rows=None):
+        """Values and open flags of the cards of the decks in duel."""
+        if rows is None:
+            rows = slice(None)
+        opened = self.opened_in_duel[rows, seat]
+        is_open = numpy.arange(constants.CARD_PER_DECK) < opened[:, None]
+        return self.values_in_duel[rows, seat], is_open
+
+    def hidden_counts(self, seat, rows):
+        """Per-value counts of the hidden cards of a seat that may be in its
+        deck in duel, counting the joker as the delegate (see odds._side).
+        """
+        delegates = self.values_in_duel[rows, seat, 0]
+        hidden = self.hidden[rows, seat]
+        counts = numpy.where(numpy.arange(NUM_VALUES) <= delegates[:, None],
+                             hidden, 0).astype(float)
+        counts[numpy.arange(len(rows)), delegates] += hidden[:, 0]
+        counts[:, 0] = 0.
+        return counts
+
+    def chances(self, seat, rows):
+        """Vectorized ComputerPlayer.get_chances of a seat in the given
+        games.
+        """
+        values_me, is_open_me = self.deck_in_duel(seat, rows)
+        values_opponent, is_open_opponent = self.deck_in_duel(1 - seat, rows)
+        num_to_open = constants.CARD_PER_DECK - is_open_me.sum(axis=1)
+        odds_win, odds_draw, odds_lose = odds.batch_odds(
+            (values_me * is_open_me).sum(axis=1),
+            self.hidden_counts(seat, rows),
+            (values_opponent * is_open_opponent).sum(axis=1),
+            self.hidden_counts(1 - seat, rows), num_to_open)
+        return (numpy.round(odds_win, 3), numpy.round(odds_draw, 3),
+                numpy.round(odds_lose, 3))
+
+    def enter_duel(self, seat, decks, live):
+        rows = self.rows[live]
+        decks = decks[live]
+        self.in_duel[rows, seat] = decks
+        self.values_in_duel[rows, seat] = self.values[rows, seat, decks]
+        self.opened_in_duel[rows, seat] = 1
+        self.states[rows, seat, decks] = IN_DUEL
+        self.disclosed_mask[rows, seat] |= self.bits[rows, seat, decks, 0]
+
+    def open_next_cards(self, live):
+        rows = self.rows[live]
+        for seat in 0, 1:
+            decks = self.in_duel[rows, seat]
+            card_indexes = self.opened[rows, seat, decks]
+            self.opened[rows, seat, decks] += 1
+            self.opened_in_duel[rows, seat] += 1
+            self.hidden[rows, seat, self.codes[rows, seat, decks,
+                                               card_indexes]] -= 1
+            self.disclosed_mask[rows, seat] |= self.bits[rows, seat, decks,
+                                                         card_indexes]
+
+    def finish_duel(self, ended):
+        rows = self.rows[ended]
+        for seat in 0, 1:
+            decks = self.in_duel[rows, seat]
+            opened = self.opened[rows, seat, decks]
+            for card_index in range(1, constants.CARD_PER_DECK):
+                hidden = opened <= card_index
+                self.hidden[rows[hidden], seat,
+                            self.codes[rows[hidden], seat, decks[hidden],
+                                       card_index]] -= 1
+            self.states[rows, seat, decks] = FINISHED
+            self.opened[rows, seat, decks] = constants.CARD_PER_DECK
+            self.opened_in_duel[rows, seat] = constants.CARD_PER_DECK
+            self.disclosed_mask[rows, seat] |= numpy.bitwise_or.reduce(
+                self.bits[rows, seat, decks], axis=-1)
+
+    def _end_games(self, ended, seat, result):
+        self.over |= ended
+        self.winner[ended] = seat
+        self.result[ended] = result.value
+
+    def process_shouts(self, shouts, offense, round_, live, duel_index):
+        """Vectorized Game.process_shout: done > die > draw > dare, then
+        offense > defense. Returns which duels go on to the next round.
+        """
+        defense = 1 - offense
+        shout_offense, shout_defense = shouts[offense], shouts[defense]
+        duel_states = self.duel_states[:, duel_index]
+        # done
+        is_done = self.disclosed_mask == ALL_VALUES
+        done_offense = live & (shout_offense == DONE)
+        self.num_shout_done[:, offense] += done_offense
+        correct_offense = done_offense & is_done[:, offense]
+        done_defense = live & ~correct_offense & (shout_defense == DONE)
+        self.num_shout_done[:, defense] += done_defense
+        correct_defense = done_defense & is_done[:, defense]
+        for seat, correct in ((offense, correct_offense),
+                              (defense, correct_defense)):
+            self._end_games(correct, seat, constants.GameResult.DONE)
+            duel_states[correct] = (
+                constants.DuelState.ABORTED_BY_CORRECT_DONE.value)
+        ended = correct_offense | correct_defense
+        live = live & ~ended
+        # die
+        if round_ in (1, 2):
+            can_die = self.num_shout_die < constants.MAX_DIE
+            die_offense = live & (shout_offense == DIE) & can_die[:, offense]
+            die_defense = (live & ~die_offense & (shout_defense == DIE) &
+                           can_die[:, defense])
+            self.num_shout_die[:, offense] += die_offense
+            self.num_shout_die[:, defense] += die_defense
+            died = die_offense | die_defense
+            duel_states[died] = constants.DuelState.DIED.value
+            self.finish_duel(ended | died)
+            return live & ~died
+        # draw
+        values_offense, _ = self.deck_in_duel(offense)
+        values_defense, _ = self.deck_in_duel(defense)
+        sum_offense = values_offense.sum(axis=1, dtype=numpy.int16)
+        sum_defense = values_defense.sum(axis=1, dtype=numpy.int16)
+        is_drawn = sum_offense == sum_defense
+        can_draw = self.num_shout_draw < constants.MAX_DRAW
+        draw_offense = live & (shout_offense == DRAW) & can_draw[:, offense]
+        self.num_shout_draw[:, offense] += draw_offense
+        point_offense = draw_offense & is_drawn
+        draw_defense = (live & ~point_offense & (shout_defense == DRAW) &
+                        can_draw[:, defense])
+        self.num_shout_draw[:, defense] += draw_defense
+        point_defense = draw_defense & is_drawn
+        duel_states[point_offense | point_defense] = (
+            constants.DuelState.DRAWN.value)
+        # compare the sums
+        rest = live & ~point_offense & ~point_defense
+        point_offense |= rest & (sum_offense > sum_defense)
+        point_defense |= rest & (sum_offense <= sum_defense)
+        duel_states[rest] = numpy.where(is_drawn[rest],
+                                        constants.DuelState.DRAWN.value,
+                                        constants.DuelState.FINISHED.value)
+        for seat, point in ((offense, point_offense),
+                            (defense, point_defense)):
+            self.num_victory[:, seat] += point
+            self.duel_winners[point, duel_index] = seat
+            self._end_games(point & (self.num_victory[:, seat] ==
+                                     constants.REQUIRED_WIN), seat,
+                            constants.GameResult.FINISHED)
+        self.finish_duel(ended | live)
+        return numpy.zeros_like(live)
+
+    def play(self, strategies, rng):
+        """Play every game to the end.
+
+        strategies holds the vectorized (offense deck, defense deck, action
+        choice) strategies of Player Red and Player Black.
+        """
+        for duel_index in range(constants.DECK_PER_PILE):
+            live = ~self.over
+            if not live.any():
+                break
+            self.live = live
+            self.duel_index[live] = duel_index
+            self.duel_states[live, duel_index] = (
+                constants.DuelState.ONGOING.value)
+            offense = duel_index % 2  # Player Red leads the even duels
+            defense = 1 - offense
+            offense_strategy, defense_strategy, _ = strategies[offense]
+            if duel_index == constants.DECK_PER_PILE - 1:
+                offense_decks = self.undisclosed(offense).argmax(axis=1)
+                defense_decks = self.undisclosed(defense).argmax(axis=1)
+            else:
+                offense_decks = offense_strategy(self, offense, rng)
+                defense_decks = defense_strategy(self, offense, offense_decks,
+                                                 rng)
+            self.enter_duel(offense, offense_decks, live)
+            self.enter_duel(defense, defense_decks, live)
+            for round_ in 2, 3:
+                self.open_next_cards(live)
+                shouts = [strategies[seat][2](self, seat, round_,
+                                              seat == offense, rng) for
+                          seat in (0, 1)]
+                live = self.process_shouts(shouts, offense, round_, live,
+                                           duel_index)
+                self.live = live
+        return self
+
+
+# Vectorized deck choice strategies: (games, seat of the offense, ...) -> decks
+
+
+def biggest_offense_deck(games, me, rng):
+    undisclosed = games.undisclosed(me)
+    return constants.DECK_PER_PILE - 1 - undisclosed[:, ::-1].argmax(axis=1)
+
+
+def any_offense_deck(games, me, rng):
+    keys = rng.random((len(games), constants.DECK_PER_PILE))
+    return numpy.where(games.undisclosed(me), keys, -1.).argmax(axis=1)
+
+
+def smallest_defense_deck(games, me, offense_decks, rng):
+    return games.undisclosed(1 - me).argmax(axis=1)
+
+
+def any_defense_deck(games, me, offense_decks, rng):
+    keys = rng.random((len(games), constants.DECK_PER_PILE))
+    return numpy.where(games.undisclosed(1 - me), keys, -1.).argmax(axis=1)
+
+
+# Vectorized action choice strategies: (games, seat, round, in turn) -> shouts
+
+
+def simple_action_choice(games, me, round_, in_turn, rng):
+    if round_ == 3:
+        values_me, _ = games.deck_in_duel(me)
+        values_opponent, _ = games.deck_in_duel(1 - me)
+        shouts = numpy.where(values_me.sum(axis=1) ==
+                             values_opponent.sum(axis=1), DRAW, NO_SHOUT)
+    else:
+        # the odds only matter to the games that are on and can still die
+        rows = numpy.flatnonzero(
+            games.live & (games.num_shout_die[:, me] < constants.MAX_DIE) &
+            (games.disclosed_mask[:, me] != ALL_VALUES))
+        odds_win, odds_draw, odds_lose = games.chances(me, rows)
+        if in_turn:
+            odds_lose = odds_lose + odds_draw
+        else:
+            odds_win = odds_win + odds_draw
+        dies = (odds_lose > odds_win + .1) & (rng.random(len(rows)) < .7)
+        shouts = numpy.full(len(games), DARE)
+        shouts[rows[dies]] = DIE
+    return numpy.where(games.disclosed_mask[:, me] == ALL_VALUES, DONE,
+                       shouts)
+
+
+VECTORIZED_STRATEGIES = {
+    die_or_dare.Thirteen: thirteen,
+    die_or_dare.SameAsMax: same_as_max,
+    die_or_dare.RandomNumber: random_number,
+    die_or_dare.NextBiggest: next_biggest,
+    die_or_dare.JokerFirst: joker_first,
+    die_or_dare.JokerLast: joker_last,
+    die_or_dare.JokerAnywhere: joker_anywhere,
+    die_or_dare.BiggestOffenseDeck: biggest_offense_deck,
+    die_or_dare.AnyOffenseDeck: any_offense_deck,
+    die_or_dare.SmallestDefenseDeck: smallest_defense_deck,
+    die_or_dare.AnyDefenseDeck: any_defense_deck,
+    die_or_dare.SimpleActionChoiceStrategy: simple_action_choice,
+}
+# the defaults of ComputerPlayer, in the order of STRATEGY_ATTRIBUTES
+DEFAULT_STRATEGIES = (die_or_dare.RandomNumber, die_or_dare.JokerAnywhere,
+                      die_or_dare.AnyOffenseDeck, die_or_dare.AnyDefenseDeck,
+                      die_or_dare.SimpleActionChoiceStrategy)
+
+
+def vectorize(strategies=None):
+    """Return the vectorized versions of strategies given as keyword
+    arguments of ComputerPlayer, in the order of STRATEGY_ATTRIBUTES.
+    """
+    if strategies is None:
+        strategies = {}
+    functions = []
+    for attribute, default in zip(
+            die_or_dare.OutputHandler.STRATEGY_ATTRIBUTES,
+            DEFAULT_STRATEGIES):
+        strategy = strategies.get(attribute) or default
+        if strategy not in VECTORIZED_STRATEGIES:
+            raise ValueError('{} has no vectorized version.'.format(
+                strategy.__name__))
+        functions.append(VECTORIZED_STRATEGIES[strategy])
+    return functions
+
+
+def simulate(n_games, red_strategies=None, black_strategies=None, seed=None,
+             chunk_size=CHUNK_SIZE):
+    """Batch counterpart of simulation.simulate.
+
+    The games are dealt from the same pile orders as simulation.simulate
+    with the same seed, but the random decisions come from a NumPy
+    Generator, so games only agree in distribution. Games are played
+    chunk_size at a time to bound memory.
+    """
+    red = vectorize(red_strategies)
+    black = vectorize(black_strategies)
+    joker_strategies = red[:2], black[:2]
+    strategies = red[2:], black[2:]
+    seed_stream = seeding.SeedStream(seed)
+    rng = seed_stream.generator()
+    chunks = []
+    for start in range(0, n_games, chunk_size):
+        orders = seed_stream.shuffle_orders(min(chunk_size,
+                                                n_games - start))
+        games = BatchGames.build(orders, joker_strategies, rng).play(
+            strategies, rng)
+        chunks.append(BatchResult(games.winner, games.result,
+                                  games.duel_index, games.num_victory,
+                                  games.num_shout_die))
+    return BatchResult(*(numpy.concatenate(arrays) for arrays in
+                         zip(*chunks)))
+
+
+def main(n_games, seed=None, chunk_size=CHUNK_SIZE):
+    start = time.perf_counter()
+    result = simulate(n_games, seed=seed, chunk_size=chunk_size)
+    elapsed = time.perf_counter() - start
+    print('{} games in {:.3f} seconds ({:.0f} games/s)'.format(
+        n_games, elapsed, n_games / elapsed if elapsed else 0))
+    winners = numpy.bincount(result.winner, minlength=2)
+    for alias, count in zip((constants.PLAYER_RED, constants.PLAYER_BLACK),
+                            winners):
+        print('{:15}{}'.format(alias, count))
+    result_counts = numpy.bincount(result.result,
+                                   minlength=len(constants.GameResult) + 1)
+    for game_result in constants.GameResult:
+        if result_counts[game_result.value]:
+            print('{:15}{}'.format(game_result.name,
+                                   result_counts[game_result.value]))
+    duels = numpy.bincount(result.duel_index + 1,
+                           minlength=constants.DECK_PER_PILE + 1)
+    for num_duels, count in enumerate(duels):
+        if count:
+            print('{:15}{}'.format('{} duels'.format(num_duels), count))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Simulate games between computer players as arrays.')
+    parser.add_argument('-n', '--games', help='number of games to simulate',
+                        type=int, default=1000000)
+    parser.add_argument('-s', '--seed', help='master seed of the games',
+                        type=int, default=None)
+    parser.add_argument('-c', '--chunk-size', help='games played at a time',
+                        type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    main(args.games, args.seed, args.chunk_size)
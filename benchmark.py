@@ -0,0 +1,288 @@
+import argparse
+import constants
+import contextlib
+import die_or_dare
+import json
+import numpy
+import os
+import platform
+import random
+import results
+import seeding
+import simulation
+import subprocess
+import sys
+import tempfile
+import timeit
+import tournament
+
+BASELINE_FILE_PATH = 'benchmark_baseline.json'
+THRESHOLD = .2  # slower than the baseline by more than this is a regression
+REPEAT = 5
+SEED = 0
+NUM_STORED_GAMES = 10 ** 6
+
+
+def new_game(seed=SEED):
+    seed_stream = seeding.SeedStream(seed)
+    return simulation.new_game(rngs=seed_stream.rngs(1)[0],
+                               orders=seed_stream.shuffle_orders(1)[0])
+
+
+def game_at(round_, seed=SEED):
+    """A game whose first duel is at the given round, after Game.prepare
+    (round 1: both decks chosen, only the delegates open).
+    """
+    game = new_game(seed)
+    game.to_next_duel()
+    for _ in range(2):  # the offense deck, then the defense deck
+        game.prepare()
+        game.process(game.accept())
+    if round_ >= 2:
+        game.prepare()
+    if round_ == 3:
+        game.process(dares(game))
+        game.prepare()
+    return game
+
+
+def dares(game):
+    return die_or_dare.ShoutInput([die_or_dare.Shout(
+        player, constants.Action.DARE) for player in game.players])
+
+
+def bench_build_decks():
+    game = new_game()
+    player = game.player_red
+    order = seeding.SeedStream(SEED).shuffle_orders(1)[0][0]
+    return lambda: player.build_decks(order)
+
+
+def bench_joker_strategy(strategy):
+    player = new_game().player_red
+    joker = player.pile[0]
+    cards = [joker] + list(player.pile[1:constants.CARD_PER_DECK])
+    rng = random.Random(SEED)
+    return lambda: strategy.apply(cards, rng)
+
+
+def bench_get_chances(round_):
+    duel = game_at(round_).duel_ongoing
+    decks_me, decks_opponent = duel.offense.decks, duel.defense.decks
+    return lambda: die_or_dare.ComputerPlayer.get_chances(decks_me,
+                                                          decks_opponent)
+
+
+def bench_process_shout_dare():
+    """A double dare in round 2 only records the shouts, so it repeats."""
+    game = game_at(2)
+    shout_input = dares(game)
+    return lambda: game.process_shout(shout_input)
+
+
+def bench_process_shout_end():
+    """No shout in round 3 ends the duel, so the game is restored first."""
+    game = game_at(3)
+    snapshot = game.snapshot()
+    shout_input = die_or_dare.ShoutInput([die_or_dare.Shout(
+        player, None) for player in game.players])
+
+    def run():
+        game.restore(snapshot)
+        game.process_shout(shout_input)
+    return run
+
+
+def bench_to_json():
+    game = game_at(2)
+    return game.to_json
+
+
+def bench_decode():
+    game_json = game_at(2).to_json()
+    jsonpickle = die_or_dare.import_jsonpickle()
+    return lambda: jsonpickle.decode(game_json)
+
+
+def bench_display():
+    game = game_at(2)
+
+    def run():
+        with open(os.devnull, 'w') as devnull:
+            with contextlib.redirect_stdout(devnull):
+                die_or_dare.OutputHandler.display(game, 'Benchmark')
+    return run
+
+
+def bench_game():
+    orders = seeding.SeedStream(SEED).shuffle_orders(1)[0]
+
+    def run():
+        rngs = random.Random(SEED), random.Random(SEED + 1)
+        simulation.play(simulation.new_game(rngs=rngs, orders=orders))
+    return run
+
+
+def synthetic_store(directory, num_games=NUM_STORED_GAMES, seed=SEED):
+    """A ResultsStore of num_games made-up outcomes between random
+    combinations of every concrete strategy.
+    """
+    store = results.ResultsStore(directory)
+    rng = numpy.random.default_rng(seed)
+    columns = {name: rng.integers(2, size=(num_games,) + shape) for
+               name, (_, shape) in results.COLUMNS.items()}
+    for attribute, base in zip(results.STRATEGY_ATTRIBUTES, (
+            die_or_dare.JokerValueStrategy, die_or_dare.JokerPositionStrategy,
+            die_or_dare.OffenseDeckChoiceStrategy,
+            die_or_dare.DefenseDeckChoiceStrategy,
+            die_or_dare.ActionChoiceStrategy)):
+        codes = [store.code(strategy.__name__) for strategy in
+                 tournament.concrete_strategies(base)]
+        for seat in results.SEATS:
+            columns['{}_{}'.format(seat, attribute)] = rng.choice(codes,
+                                                                  num_games)
+    store.append_columns(columns)
+    return store
+
+
+def bench_win_rates(group_by):
+    directory = tempfile.TemporaryDirectory()
+    store = synthetic_store(directory.name)
+
+    def run():
+        return store.win_rates(group_by)
+    run.directory = directory  # removed once run is collected
+    return run
+
+
+def bench_startup(*arguments):
+    """A fresh interpreter running the arguments, e.g. to see what importing
+    a module or a short scripted run costs a worker process.
+    """
+    command = [sys.executable] + list(arguments)
+    directory = os.path.dirname(os.path.abspath(__file__))
+    return lambda: subprocess.run(command, cwd=directory, check=True,
+                                  stdout=subprocess.DEVNULL)
+
+
+def benchmarks():
+    """Return (name, setup) pairs; setup returns the function to time."""
+    pairs = [('Player.build_decks', bench_build_decks)]
+    for base in (die_or_dare.JokerValueStrategy,
+                 die_or_dare.JokerPositionStrategy):
+        for strategy in tournament.concrete_strategies(base):
+            pairs.append(('{}.apply'.format(strategy.__name__),
+                          lambda strategy=strategy: bench_joker_strategy(
+                              strategy)))
+    for round_ in 1, 2, 3:
+        pairs.append(('ComputerPlayer.get_chances round {}'.format(round_),
+                      lambda round_=round_: bench_get_chances(round_)))
+    pairs += [
+        ('Game.process_shout double dare', bench_process_shout_dare),
+        ('Game.process_shout end + restore', bench_process_shout_end),
+        ('Game.to_json', bench_to_json),
+        ('jsonpickle.decode', bench_decode),
+        ('OutputHandler.display to devnull', bench_display),
+        ('headless game', bench_game),
+        ('win_rates 10^6 games, 1 family',
+         lambda: bench_win_rates(results.STRATEGY_ATTRIBUTES[:1])),
+        ('win_rates 10^6 games, 5 families',
+         lambda: bench_win_rates(results.STRATEGY_ATTRIBUTES)),
+        ('startup: python', lambda: bench_startup('-c', 'pass')),
+        ('startup: import die_or_dare',
+         lambda: bench_startup('-c', 'import die_or_dare')),
+        ('startup: import analysis',
+         lambda: bench_startup('-c', 'import analysis')),
+        ('startup: die_or_dare.py --humans 0 -q',
+         lambda: bench_startup('die_or_dare.py', '--humans', '0', '-q',
+                               '-s', str(SEED))),
+    ]
+    return pairs
+
+
+def measure(function, repeat=REPEAT):
+    """Seconds per call: the best of repeat runs of as many calls as fill
+    0.2 seconds.
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def load_baseline(file_path):
+    if not os.path.exists(file_path):
+        return {}
+    with open(file_path) as file:
+        return json.load(file)['results']
+
+
+def save_baseline(file_path, results):
+    """Merge results into the baseline file."""
+    baseline = load_baseline(file_path)
+    baseline.update(results)
+    with open(file_path, 'w') as file:
+        json.dump({'python': platform.python_version(),
+                   'machine': platform.machine(), 'results': baseline}, file,
+                  indent=2, sort_keys=True)
+
+
+def run(pattern=None, repeat=REPEAT, baseline=None, threshold=THRESHOLD,
+        output=sys.stdout):
+    """Time the benchmarks whose names contain pattern and compare them
+    with the baseline. Returns the results and the names of regressions.
+    """
+    if baseline is None:
+        baseline = {}
+    results = {}
+    regressions = []
+    output.write('{:40}{:>14}{:>14}{:>9}\n'.format(
+        'benchmark', 'us per call', 'baseline us', 'ratio'))
+    for name, setup in benchmarks():
+        if pattern is not None and pattern not in name:
+            continue
+        results[name] = seconds = measure(setup(), repeat)
+        line = '{:40}{:>14.2f}'.format(name, seconds * 1e6)
+        if name in baseline:
+            ratio = seconds / baseline[name]
+            line += '{:>14.2f}{:>9.2f}'.format(baseline[name] * 1e6, ratio)
+            if ratio > 1 + threshold:
+                regressions.append(name)
+                line += '  REGRESSION'
+        output.write(line + '\n')
+        output.flush()
+    return results, regressions
+
+
+def main(pattern, repeat, baseline_path, threshold, save):
+    baseline = load_baseline(baseline_path)
+    results, regressions = run(pattern, repeat, baseline, threshold)
+    if save:
+        save_baseline(baseline_path, results)
+        print('Saved {} results to {}.'.format(len(results), baseline_path))
+    if regressions:
+        print('{} regression(s) beyond {:.0%}: {}'.format(
+            len(regressions), threshold, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Time the hot paths of the engine and compare them with '
+                    'a baseline.')
+    parser.add_argument('-k', '--pattern', help='only run benchmarks whose '
+                                                'names contain this',
+                        default=None)
+    parser.add_argument('-r', '--repeat', help='runs per benchmark, the best '
+                                               'one counts',
+                        type=int, default=REPEAT)
+    parser.add_argument('-b', '--baseline', help='baseline file',
+                        default=BASELINE_FILE_PATH)
+    parser.add_argument('-t', '--threshold', help='slowdown ratio above 1 '
+                                                  'flagged as a regression',
+                        type=float, default=THRESHOLD)
+    parser.add_argument('--save', action='store_true',
+                        help='record the results as the new baseline')
+    args = parser.parse_args()
+    sys.exit(main(args.pattern, args.repeat, args.baseline, args.threshold,
+                  args.save))
@@ -82,3 +82,20 @@ REQUIRED_WIN = 3
 MAX_DIE = 2
 MAX_DONE = 1
 MAX_DRAW = 1
+
+# bit layout of Card.to_code()
+CARD_OPEN_BIT = 1
+CARD_COLORED_BIT = 2
+CARD_VALUE_SHIFT = 2
+CARD_RANK_SHIFT = 6
+CARD_SUIT_SHIFT = 10
+CARD_FIELD_MASK = 0b1111
+
+# header of Game.snapshot(): magic, version, time started and time ended
+SNAPSHOT_MAGIC = b'DoD'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER_FORMAT = '<3sBdd'
+SNAPSHOT_FILE_MAGIC = b'DoDS'
+SNAPSHOT_FILE_EXTENSION = '.dod'
+REPLAY_FILE_MAGIC = b'DoDR'
+REPLAY_FILE_EXTENSION = '.dodr'
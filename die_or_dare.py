@@ -1,15 +1,18 @@
 import abc
 import argparse
+import array
 import constants
 import datetime
 import functools
-import itertools
 import json
-import jsonpickle
-import keyboard
-import numpy
+import kernel
+import math
+import odds
 import os
+import queue
 import random
+import struct
+import sys
 import time
 
 
@@ -62,8 +65,8 @@ class NameTextInput(NameInput):
         return cls(name)
 
     @classmethod
-    def auto_generate(cls, forbidden_name):
-        name = 'Computer' + str(random.randint(1, 999999))
+    def auto_generate(cls, forbidden_name, rng=random):
+        name = 'Computer' + str(rng.randint(1, 999999))
         if name == forbidden_name:
             name += 'a'
         return cls(name)
@@ -139,13 +142,13 @@ class KeySettingsTextInput(KeySettingsInput):
 class JokerValueStrategy(abc.ABC):
     @staticmethod
     @abc.abstractmethod
-    def apply(cards):
+    def apply(cards, rng=random):
         pass
 
 
 class Thirteen(JokerValueStrategy):
     @staticmethod
-    def apply(cards):
+    def apply(cards, rng=random):
         """Assign 13."""
         for card in cards:
             if card.is_joker():
@@ -155,7 +158,7 @@ class Thirteen(JokerValueStrategy):
 
 class SameAsMax(JokerValueStrategy):
     @staticmethod
-    def apply(cards):
+    def apply(cards, rng=random):
         """Assign the biggest value that is already in the deck."""
         if any(card.is_joker() for card in cards):
             joker = next(card for card in cards if card.is_joker())
@@ -166,18 +169,18 @@ class SameAsMax(JokerValueStrategy):
 
 class RandomNumber(JokerValueStrategy):
     @staticmethod
-    def apply(cards):
+    def apply(cards, rng=random):
         """Assign a random number."""
         for card in cards:
             if card.is_joker():
                 values = [rank.value for rank in constants.Rank]
-                card.value = random.choice(values)
+                card.value = rng.choice(values)
                 break
 
 
 class NextBiggest(JokerValueStrategy):
     @staticmethod
-    def apply(cards):
+    def apply(cards, rng=random):
         """Assign the next biggest value that is not yet in the deck."""
         if any(card.is_joker() for card in cards):
             joker = next(card for card in cards if card.is_joker())
@@ -198,13 +201,13 @@ class NextBiggest(JokerValueStrategy):
 class JokerPositionStrategy(abc.ABC):
     @staticmethod
     @abc.abstractmethod
-    def apply(cards):
+    def apply(cards, rng=random):
         pass
 
 
 class JokerFirst(JokerPositionStrategy):
     @staticmethod
-    def apply(cards):
+    def apply(cards, rng=random):
         """Reveal the joker as soon as possible."""
         biggest = max(cards, key=lambda x: x.value)
         biggest_index = cards.index(biggest)
@@ -226,7 +229,7 @@ class JokerFirst(JokerPositionStrategy):
 
 class JokerLast(JokerPositionStrategy):
     @staticmethod
-    def apply(cards):
+    def apply(cards, rng=random):
         """Hide the joker as long as possible."""
         biggest = max(cards, key=lambda x: x.value)
         biggest_index = cards.index(biggest)
@@ -251,7 +254,7 @@ class JokerLast(JokerPositionStrategy):
 
 class JokerAnywhere(JokerPositionStrategy):
     @staticmethod
-    def apply(cards):
+    def apply(cards, rng=random):
         """Put the joker anywhere within the deck."""
         biggest = max(cards, key=lambda x: x.value)  # may or may not be a joker
         biggest_index = cards.index(biggest)
@@ -352,65 +355,63 @@ class OffenseDeckChoiceStrategy(abc.ABC):
     @staticmethod
     @abc.abstractmethod
     def apply(decks_me, decks_opponent, num_victory_me, num_shout_die_me,
-              num_victory_opponent, num_shout_die_opponent):
+              num_victory_opponent, num_shout_die_opponent, rng=random):
         pass
 
 
 class BiggestOffenseDeck(OffenseDeckChoiceStrategy):
     @staticmethod
     def apply(decks_me, decks_opponent, num_victory_me, num_shout_die_me,
-              num_victory_opponent, num_shout_die_opponent):
-        undisclosed_decks_me = [deck for deck in decks_me if
-                                deck.is_undisclosed()]
-        return max(undisclosed_decks_me, key=lambda x: x.index)
+              num_victory_opponent, num_shout_die_opponent, rng=random):
+        return decks_me.undisclosed[-1]
 
 
 class AnyOffenseDeck(OffenseDeckChoiceStrategy):
     @staticmethod
     def apply(decks_me, decks_opponent, num_victory_me, num_shout_die_me,
-              num_victory_opponent, num_shout_die_opponent):
-        undisclosed_decks = [deck for deck in decks_me if deck.is_undisclosed()]
-        return random.choice(undisclosed_decks)
+              num_victory_opponent, num_shout_die_opponent, rng=random):
+        return rng.choice(decks_me.undisclosed)
 
 
 class DefenseDeckChoiceStrategy(abc.ABC):
     @staticmethod
     @abc.abstractmethod
     def apply(decks_me, decks_opponent, num_victory_me, num_shout_die_me,
-              num_victory_opponent, num_shout_die_opponent, offense_deck=None):
+              num_victory_opponent, num_shout_die_opponent, offense_deck=None,
+              rng=random):
         pass
 
 
 class SmallestDefenseDeck(DefenseDeckChoiceStrategy):
     @staticmethod
     def apply(decks_me, decks_opponent, num_victory_me, num_shout_die_me,
-              num_victory_opponent, num_shout_die_opponent, offense_deck=None):
-        undisclosed_decks_opponent = [deck for deck in decks_opponent if
-                                      deck.is_undisclosed()]
-        return min(undisclosed_decks_opponent, key=lambda x: x.index)
+              num_victory_opponent, num_shout_die_opponent, offense_deck=None,
+              rng=random):
+        return decks_opponent.undisclosed[0]
 
 
 class AnyDefenseDeck(DefenseDeckChoiceStrategy):
     @staticmethod
     def apply(decks_me, decks_opponent, num_victory_me, num_shout_die_me,
-              num_victory_opponent, num_shout_die_opponent, offense_deck=None):
-        undisclosed_decks = [deck for deck in decks_opponent if
-                             deck.is_undisclosed()]
-        return random.choice(undisclosed_decks)
+              num_victory_opponent, num_shout_die_opponent, offense_deck=None,
+              rng=random):
+        return rng.choice(decks_opponent.undisclosed)
 
 
 class ActionChoiceStrategy(abc.ABC):
     @staticmethod
     @abc.abstractmethod
     def apply(decks_me, decks_opponent, num_victory_me, num_shout_die_me,
-              num_victory_opponent, num_shout_die_opponent, round_, in_turn):
+              num_victory_opponent, num_shout_die_opponent, round_, in_turn,
+              rng=random):
         pass
 
 
 class SimpleActionChoiceStrategy(ActionChoiceStrategy):
     @staticmethod
     def apply(decks_me, decks_opponent, num_victory_me, num_shout_die_me,
-              num_victory_opponent, num_shout_die_opponent, round_, in_turn):
+              num_victory_opponent, num_shout_die_opponent, round_, in_turn,
+              rng=random):
         if not ComputerPlayer.undisclosed_values(decks_me):
             return constants.Action.DONE
         elif round_ == 1:
@@ -421,7 +422,7 @@ class SimpleActionChoiceStrategy(ActionChoiceStrategy):
             else:
                 odds_win += odds_draw
             if odds_lose > odds_win + .1:
-                if random.random() < .7:
+                if rng.random() < .7:
                     return constants.Action.DIE
                 else:
                     return constants.Action.DARE
@@ -434,17 +435,14 @@ class SimpleActionChoiceStrategy(ActionChoiceStrategy):
                 odds_win += odds_draw
             if num_shout_die_me < constants.MAX_DIE:
                 if odds_lose > odds_win + .1:
-                    if random.random() < .7:
+                    if rng.random() < .7:
                         return constants.Action.DIE
                     else:
                         return constants.Action.DARE
             return constants.Action.DARE
         elif round_ == 3:
-            deck_in_duel_me = next(
-                (deck for deck in decks_me if deck.is_in_duel()))
-            deck_in_duel_opponent = next(
-                (deck for deck in decks_opponent if
-                 deck.is_in_duel()))
+            deck_in_duel_me = decks_me.in_duel
+            deck_in_duel_opponent = decks_opponent.in_duel
             sum_me = sum(card.value for card in deck_in_duel_me)
             sum_opponent = sum(
                 card.value for card in deck_in_duel_opponent)
@@ -548,30 +546,62 @@ class ShoutInput(Input):
 
 
 class ShoutKeypressInput(ShoutInput):
-    def __init__(self, keys_pressed):
+    def __init__(self, keys_pressed, timestamps=None):
         super().__init__(keys_pressed)
         self._keys_pressed = keys_pressed
+        # time.perf_counter() of each key press, relative to the start
+        self.timestamps = timestamps
 
     @classmethod
-    def from_human(cls, keys_to_hook=None, timeout=0):
+    def from_human(cls, keys_to_hook=None, timeout=0, key_groups=None,
+                   final_keys=()):
+        """Collect the keys pressed within timeout seconds.
+
+        If key_groups (e.g. the keys of each player) are given, this returns
+        as soon as a key of every group has been pressed; it also returns as
+        soon as any of final_keys (a shout nothing can override) is pressed.
+        The keyboard callbacks feed a queue, so nothing spins while waiting.
+        """
         def when_key_pressed(x):
-            keyboard.unhook_key(x.name)
-            keys_pressed.append(x.name)
+            events.put((x.name, time.perf_counter()))
 
-        keys_pressed = []
+        events = queue.Queue()
         if keys_to_hook is None:
             keys_to_hook = []
         else:
-            keys_to_hook = (key for key in keys_to_hook if key is not None)
-        for key in keys_to_hook:
+            keys_to_hook = [key for key in keys_to_hook if key is not None]
+        pending_groups = None
+        if key_groups is not None:
+            pending_groups = [set(group) - {None} for group in key_groups]
+            pending_groups = [group for group in pending_groups if group]
+        keys_pressed = []
+        timestamps = []
+        import keyboard  # platform dependent, and only humans need it
+        start = time.perf_counter()
+        for key in set(keys_to_hook):
             keyboard.on_press_key(key, when_key_pressed)
-        over = False
-        start = time.time()
-        while not over:
-            over = time.time() - start > timeout
-        keyboard.unhook_all()
+        try:
+            while pending_groups is None or pending_groups:
+                remaining = timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    break
+                try:
+                    key, timestamp = events.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if key in keys_pressed:
+                    continue
+                keys_pressed.append(key)
+                timestamps.append(timestamp - start)
+                if key in final_keys:
+                    break
+                if pending_groups is not None:
+                    pending_groups = [group for group in pending_groups if
+                                      key not in group]
+        finally:
+            keyboard.unhook_all()
         keys_str = ''.join(keys_pressed)
-        return cls(keys_str)
+        return cls(keys_str, timestamps)
 
     @property
     def value(self):
@@ -591,9 +621,9 @@ class PlayerOrder(abc.ABC):
 
 
 class RandomPlayerOrder(PlayerOrder):
-    def __init__(self, player1, player2):
+    def __init__(self, player1, player2, rng=random):
         super().__init__(player1, player2)
-        if random.random() > .5:
+        if rng.random() > .5:
             self._first = self._player1
             self._second = self._player2
         else:
@@ -637,16 +667,19 @@ class Game(object):
                 duels.append(new_duel)
             self.duels = tuple(duels)
         self.duel_ongoing = None
-        self.red_pile = RedPile().cards
-        self.black_pile = BlackPile().cards
 
     @property
     def players(self):
         return self.player_red, self.player_black
 
-    def build_decks(self):
-        for player in self.players:
-            player.build_decks()
+    def build_decks(self, orders=None):
+        """Have both players build their decks, optionally from the pile
+        orders of one game of SeedStream.shuffle_orders.
+        """
+        if orders is None:
+            orders = None, None
+        for player, order in zip(self.players, orders):
+            player.build_decks(order)
 
     def _open_next_cards(self):
         for player in self.players:
@@ -701,12 +734,22 @@ class Game(object):
         round_ = duel.round_
         if all(isinstance(player, HumanPlayer) for player in self.players):
             keys = []
+            key_groups = []
             for player in self.players:
                 valid_actions = player.valid_actions(round_)
-                for action in valid_actions:
-                    key = player.key_settings.get(action)
-                    keys.append(key)
-            shout_input = ShoutKeypressInput.from_human(keys, timeout)
+                player_keys = [player.key_settings.get(action) for action in
+                               valid_actions]
+                keys.extend(player_keys)
+                key_groups.append(player_keys)
+            # the first player who is done wins by shouting done
+            final_keys = []
+            for player in duel.players:
+                if player.is_done():
+                    done_key = player.key_settings.get(constants.Action.DONE)
+                    final_keys.append(done_key)
+                    break
+            shout_input = ShoutKeypressInput.from_human(keys, timeout,
+                                                        key_groups, final_keys)
             return shout_input
         else:
             shouts = []
@@ -742,11 +785,15 @@ class Game(object):
             raise ValueError('Invalid input')
 
     def process_shout_keypress(self, intra_duel_input):
+        shout_input = self.keys_to_shouts(intra_duel_input)
+        return self.process_shout(shout_input)
+
+    def keys_to_shouts(self, shout_keypress_input):
         duel = self.duel_ongoing
         round_ = duel.round_
         # See who did which action
         shouts = []
-        keys_pressed = intra_duel_input.value
+        keys_pressed = shout_keypress_input.value
         for key_pressed in keys_pressed:
             for player in self.players:
                 valid_actions = player.valid_actions(round_)
@@ -756,8 +803,7 @@ class Game(object):
                 if action in valid_actions:
                     shout = Shout(player, action)
                     shouts.append(shout)
-        shout_input = ShoutInput(shouts)
-        return self.process_shout(shout_input)
+        return ShoutInput(shouts)
 
     def process_shout(self, shout_input):
         shouts = shout_input.value
@@ -925,7 +971,146 @@ class Game(object):
         self.player_black.take_pile(black_pile)
 
     def to_json(self):
-        return jsonpickle.encode(self)
+        return import_jsonpickle().encode(self)
+
+    def snapshot(self, viewer=None):
+        """Encode the state of the game into a fixed-width binary record.
+
+        Names, classes and strategies of the players are left out, so a
+        snapshot is restored into a game between the same players. With a
+        viewer, the unopened cards of the other player are written as
+        unknown (see Card.to_list), so the snapshot can be shown to the
+        viewer.
+        """
+        result = -1 if self.result is None else self.result.value
+        list_ = [int(self._over), result, self._player_to_field(self.winner),
+                 self._player_to_field(self.loser), self.duel_index]
+        for duel in self.duels:
+            list_.extend(duel.to_list())
+        for player in self.players:
+            list_.extend(player.to_list(hide_unopened=viewer is not None and
+                                        player is not viewer))
+        time_ended = math.nan if self.time_ended is None else self.time_ended
+        header = struct.pack(constants.SNAPSHOT_HEADER_FORMAT,
+                             constants.SNAPSHOT_MAGIC,
+                             constants.SNAPSHOT_VERSION, self.time_started,
+                             time_ended)
+        return header + array.array('b', list_).tobytes()
+
+    def restore(self, snapshot):
+        """Load a record made by Game.snapshot into this game in place."""
+        header_size = struct.calcsize(constants.SNAPSHOT_HEADER_FORMAT)
+        magic, version, time_started, time_ended = struct.unpack_from(
+            constants.SNAPSHOT_HEADER_FORMAT, snapshot)
+        if magic != constants.SNAPSHOT_MAGIC:
+            raise ValueError('This is not a game snapshot.')
+        if version != constants.SNAPSHOT_VERSION:
+            raise ValueError('Unsupported snapshot version.')
+        self.time_started = time_started
+        self.time_ended = None if math.isnan(time_ended) else time_ended
+        list_ = array.array('b', snapshot[header_size:]).tolist()
+        over, result, winner, loser, self.duel_index = list_[:5]
+        self._over = bool(over)
+        self.result = None if result == -1 else constants.GameResult(result)
+        self.winner = self._field_to_player(winner)
+        self.loser = self._field_to_player(loser)
+        start = 5
+        for duel in self.duels:
+            duel.load(list_[start:start + Duel.NUM_FIELDS])
+            start += Duel.NUM_FIELDS
+        num_player_fields = (len(list_) - start) // 2
+        for player in self.players:
+            player.load(list_[start:start + num_player_fields])
+            start += num_player_fields
+        if self.duel_index == -1:
+            self.duel_ongoing = None
+        else:
+            self.duel_ongoing = self.duels[self.duel_index]
+        return self
+
+    def to_state(self):
+        """Return the game as an immutable kernel.GameState, to branch on
+        with kernel.step instead of copying the game. The decks must have
+        been built.
+        """
+        sides = []
+        for player in self.players:
+            decks = player.decks
+            codes = kernel.deck_codes(player.to_codes())
+            values = tuple(tuple(card.value for card in deck) for deck in
+                           decks)
+            opened = tuple(sum(1 for card in deck if card.is_open()) for deck
+                           in decks)
+            states = tuple(deck._state.value for deck in decks)
+            in_duel = None if decks.in_duel is None else decks.in_duel.index
+            sides.append(kernel.Side(
+                codes, values, opened, states, in_duel, decks.disclosed_mask,
+                player.num_victory, player.num_shout_die,
+                player.num_shout_done, player.num_shout_draw))
+        duels = tuple(kernel.DuelRecord(
+            duel._state, duel.round_, None if duel.winner is None else
+            self.players.index(duel.winner)) for duel in self.duels)
+        winner = None if self.winner is None else self.players.index(
+            self.winner)
+        return kernel.GameState(tuple(sides), self.duel_index, duels,
+                                self._over, self.result, winner)
+
+    @classmethod
+    def from_state(cls, state, player_red=None, player_black=None):
+        """Build a game from a kernel.GameState.
+
+        Like Game.restore, the state leaves the players out: the given ones
+        get fresh decks and counters from it, and plain Players stand in for
+        those left out.
+        """
+        if player_red is None:
+            player_red = Player(alias=constants.PLAYER_RED)
+        if player_black is None:
+            player_black = Player(alias=constants.PLAYER_BLACK)
+        game = cls(player_red, player_black)
+        for player, side in zip(game.players, state.sides):
+            decks = []
+            for index, codes in enumerate(side.codes):
+                opened = side.opened[index]
+                cards = tuple(Card.from_code(
+                    code | constants.CARD_OPEN_BIT if position < opened else
+                    code) for position, code in enumerate(codes))
+                card_to_open_index = opened if opened == 2 else None
+                decks.append(Deck(cards, Deck._STATES[side.states[index]],
+                                  index,
+                                  card_to_open_index=card_to_open_index))
+            player.decks = Decks(decks)
+            player.deck_in_duel = player.decks.in_duel
+            player._deck_in_duel_index = side.in_duel
+            player.num_victory = side.num_victory
+            player.num_shout_die = side.num_shout_die
+            player.num_shout_done = side.num_shout_done
+            player.num_shout_draw = side.num_shout_draw
+            player.recent_action = None
+        players = game.players
+        for duel, record in zip(game.duels, state.duels):
+            duel._state = record.state
+            duel._round = record.round_
+            duel._over = record.is_over()
+            if record.winner is not None:
+                duel.winner = players[record.winner]
+                duel.loser = players[1 - record.winner]
+        game.duel_index = state.duel_index
+        if game.duel_index != -1:
+            game.duel_ongoing = game.duels[game.duel_index]
+        if state.over:
+            game._over = True
+            game.result = state.result
+            game.winner = players[state.winner]
+            game.loser = players[1 - state.winner]
+            game.time_ended = time.time()
+        return game
+
+    def _player_to_field(self, player):
+        return -1 if player is None else self.players.index(player)
+
+    def _field_to_player(self, field):
+        return None if field == -1 else self.players[field]
 
 
 class Player(object):
@@ -934,7 +1119,8 @@ class Player(object):
                  decks=None, pile=None, key_settings=None, alias=None,
                  recent_action=None, joker_value_strategy=None,
                  joker_position_strategy=None, offense_deck_index_strategy=None,
-                 defense_deck_index_strategy=None, action_choice_strategy=None):
+                 defense_deck_index_strategy=None, action_choice_strategy=None,
+                 rng=random):
         self.name = name
         self._deck_in_duel_index = deck_in_duel_index
         self.deck_in_duel = None
@@ -954,6 +1140,7 @@ class Player(object):
         self.offense_deck_index_strategy = offense_deck_index_strategy
         self.defense_deck_index_strategy = defense_deck_index_strategy
         self.action_choice_strategy = action_choice_strategy
+        self.rng = rng  # random.Random of this player or the random module
 
     def valid_actions(self, round_):
         actions = [constants.Action.DONE]
@@ -974,7 +1161,7 @@ class Player(object):
         return actions
 
     def undisclosed_decks(self):
-        return [deck for deck in self.decks if deck.is_undisclosed()]
+        return list(self.decks.undisclosed)
 
     def take_pile(self, pile):
         if isinstance(pile, RedPile):
@@ -988,17 +1175,23 @@ class Player(object):
         else:
             raise ValueError('This is not a pile.')
 
-    def build_decks(self):
-        pile = list(self.pile)
-        random.shuffle(pile)
+    def build_decks(self, order=None):
+        """Shuffle the pile, or put it in the given order (a permutation of
+        its indices), and build the decks from it.
+        """
+        if order is None:
+            pile = list(self.pile)
+            self.rng.shuffle(pile)
+        else:
+            pile = [self.pile[index] for index in order]
         decks_previous = []
         for j in range(constants.DECK_PER_PILE):
             cards = []
             for k in range(constants.CARD_PER_DECK):
                 new_card = pile.pop()
                 cards.append(new_card)
-            self.joker_value_strategy.apply(cards)
-            self.joker_position_strategy.apply(cards)
+            self.joker_value_strategy.apply(cards, self.rng)
+            self.joker_position_strategy.apply(cards, self.rng)
             decks_previous.append(tuple(cards))
         decks_previous.sort(key=lambda x: x[0].value)
         decks = []
@@ -1006,7 +1199,7 @@ class Player(object):
             deck = Deck(cards, index=index)
             deck.delegate().open_up()
             decks.append(deck)
-        self.decks = tuple(decks)
+        self.decks = Decks(decks)
 
     @abc.abstractmethod
     def decide_offense_deck(self, decks_opponent, num_victory_opponent,
@@ -1022,6 +1215,7 @@ class Player(object):
         self.deck_in_duel = deck
         self._deck_in_duel_index = deck.index
         deck.enter_duel(opponent_deck=opponent_deck)
+        self.decks.enter_duel(deck)
 
     def open_next_card(self):
         deck = self.decks[self._deck_in_duel_index]
@@ -1029,45 +1223,92 @@ class Player(object):
             deck.card_to_open_index = 1
         card_to_open = deck[deck.card_to_open_index]
         card_to_open.open_up()
+        self.decks.open_card(deck, card_to_open)
         deck.card_to_open_index += 1
         if deck.card_to_open_index == 3:
             deck.card_to_open_index = None
 
     def is_done(self):
-        disclosed_values = ComputerPlayer.disclosed_values(self.decks)
-        num_disclosed_values = len(disclosed_values)
-        num_all_values = len(constants.Rank)
-        return num_disclosed_values == num_all_values
-
-    def to_array(self):
-        decks = [deck.to_array() for deck in self.decks]
-        decks = list(itertools.chain.from_iterable(decks))
+        return self.decks.disclosed_mask == Decks.ALL_VALUES
+
+    def to_list(self, hide_unopened=False):
+        list_ = []
+        for deck in self.decks:
+            list_.extend(deck.to_list(hide_unopened))
         num_victory = -1 if self.num_victory is None else self.num_victory
         num_shout_die = -1 if self.num_shout_die is None else self.num_shout_die
         if self._deck_in_duel_index is None:
             deck_in_duel_index = -1
         else:
             deck_in_duel_index = self._deck_in_duel_index
-        others = [num_victory, num_shout_die, deck_in_duel_index]
-        return numpy.array(decks + others)
+        recent_action = (-1 if self.recent_action is None else
+                         self.recent_action.value)
+        list_.extend((num_victory, num_shout_die, deck_in_duel_index,
+                      self.num_shout_done, self.num_shout_draw, recent_action))
+        return list_
+
+    def to_array(self, out=None):
+        list_ = self.to_list()
+        if out is None:
+            import numpy
+            return numpy.array(list_)
+        out[:len(list_)] = list_
+        return out
+
+    def load(self, array):
+        """Overwrite this player with the fields written by Player.to_list.
+        Existing decks and cards are updated in place. Fields must be ints.
+        """
+        deck_fields = 5 * constants.CARD_PER_DECK + 4
+        num_deck_fields = deck_fields * constants.DECK_PER_PILE
+        if self.decks is None:
+            self.decks = Decks(
+                Deck.from_array(array[i:i + deck_fields]) for i in
+                range(0, num_deck_fields, deck_fields))
+        else:
+            for i, deck in enumerate(self.decks):
+                deck.load(array[deck_fields * i:deck_fields * (i + 1)])
+            if isinstance(self.decks, Decks):
+                self.decks.recount()
+            else:
+                self.decks = Decks(self.decks)
+        others = array[num_deck_fields:]
+        num_victory, num_shout_die, deck_in_duel_index = others[:3]
+        self.num_victory = None if num_victory == -1 else num_victory
+        self.num_shout_die = None if num_shout_die == -1 else num_shout_die
+        if deck_in_duel_index == -1:
+            deck_in_duel_index = None
+        self._deck_in_duel_index = deck_in_duel_index
+        self.deck_in_duel = self.decks.in_duel
+        if len(others) > 3:  # arrays written before these were added
+            self.num_shout_done, self.num_shout_draw, recent_action = others[3:]
+            if recent_action == -1:
+                self.recent_action = None
+            else:
+                self.recent_action = constants.Action(recent_action)
+
+    def to_codes(self, out=None):
+        """Pack all cards, deck by deck, into a reusable buffer of ints."""
+        if out is None:
+            out = array.array('H', bytes(2 * constants.DECK_PER_PILE *
+                                         constants.CARD_PER_DECK))
+        i = 0
+        for deck in self.decks:
+            for code in deck.to_codes():
+                out[i] = code
+                i += 1
+        return out
 
     @classmethod
     def from_array(cls, array):
-        decks_array = numpy.array(array[0:9 * 19])
-        decks_reshaped = decks_array.reshape(9, -1)
-        decks = [Deck.from_array(deck_array) for deck_array in decks_reshaped]
-        num_victory = None if array[9 * 19] == -1 else array[9 * 19]
-        num_shout_die = None if array[9 * 19 + 1] == -1 else array[9 * 19 + 1]
-        deck_in_duel_index = None if array[9 * 19 + 2] == -1 else array[
-            9 * 19 + 2]
-        return cls(decks=decks, num_victory=num_victory,
-                   num_shout_die=num_shout_die,
-                   deck_in_duel_index=deck_in_duel_index)
+        player = cls()
+        player.load([int(field) for field in array])
+        return player
 
 
 class HumanPlayer(Player):
-    def __init__(self, prompt, forbidden_name=None):
-        super().__init__()
+    def __init__(self, prompt, forbidden_name=None, rng=random):
+        super().__init__(rng=rng)
         self.name = NameTextInput.from_human(prompt, forbidden_name).value
         self.joker_value_strategy = JokerValueStrategyTextInput.from_human(
             self.name).value
@@ -1083,8 +1324,7 @@ class HumanPlayer(Player):
 
     def decide_defense_deck(self, decks_opponent, num_victory_opponent,
                             num_shout_die_opponent, offense_deck=None):
-        undisclosed_decks = [deck for deck in decks_opponent if
-                             deck.is_undisclosed()]
+        undisclosed_decks = decks_opponent.undisclosed
         deck_input = DeckTextInput.from_human(self.name, True,
                                               undisclosed_decks)
         return deck_input.value
@@ -1113,10 +1353,19 @@ class HumanPlayer(Player):
 
 
 class ComputerPlayer(Player):
-    def __init__(self, forbidden_name=None):
-        super().__init__()
+    def __init__(self, forbidden_name=None, joker_value_strategy=None,
+                 joker_position_strategy=None, offense_deck_index_strategy=None,
+                 defense_deck_index_strategy=None, action_choice_strategy=None,
+                 rng=random):
+        super().__init__(
+            joker_value_strategy=joker_value_strategy,
+            joker_position_strategy=joker_position_strategy,
+            offense_deck_index_strategy=offense_deck_index_strategy,
+            defense_deck_index_strategy=defense_deck_index_strategy,
+            action_choice_strategy=action_choice_strategy, rng=rng)
         if self.name is None:
-            self.name = NameTextInput.auto_generate(forbidden_name).value
+            self.name = NameTextInput.auto_generate(forbidden_name,
+                                                    self.rng).value
         if self.joker_value_strategy is None:
             self.joker_value_strategy = RandomNumber
         if self.joker_position_strategy is None:
@@ -1133,7 +1382,7 @@ class ComputerPlayer(Player):
         strategy = self.offense_deck_index_strategy
         deck = strategy.apply(self.decks, decks_opponent, self.num_victory,
                               self.num_shout_die, num_victory_opponent,
-                              num_shout_die_opponent)
+                              num_shout_die_opponent, rng=self.rng)
         return deck
 
     def decide_defense_deck(self, decks_opponent, num_victory_opponent,
@@ -1141,118 +1390,96 @@ class ComputerPlayer(Player):
         strategy = self.defense_deck_index_strategy
         deck = strategy.apply(self.decks, decks_opponent, self.num_victory,
                               self.num_shout_die, num_victory_opponent,
-                              num_shout_die_opponent, offense_deck)
+                              num_shout_die_opponent, offense_deck,
+                              rng=self.rng)
         return deck
 
     @staticmethod
     def get_chances(decks_me, decks_opponent,
                     joker_value_strategy_me=SameAsMax):
         """get chances of winning, tying, and losing
-        assuming both player use SameAsMax for joker value strategy
+        assuming the opponent uses SameAsMax for joker value strategy
         """
 
-        def guess_joker_value(delegate_value, joker_value_strategy=SameAsMax):
-            """give an educated guess about the value of joker
-            (There is no guarantee that the return value is correct.)
+        def guess_joker_values(delegate_value, joker_value_strategy=SameAsMax):
+            """give the values the joker may equally likely have
+            (There is no guarantee that any of them is correct.)
             """
             if joker_value_strategy == Thirteen:
-                return 13
+                return 13,
             elif joker_value_strategy == SameAsMax:
-                return delegate_value
+                return delegate_value,
             elif joker_value_strategy == NextBiggest:
-                return delegate_value - 1
+                return delegate_value - 1,
             else:
-                return random.randint(1, delegate_value)
+                return tuple(range(1, delegate_value + 1))
+
+        def get_hidden_cards(decks, delegate_value, joker_values):
+            hidden_counts = decks.hidden_counts
+            hidden_cards = [joker_values] * hidden_counts[0]
+            for value in range(1, delegate_value + 1):
+                hidden_cards.extend([(value,)] * hidden_counts[value])
+            return hidden_cards
 
         # get my hidden cards
-        deck_in_duel_me = next(deck for deck in decks_me if deck.is_in_duel())
+        deck_in_duel_me = decks_me.in_duel
         num_opened = sum(1 for card in deck_in_duel_me if card.is_open())
         current_sum_me = sum(
             card.value for card in deck_in_duel_me if card.is_open())
         num_to_open = 3 - num_opened
         delegate_value_me = deck_in_duel_me.delegate().value
-        hidden_cards_me = []
-        for deck in decks_me:
-            for card in deck:
-                if not card.is_open():
-                    if card.is_joker() or card.value <= delegate_value_me:
-                        hidden_cards_me.append(card)
+        joker_values_me = guess_joker_values(delegate_value_me,
+                                             joker_value_strategy_me)
+        hidden_cards_me = get_hidden_cards(decks_me, delegate_value_me,
+                                           joker_values_me)
         # get the opponent's cards
-        deck_in_duel_opponent = next(
-            deck for deck in decks_opponent if deck.is_in_duel())
+        deck_in_duel_opponent = decks_opponent.in_duel
         current_sum_opponent = sum(
             card.value for card in deck_in_duel_opponent if
             card.is_open())
         delegate_value_opponent = deck_in_duel_opponent.delegate().value
-        hidden_cards_opponent = []
-        for deck in decks_opponent:
-            for card in deck:
-                if not card.is_open():
-                    if card.is_joker() or card.value <= delegate_value_opponent:
-                        hidden_cards_opponent.append(card)
+        joker_values_opponent = guess_joker_values(delegate_value_opponent)
+        hidden_cards_opponent = get_hidden_cards(decks_opponent,
+                                                 delegate_value_opponent,
+                                                 joker_values_opponent)
         # calculate the odds
-        num_win, num_lose, num_draw = 0, 0, 0
-        candidates_me = itertools.combinations(hidden_cards_me, num_to_open)
-        candidates_opponent = itertools.combinations(hidden_cards_opponent,
-                                                     num_to_open)
-        for cards_me in candidates_me:
-            for cards_opponent in candidates_opponent:
-                # get my sum
-                sum_me = current_sum_me
-                for card in cards_me:
-                    if card.is_joker():
-                        sum_me += guess_joker_value(delegate_value_me,
-                                                    joker_value_strategy_me)
-                    else:
-                        sum_me += card.value
-                # get opponent's sum
-                sum_opponent = current_sum_opponent
-                for card in cards_opponent:
-                    if card.is_joker():
-                        sum_opponent += guess_joker_value(
-                            delegate_value_opponent)
-                    else:
-                        sum_opponent += card.value
-                # compare
-                if sum_me > sum_opponent:
-                    num_win += 1
-                elif sum_me == sum_opponent:
-                    num_draw += 1
-                else:
-                    num_lose += 1
-        total = num_win + num_draw + num_lose
-        odds_win = round(num_win / total, 3)
-        odds_draw = round(num_draw / total, 3)
-        odds_lose = round(num_lose / total, 3)
+        odds_win, odds_draw, odds_lose = odds.duel_odds(
+            hidden_cards_me, current_sum_me, hidden_cards_opponent,
+            current_sum_opponent, num_to_open)
+        odds_win = round(odds_win, 3)
+        odds_draw = round(odds_draw, 3)
+        odds_lose = round(odds_lose, 3)
         return odds_win, odds_draw, odds_lose
 
     @classmethod
     def undisclosed_values(cls, decks):
-        values = set(rank.value for rank in constants.Rank)
-        disclosed_values = set(cls.disclosed_values(decks))
-        undisclosed_values = values.difference(disclosed_values)
-        return tuple(undisclosed_values)
+        return decks.undisclosed_values()
 
     @staticmethod
     def disclosed_values(decks):
-        values = set()
-        for deck in decks:
-            if not deck.is_undisclosed():
-                for card in deck.cards:
-                    if card.is_open():
-                        values.add(card.value)
-        return tuple(values)
+        return decks.disclosed_values()
 
     def shout(self, decks_opponent, num_victory_opponent,
               num_shout_die_opponent, round_, in_turn):
         strategy = self.action_choice_strategy
         action = strategy.apply(self.decks, decks_opponent, self.num_victory,
                                 self.num_shout_die, num_victory_opponent,
-                                num_shout_die_opponent, round_, in_turn)
+                                num_shout_die_opponent, round_, in_turn,
+                                rng=self.rng)
+        # A strategy cannot see every counter (e.g. num_shout_draw), so fall
+        # back to the default action instead of asking it again forever.
+        if action not in self.valid_actions(round_):
+            action = constants.Action.DARE if round_ in (1, 2) else None
         return Shout(self, action)
 
 
 class Card(object):
+    __slots__ = ('suit', 'colored', 'rank', 'value', '_open')
+    # plain dict lookups are much cheaper than Enum calls in the hot paths
+    _SUITS = {suit.value: suit for suit in constants.Suit}
+    _RANK_VALUES = {rank.name: rank.value for rank in constants.Rank}
+    _RANK_NAMES = {rank.value: rank.name for rank in constants.Rank}
+
     def __init__(self, suit, colored, rank, value=None, open_=False):
         self.suit = suit
         self.colored = colored
@@ -1282,27 +1509,80 @@ class Card(object):
     def is_joker(self):
         return self.suit is None
 
-    def to_array(self):
-        suit = -1 if self.suit is None else self.suit.value
+    def to_list(self, hide_unopened=False):
+        """With hide_unopened, an unopened card is written as an unknown
+        one: a joker without a value, so only its color shows.
+        """
         colored = -1 if self.colored is None else int(self.colored)
-        rank = -1 if self.rank is None else constants.Rank[self.rank].value
+        if hide_unopened and not self._open:
+            return [-1, colored, -1, -1, 0]
+        suit = -1 if self.suit is None else self.suit.value
+        rank = self._RANK_VALUES.get(self.rank, -1)
         value = -1 if self.value is None else self.value
         open_ = -1 if self._open is None else int(self._open)
-        list_ = [suit, colored, rank, value, open_]
-        return numpy.array(list_)
+        return [suit, colored, rank, value, open_]
+
+    def to_array(self, out=None):
+        list_ = self.to_list()
+        if out is None:
+            import numpy
+            return numpy.array(list_)
+        out[:len(list_)] = list_
+        return out
+
+    def load(self, array):
+        """Overwrite this card with the fields written by Card.to_list."""
+        suit, colored, rank, value, open_ = array
+        self.suit = self._SUITS.get(suit)
+        self.colored = None if colored == -1 else bool(colored)
+        if rank == -1:
+            self.rank = constants.JOKER if suit == -1 else None
+        else:
+            self.rank = self._RANK_NAMES[rank]
+        self.value = None if value == -1 else value
+        self._open = None if open_ == -1 else bool(open_)
+
+    def to_code(self):
+        """Pack the card into a 13-bit int (see constants.CARD_*)."""
+        suit = 0 if self.suit is None else self.suit.value
+        if self.rank is None or self.is_joker():
+            rank = 0
+        else:
+            rank = constants.Rank[self.rank].value
+        value = 0 if self.value is None else self.value
+        code = (suit << constants.CARD_SUIT_SHIFT |
+                rank << constants.CARD_RANK_SHIFT |
+                value << constants.CARD_VALUE_SHIFT)
+        if self.colored:
+            code |= constants.CARD_COLORED_BIT
+        if self._open:
+            code |= constants.CARD_OPEN_BIT
+        return code
 
     @classmethod
-    def from_array(cls, array):
-        suit, colored, rank, value, open_ = tuple(array)
-        suit = None if suit == -1 else constants.Suit(suit)
-        colored = None if colored == -1 else bool(colored)
-        rank = None if rank == -1 else constants.Rank(rank)
-        value = None if value == -1 else value
-        open_ = None if open_ == -1 else bool(open_)
+    def from_code(cls, code):
+        suit = code >> constants.CARD_SUIT_SHIFT & constants.CARD_FIELD_MASK
+        rank = code >> constants.CARD_RANK_SHIFT & constants.CARD_FIELD_MASK
+        value = code >> constants.CARD_VALUE_SHIFT & constants.CARD_FIELD_MASK
+        suit = None if suit == 0 else constants.Suit(suit)
+        rank = constants.JOKER if rank == 0 else constants.Rank(rank).name
+        value = None if value == 0 else value
+        colored = bool(code & constants.CARD_COLORED_BIT)
+        open_ = bool(code & constants.CARD_OPEN_BIT)
         return cls(suit, colored, rank, value, open_)
 
+    @classmethod
+    def from_array(cls, array):
+        card = cls(None, None, None)
+        card.load([int(field) for field in array])
+        return card
+
 
 class Deck(object):
+    __slots__ = ('_state', '_cards', '_index', '_opponent_deck_index',
+                 'card_to_open_index')
+    _STATES = {state.value: state for state in constants.DeckState}
+
     def __init__(self, cards, state=constants.DeckState.UNDISCLOSED, index=None,
                  opponent_deck_index=None, card_to_open_index=None):
         self._state = state
@@ -1317,6 +1597,12 @@ class Deck(object):
     def __getitem__(self, index):
         return self._cards[index]
 
+    def __iter__(self):
+        return iter(self._cards)
+
+    def __len__(self):
+        return len(self._cards)
+
     @property
     def index(self):
         return self._index
@@ -1346,13 +1632,11 @@ class Deck(object):
     def finish(self):
         self._state = constants.DeckState.FINISHED
 
-    def to_array(self):
-        if self._cards is None:
-            cards_flattened = []
-        else:
-            cards_generator = (card.to_array() for card in self._cards)
-            cards = numpy.array(cards_generator)
-            cards_flattened = cards.flatten()
+    def to_list(self, hide_unopened=False):
+        list_ = []
+        if self._cards is not None:
+            for card in self._cards:
+                list_.extend(card.to_list(hide_unopened))
         state = -1 if self._state is None else self._state.value
         index = -1 if self._index is None else self._index
         if self._opponent_deck_index is None:
@@ -1363,32 +1647,168 @@ class Deck(object):
             card_to_open_index = -1
         else:
             card_to_open_index = self.card_to_open_index
-        list_ = [*cards_flattened, state, index, opponent_deck_index,
-                 card_to_open_index]
-        return numpy.array(list_)
-
-    @classmethod
-    def from_array(cls, array):
-        cards = [array[0:5], array[5:10], array[10:15]]
-        state = array[15]
-        index = array[16]
-        opponent_deck_index = array[17]
-        card_to_open_index = array[18]
-        cards_flattened = numpy.array(cards).flatten()
-        if cards_flattened:
-            cards = [Card.from_array(card_array) for card_array in cards]
+        list_.extend((state, index, opponent_deck_index, card_to_open_index))
+        return list_
+
+    def to_array(self, out=None):
+        list_ = self.to_list()
+        if out is None:
+            import numpy
+            return numpy.array(list_)
+        out[:len(list_)] = list_
+        return out
+
+    def load(self, array):
+        """Overwrite this deck with the fields written by Deck.to_list."""
+        num_card_fields = 5 * constants.CARD_PER_DECK
+        if self._cards is None:
+            self._cards = tuple(Card.from_array(array[i:i + 5]) for i in
+                                range(0, num_card_fields, 5))
         else:
-            cards = None
-        state = None if state == -1 else constants.DeckState(state)
-        index = None if index == -1 else index
+            for i, card in enumerate(self._cards):
+                card.load(array[5 * i:5 * i + 5])
+        state, index, opponent_deck_index, card_to_open_index = array[
+            num_card_fields:num_card_fields + 4]
+        self._state = self._STATES.get(state)
+        self._index = None if index == -1 else index
         if opponent_deck_index == -1:
             opponent_deck_index = None
+        self._opponent_deck_index = opponent_deck_index
         if card_to_open_index == -1:
             card_to_open_index = None
-        return cls(cards, state, index, opponent_deck_index, card_to_open_index)
+        self.card_to_open_index = card_to_open_index
+
+    def to_codes(self):
+        return [card.to_code() for card in self._cards]
+
+    @classmethod
+    def from_array(cls, array):
+        deck = cls(None)
+        deck.load([int(field) for field in array])
+        return deck
+
+
+class Decks(tuple):
+    """The decks of a player, along with what they have revealed so far.
+
+    disclosed_mask has bit value - 1 set for every value opened in a deck
+    that has been in a duel, and hidden_counts[value] is the number of cards
+    of that value yet to be opened (jokers at index 0). The decks are also
+    indexed by state: undisclosed (ordered by index, which is the order of
+    their delegates' values), in_duel (a deck or None) and finished. Player
+    and Duel keep all of these up to date, so strategies can read them in
+    constant time. Player.decks is always a Decks once the decks are built
+    or loaded, and strategies rely on it.
+    """
+    ALL_VALUES = (1 << len(constants.Rank)) - 1
+
+    def __new__(cls, decks=()):
+        self = super().__new__(cls, decks)
+        self.recount()
+        return self
+
+    def recount(self):
+        """Rebuild the indexes from scratch, e.g. after a load."""
+        self.disclosed_mask = 0
+        self.hidden_counts = [0] * (len(constants.Rank) + 1)
+        self.undisclosed = ()
+        self.in_duel = None
+        self.finished = ()
+        for deck in self:
+            if deck.cards is None:
+                continue
+            for card in deck:
+                if not card.is_open():
+                    self.hidden_counts[0 if card.is_joker() else
+                                       card.value] += 1
+            if deck.is_undisclosed():
+                self.undisclosed += (deck,)
+            else:
+                self._disclose(deck)
+                if deck.is_in_duel():
+                    self.in_duel = deck
+                else:
+                    self.finished += (deck,)
+
+    def _disclose(self, deck):
+        for card in deck:
+            if card.is_open():
+                self.disclosed_mask |= 1 << card.value - 1
+
+    def enter_duel(self, deck):
+        self.undisclosed = tuple(undisclosed_deck for undisclosed_deck in
+                                 self.undisclosed if undisclosed_deck is not
+                                 deck)
+        self.in_duel = deck
+        self._disclose(deck)
+
+    def finish(self, deck):
+        """Open the rest of a deck whose duel has ended."""
+        for card in deck:
+            if not card.is_open():
+                card.open_up()
+                self.open_card(deck, card)
+        if self.in_duel is deck:
+            self.in_duel = None
+        self.finished += (deck,)
+
+    def open_card(self, deck, card):
+        self.hidden_counts[0 if card.is_joker() else card.value] -= 1
+        if not deck.is_undisclosed():
+            self.disclosed_mask |= 1 << card.value - 1
+
+    def public_hidden_counts(self):
+        """hidden_counts as the opponent can tell them: every pile holds a
+        joker and each value once per suit of its color, so the hidden cards
+        are whatever has not been seen open yet.
+        """
+        counts = [1] + [len(constants.Suit) // 2] * len(constants.Rank)
+        for deck in self:
+            if deck.cards is None:
+                continue
+            for card in deck:
+                if card.is_open():
+                    counts[0 if card.is_joker() else card.value] -= 1
+        return counts
+
+    def disclosed_values(self):
+        mask = self.disclosed_mask
+        return tuple(value for value in range(1, len(constants.Rank) + 1) if
+                     mask >> value - 1 & 1)
+
+    def undisclosed_values(self):
+        mask = self.disclosed_mask
+        return tuple(value for value in range(1, len(constants.Rank) + 1) if
+                     not mask >> value - 1 & 1)
+
+
+@functools.lru_cache(maxsize=None)
+def import_jsonpickle():
+    """Import jsonpickle on first use, so only the JSON paths pay for it,
+    and teach it to encode Decks as a list of its decks: it numbers the
+    references inside a tuple subclass wrongly and could not decode it. The
+    indexes are rebuilt on decoding. Decode games through this module.
+    """
+    import jsonpickle
+    import jsonpickle.handlers
+
+    class DecksHandler(jsonpickle.handlers.BaseHandler):
+        def flatten(self, obj, data):
+            data['decks'] = [self.context.flatten(deck, reset=False) for
+                             deck in obj]
+            return data
+
+        def restore(self, data):
+            return Decks(self.context.restore(deck, reset=False) for deck in
+                         data['decks'])
+
+    jsonpickle.handlers.register(Decks, DecksHandler)
+    return jsonpickle
 
 
 class Duel(object):
+    NUM_FIELDS = 5  # length of Duel.to_list()
+
     def __init__(self, player_red, player_black, index, time_started=None,
                  round_=1, over=False, time_ended=None, winner=None,
                  loser=None, state=constants.DuelState.UNSTARTED, offense=None,
@@ -1459,6 +1879,22 @@ class Duel(object):
     def is_over(self):
         return self._over
 
+    def to_list(self):
+        players = self.player_red, self.player_black
+        state = -1 if self._state is None else self._state.value
+        winner = -1 if self.winner is None else players.index(self.winner)
+        loser = -1 if self.loser is None else players.index(self.loser)
+        return [state, self._round, int(self._over), winner, loser]
+
+    def load(self, array):
+        """Overwrite this duel with the fields written by Duel.to_list."""
+        players = self.player_red, self.player_black
+        state, self._round, over, winner, loser = array
+        self._state = None if state == -1 else constants.DuelState(state)
+        self._over = bool(over)
+        self.winner = None if winner == -1 else players[winner]
+        self.loser = None if loser == -1 else players[loser]
+
     def end(self, state, winner=None, loser=None):
         self._over = True
         self.time_ended = time.time()
@@ -1484,9 +1920,9 @@ class Duel(object):
                     self.loser = self.defense
             self.winner.num_victory += 1
         for player in self.players:
-            player.deck_in_duel.finish()
-            for card in player.deck_in_duel:
-                card.open_up()
+            deck = player.deck_in_duel
+            deck.finish()
+            player.decks.finish(deck)
             player.deck_in_duel = None
             player.recent_action = None
 
@@ -1528,97 +1964,146 @@ class BlackPile(Pile):
 
 
 class OutputHandler(object):
+    STRATEGY_ATTRIBUTES = ('joker_value_strategy', 'joker_position_strategy',
+                           'offense_deck_index_strategy',
+                           'defense_deck_index_strategy',
+                           'action_choice_strategy')
+
     def __init__(self):
         self.states = []
         self.messages = []
+        self.players = None  # see describe_players
 
-    def save(self, game_state_in_json, message):
-        self.states.append(game_state_in_json)
+    def save(self, game_state, message):
+        """Save a Game.snapshot() (or a Game.to_json()) with its message."""
+        self.states.append(game_state)
         self.messages.append(message)
 
     @staticmethod
-    def display(game_state_in_json=None, message='', duration=0):
-        print('{:-^135}'.format(str()))
-        if game_state_in_json is None and message:
-            message_delimited = message.split('\n')
-            print('Message:  {}'.format(message_delimited[0]))
-            for line in message_delimited[1:]:
-                print('{}{}'.format(constants.INDENT, line))
-            time.sleep(duration)
-            return
-        game = jsonpickle.decode(game_state_in_json)
-        duel = game.duel_ongoing
-        row_format = '{:^15}' * constants.DECK_PER_PILE
-        red_role = '' if duel is None else (
-            'Offense' if game.player_red == duel.offense else 'Defense')
-
-        red_name = '{} ({})'.format(game.player_red.name, game.player_red.alias)
-        red_stats = 'Score {} / Die {}'.format(game.player_red.num_victory,
-                                               game.player_red.num_shout_die)
-        red_first_line = '{:^30}{:^75}{:^30}'.format(red_role, red_name,
-                                                     red_stats)
-        print(red_first_line)
-        red_decks = game.player_red.decks
-        red_numbers = (('< #{} >' if deck.is_in_duel() else '#{}').format(
-            deck.index + 1) for deck in red_decks)
-        red_number_line = row_format.format(*red_numbers)
-        print(red_number_line)
-        red_undisclosed_delegates = (
-            repr(deck[0]) if deck.is_undisclosed() else '' for deck in
-            red_decks)
-        print(row_format.format(*red_undisclosed_delegates))
-        red_opened_delegates = (
-            '' if deck.is_undisclosed() else repr(deck[0]) for deck in
-            red_decks)
-        print(row_format.format(*red_opened_delegates))
-        red_seconds = ('' if deck.is_undisclosed() else repr(deck[1]) for
-                       deck in red_decks)
-        print(row_format.format(*red_seconds))
-        red_lasts = ('' if deck.is_undisclosed() else repr(deck[2]) for
-                     deck in red_decks)
-        print(row_format.format(*red_lasts))
-        print()
-        print('{:^135}'.format(
-            '' if duel is None else '[Duel #{}]'.format(duel.index + 1)))
-        print()
-        black_decks = game.player_black.decks
-        black_lasts = ('' if deck.is_undisclosed() else repr(deck[2]) for
-                       deck in black_decks)
-        print(row_format.format(*black_lasts))
-        black_seconds = ('' if deck.is_undisclosed() else repr(deck[1])
-                         for deck in black_decks)
-        print(row_format.format(*black_seconds))
-        black_opened_delegates = (
-            '' if deck.is_undisclosed() else repr(deck[0]) for
-            deck in black_decks)
-        print(row_format.format(*black_opened_delegates))
-        black_undisclosed_delegate = (
-            repr(deck[0]) if deck.is_undisclosed() else '' for
-            deck in black_decks)
-        print(row_format.format(*black_undisclosed_delegate))
-        black_numbers = (
-            ('< #{} >' if deck.is_in_duel() else '#{}').format(
-                deck.index + 1) for deck in black_decks)
-        black_number_line = row_format.format(*black_numbers)
-        print(black_number_line)
-        black_role = '' if duel is None else (
-            'Offense' if game.player_black == duel.offense else 'Defense')
-        black_name = '{} (Player Black)'.format(game.player_black.name)
-        black_stats = 'Win {} / Die {}'.format(game.player_black.num_victory,
-                                               game.player_black.num_shout_die)
-        black_first_line = '{:^30}{:^75}{:^30}'.format(black_role, black_name,
-                                                       black_stats)
-        print(black_first_line)
+    def describe_players(game):
+        """Describe what a snapshot leaves out: who the players are."""
+
+        def name_of(strategy):
+            if strategy is None or isinstance(strategy, str):
+                return strategy
+            elif isinstance(strategy, type):
+                return strategy.__name__
+            else:
+                return type(strategy).__name__
+
+        descriptions = []
+        for player in game.players:
+            description = {'class': type(player).__name__,
+                           'name': player.name, 'alias': player.alias}
+            for attribute in OutputHandler.STRATEGY_ATTRIBUTES:
+                description[attribute] = name_of(getattr(player, attribute))
+            descriptions.append(description)
+        return descriptions
+
+    @staticmethod
+    def build_game(player_descriptions, snapshot=None):
+        """Rebuild a game from describe_players() and, optionally, restore a
+        snapshot into it. Strategies not defined in this module stay names.
+        """
+        players = []
+        for description in player_descriptions:
+            class_ = globals().get(description['class'], Player)
+            player = class_.__new__(class_)  # skip prompts of HumanPlayer
+            strategies = {
+                attribute: globals().get(description[attribute],
+                                         description[attribute]) for
+                attribute in OutputHandler.STRATEGY_ATTRIBUTES}
+            Player.__init__(player, name=description['name'],
+                            alias=description['alias'], **strategies)
+            players.append(player)
+        game = Game(*players)
+        if snapshot is not None:
+            game.restore(snapshot)
+        return game
+
+    def to_game(self, state):
+        """Turn a saved state, binary or JSON, back into a Game."""
+        if isinstance(state, str):
+            return import_jsonpickle().decode(state)
+        return self.build_game(self.players, state)
+
+    @staticmethod
+    def display(game_state=None, message='', duration=0):
+        if isinstance(game_state, str):
+            game_state = import_jsonpickle().decode(game_state)
+        lines = OutputHandler.frame_lines(game_state, message)
+        # one write per frame rather than one per line
+        sys.stdout.write('\n'.join(lines) + '\n')
+        sys.stdout.flush()
+        time.sleep(duration)
+
+    @staticmethod
+    def frame_lines(game=None, message=''):
+        """Lay out what display shows as a list of lines."""
+        lines = ['{:-^135}'.format(str())]
+        if game is not None:
+            duel = game.duel_ongoing
+            row_format = '{:^15}' * constants.DECK_PER_PILE
+            player_red = game.player_red
+            red_role = '' if duel is None else (
+                'Offense' if player_red == duel.offense else 'Defense')
+            red_name = '{} ({})'.format(player_red.name, player_red.alias)
+            red_stats = 'Score {} / Die {}'.format(player_red.num_victory,
+                                                   player_red.num_shout_die)
+            lines.append('{:^30}{:^75}{:^30}'.format(red_role, red_name,
+                                                     red_stats))
+            red_rows = OutputHandler._deck_rows(player_red.decks, row_format)
+            lines.extend(red_rows)
+            lines.append('')
+            lines.append('{:^135}'.format(
+                '' if duel is None else '[Duel #{}]'.format(duel.index + 1)))
+            lines.append('')
+            player_black = game.player_black
+            black_rows = OutputHandler._deck_rows(player_black.decks,
+                                                  row_format)
+            lines.extend(reversed(black_rows))
+            black_role = '' if duel is None else (
+                'Offense' if player_black == duel.offense else 'Defense')
+            black_name = '{} (Player Black)'.format(player_black.name)
+            black_stats = 'Win {} / Die {}'.format(player_black.num_victory,
+                                                   player_black.num_shout_die)
+            lines.append('{:^30}{:^75}{:^30}'.format(black_role, black_name,
+                                                     black_stats))
         if message:
             message_delimited = message.split('\n')
-            print('Message:  {}'.format(message_delimited[0]))
+            lines.append('Message:  {}'.format(message_delimited[0]))
             for line in message_delimited[1:]:
-                print('{}{}'.format(constants.INDENT, line))
-        time.sleep(duration)
+                lines.append('{}{}'.format(constants.INDENT, line))
+        return lines
+
+    @staticmethod
+    def _deck_rows(decks, row_format):
+        """Rows of deck numbers, undisclosed delegates, then the cards of
+        disclosed decks, as seen from the owner's side of the table.
+        """
+        numbers, undisclosed, firsts, seconds, lasts = [], [], [], [], []
+        for deck in decks:
+            numbers.append(('< #{} >' if deck.is_in_duel() else '#{}').format(
+                deck.index + 1))
+            if deck.is_undisclosed():
+                undisclosed.append(repr(deck[0]))
+                firsts.append('')
+                seconds.append('')
+                lasts.append('')
+            else:
+                undisclosed.append('')
+                firsts.append(repr(deck[0]))
+                seconds.append(repr(deck[1]))
+                lasts.append(repr(deck[2]))
+        return [row_format.format(*row) for row in
+                (numbers, undisclosed, firsts, seconds, lasts)]
 
     @staticmethod
-    def extract_file_name(game_state_in_json):
-        game = jsonpickle.decode(game_state_in_json)
+    def extract_file_name(game_state, extension='.json'):
+        if isinstance(game_state, Game):
+            game = game_state
+        else:
+            game = import_jsonpickle().decode(game_state)
         red_class = game.player_red.__class__.__name__
         red_name = game.player_red.name
         black_class = game.player_black.__class__.__name__
@@ -1628,9 +2113,9 @@ class OutputHandler(object):
         datetime_started = datetime.datetime.fromtimestamp(time_started_float)
         datetime_str = datetime.datetime.strftime(datetime_started,
                                                   '%Y%m%d%H%M%S')
-        file_name = '{}({}){}({}){}.json'.format(red_class, red_name,
-                                                 black_class, black_name,
-                                                 datetime_str)
+        file_name = '{}({}){}({}){}{}'.format(red_class, red_name,
+                                              black_class, black_name,
+                                              datetime_str, extension)
         return file_name
 
     @staticmethod
@@ -1642,42 +2127,375 @@ class OutputHandler(object):
             else:
                 json.dump(game_state_json, file)
 
+    def export_snapshots_to_file(self, file_path, final_state_only=False):
+        """Write the players, messages and fixed-width snapshots to a file.
+
+        Layout: file magic, version, header length, JSON header (players and
+        messages), record size, then the snapshots back to back, so the final
+        state is always the last record_size bytes of the file.
+        """
+        states = self.states[-1:] if final_state_only else self.states
+        messages = self.messages[-1:] if final_state_only else self.messages
+        header = json.dumps({'players': self.players, 'messages': messages})
+        header = header.encode('utf-8')
+        record_size = len(states[0])
+        with open(file_path, 'wb') as file:
+            file.write(struct.pack('<4sBI', constants.SNAPSHOT_FILE_MAGIC,
+                                   constants.SNAPSHOT_VERSION, len(header)))
+            file.write(header)
+            file.write(struct.pack('<I', record_size))
+            for state in states:
+                file.write(state)
+
+    def import_snapshots(self, file_path, final_state_only=False):
+        with open(file_path, 'rb') as file:
+            magic, version, header_size = struct.unpack(
+                '<4sBI', file.read(struct.calcsize('<4sBI')))
+            if magic != constants.SNAPSHOT_FILE_MAGIC:
+                raise ValueError('This is not a snapshot file.')
+            if version != constants.SNAPSHOT_VERSION:
+                raise ValueError('Unsupported snapshot version.')
+            header = json.loads(file.read(header_size).decode('utf-8'))
+            record_size, = struct.unpack('<I', file.read(4))
+            if final_state_only:
+                file.seek(-record_size, os.SEEK_END)
+            content = file.read()
+        self.players = header['players']
+        self.messages = header['messages'][-1:] if final_state_only else \
+            header['messages']
+        self.states = [content[i:i + record_size] for i in
+                       range(0, len(content), record_size)]
+
+    @classmethod
+    def load_final_game(cls, file_path):
+        """Read only what is needed to rebuild the final state of a file."""
+        output_handler = cls()
+        if file_path.endswith(constants.REPLAY_FILE_EXTENSION):
+            players, final_state = ReplayLog.import_final_state(file_path)
+            return cls.build_game(players, final_state)
+        elif file_path.endswith(constants.SNAPSHOT_FILE_EXTENSION):
+            output_handler.import_snapshots(file_path, final_state_only=True)
+        else:
+            output_handler.import_from_json(file_path)
+        return output_handler.to_game(output_handler.states[-1])
+
     def export_game_states(self, file_location=None, file_name=None,
-                           final_state_only=False):
+                           final_state_only=False, export_format='binary'):
         if not self.states:
             raise Exception('No game states found in this OutputHandler.')
         if file_location is None:
-            current_file_path = os.path.abspath(__file__)
-            current_directory_path = os.path.dirname(current_file_path)
-            directory_name = 'json'
-            file_location = os.path.join(current_directory_path, directory_name)
-            if not os.path.exists(file_location):
-                os.makedirs(file_location)
+            file_location = self.default_file_location()
+        if export_format == 'json':
+            extension = '.json'
+        elif export_format == 'binary':
+            extension = constants.SNAPSHOT_FILE_EXTENSION
+        else:
+            raise ValueError('Unknown export format.')
         if file_name is None:
-            last_game_state = self.states[-1]
-            file_name = self.extract_file_name(last_game_state)
+            last_game = self.to_game(self.states[-1])
+            file_name = self.extract_file_name(last_game, extension)
         file_path = os.path.join(file_location, file_name)
-        self.export_json_to_file(self.states, file_path, final_state_only)
+        if export_format == 'json':
+            states = [state if isinstance(state, str) else
+                      self.to_game(state).to_json() for state in self.states]
+            self.export_json_to_file(states, file_path, final_state_only)
+        else:
+            self.export_snapshots_to_file(file_path, final_state_only)
+
+    @staticmethod
+    def default_file_location():
+        current_file_path = os.path.abspath(__file__)
+        current_directory_path = os.path.dirname(current_file_path)
+        directory_name = 'json'
+        file_location = os.path.join(current_directory_path, directory_name)
+        if not os.path.exists(file_location):
+            os.makedirs(file_location)
+        return file_location
+
+    def export_replay(self, replay_log, file_location=None, file_name=None):
+        if file_location is None:
+            file_location = self.default_file_location()
+        if file_name is None:
+            final_game = replay_log.state_at(replay_log.num_steps)
+            file_name = self.extract_file_name(final_game,
+                                               constants.REPLAY_FILE_EXTENSION)
+        file_path = os.path.join(file_location, file_name)
+        replay_log.export_to_file(file_path)
 
     def import_from_json(self, file_path):
         with open(file_path) as file:
             content = file.read()
-            self.states = jsonpickle.decode(content)
+            self.states = import_jsonpickle().decode(content)
+
+
+class TerminalRenderer(object):
+    """Draw frames like OutputHandler.display, rewriting only the parts of
+    the screen that changed since the previous frame.
+
+    A frame is laid out straight from a live Game, or from a snapshot
+    restored into a game built from player descriptions (see
+    OutputHandler.describe_players), and sent to the terminal with a single
+    write using ANSI cursor movements.
+    """
+
+    def __init__(self, players=None, file_descriptor=None):
+        self._game = (None if players is None else
+                      OutputHandler.build_game(players))
+        if file_descriptor is None:
+            file_descriptor = sys.stdout.fileno()
+        self._file_descriptor = file_descriptor
+        self._lines = None  # lines of the previous frame
+
+    def render(self, game_state=None, message=''):
+        """Draw a Game or a snapshot; return the number of bytes written."""
+        if isinstance(game_state, (bytes, bytearray)):
+            game_state = self._game.restore(game_state)
+        lines = OutputHandler.frame_lines(game_state, message)
+        chunks = []
+        if self._lines is None:
+            chunks.append('\x1b[H\x1b[2J')  # start from a clear screen
+            self._lines = []
+        for row, line in enumerate(lines):
+            previous = self._lines[row] if row < len(self._lines) else ''
+            if line == previous:
+                continue
+            start = 0
+            while (start < len(line) and start < len(previous) and
+                   line[start] == previous[start]):
+                start += 1
+            chunks.append('\x1b[{};{}H'.format(row + 1, start + 1))
+            if len(line) == len(previous):
+                end = len(line)
+                while line[end - 1] == previous[end - 1]:
+                    end -= 1
+                chunks.append(line[start:end])
+            else:
+                chunks.append(line[start:] + '\x1b[K')
+        for row in range(len(lines), len(self._lines)):
+            chunks.append('\x1b[{};1H\x1b[K'.format(row + 1))
+        chunks.append('\x1b[{};1H'.format(len(lines) + 1))
+        self._lines = lines
+        data = ''.join(chunks).encode()
+        sys.stdout.flush()  # keep the order of anything printed before
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._file_descriptor, view):]
+        return len(data)
+
+    def display(self, game_state=None, message='', duration=0):
+        """Drop-in replacement of OutputHandler.display."""
+        self.render(game_state, message)
+        time.sleep(duration)
+
+
+def watch(file_path, time_scale=1.):
+    """Replay a saved replay log (.dodr) on the terminal."""
+    replay_log = ReplayLog.import_from_file(file_path)
+    renderer = TerminalRenderer(replay_log.players)
+    for game, message, duration in replay_log.replay():
+        renderer.display(game, message, (duration or 0) * time_scale)
+
+
+class ReplayLog(object):
+    """A game recorded as its initial deal plus the stream of inputs.
+
+    Any intermediate state is rebuilt by restoring the closest keyframe (a
+    Game.snapshot taken every keyframe_interval steps and at the end of the
+    game) and re-executing Game.prepare/process from there.
+    """
+    KEYFRAME_INTERVAL = 32
+    NOT_HEARD = 0xff  # no shout from that player in a ShoutInput
+    OFFENSE_DECK, DEFENSE_DECK, SHOUTS = range(3)
+
+    def __init__(self, players=None, initial_state=None, seed=None,
+                 keyframe_interval=KEYFRAME_INTERVAL):
+        self.players = players  # see OutputHandler.describe_players
+        self.initial_state = initial_state
+        self.seed = seed
+        self.keyframe_interval = keyframe_interval
+        self.inputs = bytearray()  # three bytes per step
+        self.keyframes = {}  # step -> snapshot after that step
+
+    @classmethod
+    def start(cls, game, seed=None, keyframe_interval=KEYFRAME_INTERVAL):
+        """Begin a log right after the decks of the game have been built."""
+        players = OutputHandler.describe_players(game)
+        return cls(players, game.snapshot(), seed, keyframe_interval)
+
+    @property
+    def num_steps(self):
+        return len(self.inputs) // 3
+
+    def process(self, game, intra_duel_input):
+        """Record an input, have the game process it and return the result.
+        """
+        if isinstance(intra_duel_input, ShoutKeypressInput):
+            intra_duel_input = game.keys_to_shouts(intra_duel_input)
+        self.inputs += self.encode_input(game, intra_duel_input)
+        message, duration = game.process(intra_duel_input)
+        step = self.num_steps
+        if step % self.keyframe_interval == 0 or game.is_over():
+            self.keyframes[step] = game.snapshot()
+        return message, duration
+
+    def encode_input(self, game, intra_duel_input):
+        if isinstance(intra_duel_input, OffenseDeckIndexInput):
+            return bytes((self.OFFENSE_DECK, intra_duel_input.value, 0))
+        elif isinstance(intra_duel_input, DefenseDeckIndexInput):
+            return bytes((self.DEFENSE_DECK, intra_duel_input.value, 0))
+        elif isinstance(intra_duel_input, ShoutInput):
+            # only the first shout of each player is ever heard
+            actions = {}
+            for shout in intra_duel_input.value:
+                if shout.player not in actions:
+                    actions[shout.player] = shout.action
+            fields = [self.SHOUTS]
+            for player in game.players:
+                if player not in actions:
+                    fields.append(self.NOT_HEARD)
+                elif actions[player] is None:
+                    fields.append(0)
+                else:
+                    fields.append(actions[player].value)
+            return bytes(fields)
+        else:
+            raise ValueError('Invalid input')
+
+    def decode_input(self, game, step):
+        kind, first, second = self.inputs[3 * step:3 * step + 3]
+        if kind == self.OFFENSE_DECK:
+            return OffenseDeckIndexInput(first)
+        elif kind == self.DEFENSE_DECK:
+            return DefenseDeckIndexInput(first)
+        shouts = []
+        for player, field in zip(game.players, (first, second)):
+            if field != self.NOT_HEARD:
+                action = None if field == 0 else constants.Action(field)
+                shouts.append(Shout(player, action))
+        return ShoutInput(shouts)
+
+    def replay(self, game=None, start=0, stop=None):
+        """Yield (game, message, duration) for every prepare and process from
+        step start up to step stop, mutating a single game along the way.
+        """
+        if stop is None:
+            stop = self.num_steps
+        game = self.state_at(start, game)
+        return self._run(game, start, stop)
+
+    def _run(self, game, start, stop):
+        for step in range(start, stop):
+            if game.duel_ongoing is None or game.duel_ongoing.is_over():
+                game.to_next_duel()
+            message, duration = game.prepare()
+            yield game, message, duration
+            intra_duel_input = self.decode_input(game, step)
+            message, duration = game.process(intra_duel_input)
+            yield game, message, duration
+
+    def state_at(self, step, game=None):
+        """Rebuild the game as it was after the given number of steps."""
+        if game is None:
+            game = OutputHandler.build_game(self.players)
+        keyframe_steps = [keyframe_step for keyframe_step in self.keyframes if
+                          keyframe_step <= step]
+        if keyframe_steps:
+            start = max(keyframe_steps)
+            game.restore(self.keyframes[start])
+        else:
+            start = 0
+            game.restore(self.initial_state)
+        for _ in self._run(game, start, step):
+            pass
+        return game
+
+    def to_output_handler(self):
+        """Expand the log into the states and messages of every step."""
+        output_handler = OutputHandler()
+        output_handler.players = self.players
+        for game, message, _ in self.replay():
+            output_handler.save(game.snapshot(), message)
+        return output_handler
+
+    def export_to_file(self, file_path):
+        """Layout: file magic, version, header length, JSON header, record
+        size, initial state, number of steps, inputs, number of keyframes,
+        their steps, then the keyframes in order, so the final state is the
+        last record_size bytes of the file.
+        """
+        header = json.dumps({'players': self.players, 'seed': self.seed,
+                             'keyframe_interval': self.keyframe_interval})
+        header = header.encode('utf-8')
+        steps = sorted(self.keyframes)
+        with open(file_path, 'wb') as file:
+            file.write(struct.pack('<4sBI', constants.REPLAY_FILE_MAGIC,
+                                   constants.SNAPSHOT_VERSION, len(header)))
+            file.write(header)
+            file.write(struct.pack('<I', len(self.initial_state)))
+            file.write(self.initial_state)
+            file.write(struct.pack('<I', self.num_steps))
+            file.write(self.inputs)
+            file.write(struct.pack('<I', len(steps)))
+            file.write(array.array('I', steps).tobytes())
+            for step in steps:
+                file.write(self.keyframes[step])
+
+    @classmethod
+    def import_from_file(cls, file_path):
+        with open(file_path, 'rb') as file:
+            magic, version, header_size = struct.unpack(
+                '<4sBI', file.read(struct.calcsize('<4sBI')))
+            if magic != constants.REPLAY_FILE_MAGIC:
+                raise ValueError('This is not a replay file.')
+            if version != constants.SNAPSHOT_VERSION:
+                raise ValueError('Unsupported replay version.')
+            header = json.loads(file.read(header_size).decode('utf-8'))
+            record_size, = struct.unpack('<I', file.read(4))
+            initial_state = file.read(record_size)
+            num_steps, = struct.unpack('<I', file.read(4))
+            inputs = file.read(3 * num_steps)
+            num_keyframes, = struct.unpack('<I', file.read(4))
+            steps = array.array('I', file.read(4 * num_keyframes))
+            replay_log = cls(header['players'], initial_state,
+                             header['seed'], header['keyframe_interval'])
+            replay_log.inputs = bytearray(inputs)
+            for step in steps:
+                replay_log.keyframes[step] = file.read(record_size)
+        return replay_log
+
+    @staticmethod
+    def import_final_state(file_path):
+        """Read only the players and the final keyframe of a replay file."""
+        with open(file_path, 'rb') as file:
+            magic, version, header_size = struct.unpack(
+                '<4sBI', file.read(struct.calcsize('<4sBI')))
+            if magic != constants.REPLAY_FILE_MAGIC:
+                raise ValueError('This is not a replay file.')
+            header = json.loads(file.read(header_size).decode('utf-8'))
+            record_size, = struct.unpack('<I', file.read(4))
+            file.seek(-record_size, os.SEEK_END)
+            final_state = file.read(record_size)
+        return header['players'], final_state
 
 
 def main(num_human_players=1, suppress_output=False, save_all=False,
-         save_result=False):
+         save_result=False, export_format='binary', seed=None, redraw=False):
     output_handler = OutputHandler()
+    display = TerminalRenderer().display if redraw else output_handler.display
+    import seeding
+    seed_stream = seeding.SeedStream(seed)
+    game_rng, rng1, rng2 = seed_stream.rngs(1, 3)[0]
 
     if num_human_players == 2:
-        player1 = HumanPlayer('Player 1, enter your name: ')
-        player2 = HumanPlayer('Player 2, enter your name: ', player1.name)
+        player1 = HumanPlayer('Player 1, enter your name: ', rng=rng1)
+        player2 = HumanPlayer('Player 2, enter your name: ', player1.name,
+                              rng=rng2)
     elif num_human_players == 1:
-        player1 = HumanPlayer('Player 1, enter your name: ')
-        player2 = ComputerPlayer(player1.name)
+        player1 = HumanPlayer('Player 1, enter your name: ', rng=rng1)
+        player2 = ComputerPlayer(player1.name, rng=rng2)
     elif num_human_players == 0:
-        player1 = ComputerPlayer()
-        player2 = ComputerPlayer(player1.name)
+        player1 = ComputerPlayer(rng=rng1)
+        player2 = ComputerPlayer(player1.name, rng=rng2)
     else:
         raise Exception('Invalid number of human players')
 
@@ -1687,9 +2505,10 @@ def main(num_human_players=1, suppress_output=False, save_all=False,
             player1.name, player2.name)
         message += '\nLet\'s flip a coin to decide who will be the Player Red!'
         duration = constants.Duration.BEFORE_COIN_TOSS
-        output_handler.display(message=message, duration=duration)
+        display(message=message, duration=duration)
 
-    player_red, player_black = RandomPlayerOrder(player1, player2).players
+    player_red, player_black = RandomPlayerOrder(player1, player2,
+                                                 game_rng).players
     # player_red, player_black = player1, player2
 
     if not suppress_output:
@@ -1697,33 +2516,45 @@ def main(num_human_players=1, suppress_output=False, save_all=False,
             player_red.name)
         message += '\n{}, you are the Player Black.'.format(player_black.name)
         duration = constants.Duration.AFTER_COIN_TOSS
-        output_handler.display(message=message, duration=duration)
+        display(message=message, duration=duration)
 
     game = Game(player_red, player_black)
     game.distribute_piles()
-    game.build_decks()
+    game.build_decks(seed_stream.shuffle_orders(1)[0])
+    output_handler.players = OutputHandler.describe_players(game)
+    replay_log = ReplayLog.start(game, seed_stream.seed) if save_all else None
 
     if not suppress_output:
         message = "Let's start DieOrDare!\nHere we go!"
         duration = constants.Duration.BEFORE_GAME_START
-        output_handler.display(message=message, duration=duration)
+        display(message=message, duration=duration)
 
     while not game.is_over():
         duel = game.to_next_duel()
         while not duel.is_over():
             message, duration = game.prepare()
-            if save_all or save_result:
-                output_handler.save(game.to_json(), message)
-            output_handler.display(game.to_json(), message, duration)
+            if save_result:
+                output_handler.save(game.snapshot(), message)
+            if not suppress_output:
+                display(game, message, duration)
             user_input = game.accept()
-            message, duration = game.process(user_input)
-            if save_all or save_result:
-                output_handler.save(game.to_json(), message)
-            output_handler.display(game.to_json(), message, duration)
+            if save_all:
+                message, duration = replay_log.process(game, user_input)
+            else:
+                message, duration = game.process(user_input)
+            if save_result:
+                output_handler.save(game.snapshot(), message)
+            if not suppress_output:
+                display(game, message, duration)
     if save_all:
-        output_handler.export_game_states(final_state_only=False)
+        if export_format == 'json':
+            output_handler = replay_log.to_output_handler()
+            output_handler.export_game_states(export_format='json')
+        else:
+            output_handler.export_replay(replay_log)
     elif save_result:
-        output_handler.export_game_states(final_state_only=True)
+        output_handler.export_game_states(final_state_only=True,
+                                          export_format=export_format)
 
 
 if __name__ == '__main__':
@@ -1736,11 +2567,45 @@ if __name__ == '__main__':
                         type=int, default=1)  # silently ignores negative inputs
     group = parser.add_mutually_exclusive_group()
     group.add_argument('--save-all', action='store_true',
-                       help='save all command-line output to a JSON file')
+                       help='save all command-line output to a file')
     group.add_argument('--save-result-only', action='store_true',
-                       help='save only the result to a JSON file')
+                       help='save only the result to a file')
+    parser.add_argument('--json', action='store_true',
+                        help='save to JSON instead of binary snapshots')
+    parser.add_argument('-s', '--seed', help='master seed of the games',
+                        type=int, default=None)
+    parser.add_argument('--redraw', action='store_true',
+                        help='redraw only what changed instead of scrolling')
+    parser.add_argument('--watch', help='replay a saved .dodr file instead',
+                        default=None)
+    parser.add_argument('-t', '--time-scale', help='factor of every pause '
+                                                   'when watching',
+                        type=float, default=1.)
+    parser.add_argument('--instrument', action='store_true',
+                        help='time the phases of the game loop and the '
+                             'strategies and print a summary at the end')
+    parser.add_argument('--instrument-output', default=None,
+                        help='also write the timings to this JSON file')
     args = parser.parse_args()
+    export_format = 'json' if args.json else 'binary'
+    # run the imported module so that pickled classes refer to die_or_dare
+    # rather than __main__ and can be decoded by analysis.py
+    import die_or_dare
+    if args.watch is not None:
+        die_or_dare.watch(args.watch, args.time_scale)
+        parser.exit()
+    instrumentation = None
+    if args.instrument or args.instrument_output is not None:
+        import instrumentation
+        instrumentation.enable()
     for trial_index in range(args.repeat):
         if args.repeat > 1:
             print('Game #{}'.format(trial_index + 1))
-        main(args.humans, args.quiet, args.save_all, args.save_result_only)
+        seed = None if args.seed is None else (args.seed, trial_index)
+        die_or_dare.main(args.humans, args.quiet, args.save_all,
+                         args.save_result_only, export_format, seed,
+                         args.redraw)
+    if instrumentation is not None:
+        print(instrumentation.summary())
+        if args.instrument_output is not None:
+            instrumentation.dump(args.instrument_output)
@@ -0,0 +1,237 @@
+import argparse
+import constants
+import die_or_dare
+import numpy
+import seeding
+import time
+
+NUM_CARDS = constants.DECK_PER_PILE * constants.CARD_PER_DECK
+# decisions the agent is asked for
+OFFENSE_DECK, DEFENSE_DECK, SHOUT = range(3)
+# actions: deck indexes first, then no shout and the shouts by Action value
+PASS = constants.DECK_PER_PILE
+NUM_ACTIONS = PASS + 1 + len(constants.Action)
+ACTIONS = {PASS: None}
+ACTIONS.update({PASS + action.value: action for action in constants.Action})
+ACTION_INDEXES = {action: index for index, action in ACTIONS.items()}
+# layout of an observation, first the agent's side, then the opponent's
+VALUES, OPEN, DECK_STATES = (slice(0, NUM_CARDS),
+                             slice(NUM_CARDS, 2 * NUM_CARDS),
+                             slice(2 * NUM_CARDS,
+                                   2 * NUM_CARDS + constants.DECK_PER_PILE))
+SIDE_SIZE = DECK_STATES.stop
+(VICTORY_ME, DIE_ME, DRAW_ME, VICTORY_OPPONENT, DIE_OPPONENT,
+ DRAW_OPPONENT, DUEL_INDEX, ROUND, IN_TURN, DECISION) = range(
+    2 * SIDE_SIZE, 2 * SIDE_SIZE + 10)
+OBSERVATION_SIZE = DECISION + 1
+UNDISCLOSED, IN_DUEL, FINISHED = (state.value for state in
+                                  constants.DeckState)
+
+
+class DieOrDareEnv(object):
+    """Play DieOrDare as one seat against a ComputerPlayer, gym style.
+
+    reset(seed) and step(action) return the observation of the agent's next
+    decision: the values of its cards, which cards are open and the deck
+    states (DeckState values), then the same for the opponent with unopened
+    values as 0, then the counters of both, the duel index, the round,
+    whether the agent is the offense and the decision (OFFENSE_DECK,
+    DEFENSE_DECK or SHOUT). See the slices and indexes at the top of the
+    module.
+
+    The observation and the action mask are preallocated and rewritten in
+    place on every call, so copy them to keep them. Actions 0 to 8 pick a
+    deck (the agent's own for the offense deck, the opponent's for the
+    defense deck), PASS means no shout and PASS + Action.value a shout.
+
+    Strategies are keyword arguments of ComputerPlayer, as in
+    simulation.new_game; the agent's are only used to build its decks. seat
+    is 0 to always play Player Red, 1 for Player Black, or None to take one
+    at random for every game.
+    """
+
+    def __init__(self, opponent_strategies=None, agent_strategies=None,
+                 seat=None):
+        self.opponent_strategies = opponent_strategies or {}
+        self.agent_strategies = agent_strategies or {}
+        self.seat = seat
+        self.observation = numpy.zeros(OBSERVATION_SIZE, dtype=numpy.int8)
+        self.action_mask = numpy.zeros(NUM_ACTIONS, dtype=bool)
+        self.seed_stream = seeding.SeedStream()
+        self.game = None
+        self.agent = None
+        self.opponent = None
+        self.decision = None
+        self._values_opponent = numpy.zeros(NUM_CARDS, dtype=numpy.int8)
+        # views into the observation, per side
+        shape = constants.DECK_PER_PILE, constants.CARD_PER_DECK
+        self._sides = []
+        for offset in 0, SIDE_SIZE:
+            side = self.observation[offset:offset + SIDE_SIZE]
+            self._sides.append((side[VALUES], side[OPEN].reshape(shape),
+                                side[DECK_STATES]))
+
+    def reset(self, seed=None):
+        """Start a new game and return (observation, info).
+
+        A seed starts a new stream of games; without one the games go on
+        from the current stream.
+        """
+        if seed is not None:
+            self.seed_stream = seeding.SeedStream(seed)
+        seat_rng, rng_agent, rng_opponent = self.seed_stream.rngs(1, 3)[0]
+        orders = self.seed_stream.shuffle_orders(1)[0]
+        self.agent = die_or_dare.ComputerPlayer(rng=rng_agent,
+                                                **self.agent_strategies)
+        self.opponent = die_or_dare.ComputerPlayer(self.agent.name,
+                                                   rng=rng_opponent,
+                                                   **self.opponent_strategies)
+        seat = self.seat
+        if seat is None:
+            seat = int(seat_rng.random() > .5)
+        if seat == 0:
+            self.game = die_or_dare.Game(self.agent, self.opponent)
+        else:
+            self.game = die_or_dare.Game(self.opponent, self.agent)
+        self.game.distribute_piles()
+        self.game.build_decks(orders)
+        self.observation[VALUES] = [card.value for deck in self.agent.decks
+                                    for card in deck]
+        self._values_opponent[:] = [card.value for deck in self.opponent.decks
+                                    for card in deck]
+        self._advance()
+        return self.observation, self._info()
+
+    def step(self, action):
+        """Take the action index for the pending decision and return
+        (observation, reward, terminated, truncated, info).
+
+        The reward is 1 when the agent wins, -1 when it loses and 0 until the
+        game is over.
+        """
+        if self.decision is None:
+            raise ValueError('The game is over; call reset.')
+        if not self.action_mask[action]:
+            raise ValueError('Invalid action: {}'.format(action))
+        game = self.game
+        if self.decision == OFFENSE_DECK:
+            game.process(die_or_dare.OffenseDeckIndexInput(action))
+        elif self.decision == DEFENSE_DECK:
+            game.process(die_or_dare.DefenseDeckIndexInput(action))
+        else:
+            duel = game.duel_ongoing
+            in_turn = self.opponent == duel.offense
+            agent = self.agent
+            opponent_shout = self.opponent.shout(
+                agent.decks, agent.num_victory, agent.num_shout_die,
+                duel.round_, in_turn)
+            shouts = [die_or_dare.Shout(agent, ACTIONS[action]),
+                      opponent_shout]
+            if in_turn:
+                shouts.reverse()
+            game.process(die_or_dare.ShoutInput(shouts))
+        self._advance()
+        reward = 0
+        terminated = game.is_over()
+        if terminated:
+            reward = 1 if game.winner == self.agent else -1
+        return self.observation, reward, terminated, False, self._info()
+
+    def _info(self):
+        return {'action_mask': self.action_mask}
+
+    def _advance(self):
+        """Play on until the agent has to decide or the game is over."""
+        game = self.game
+        self.decision = None
+        while not game.is_over():
+            duel = game.duel_ongoing
+            if duel is None or duel.is_over():
+                duel = game.to_next_duel()
+            game.prepare()
+            last_duel = game.duel_index == constants.DECK_PER_PILE - 1
+            if duel.offense.deck_in_duel is None:
+                if duel.offense == self.agent and not last_duel:
+                    self.decision = OFFENSE_DECK
+            elif duel.defense.deck_in_duel is None:
+                if duel.offense == self.agent and not last_duel:
+                    self.decision = DEFENSE_DECK
+            else:
+                self.decision = SHOUT
+            if self.decision is not None:
+                break
+            game.process(game.accept())
+        self._observe()
+
+    def _observe(self):
+        """Write the observation from the deck states: only the delegate of
+        an undisclosed deck is open and every card of a finished one, so
+        just the cards of the decks in duel are looked at.
+        """
+        observation = self.observation
+        game = self.game
+        agent = self.agent
+        opponent = self.opponent
+        for decks, (_, opened, states) in zip((agent.decks, opponent.decks),
+                                              self._sides):
+            states[:] = UNDISCLOSED
+            opened[:] = False
+            opened[:, 0] = True
+            for deck in decks.finished:
+                states[deck.index] = FINISHED
+                opened[deck.index] = True
+            deck = decks.in_duel
+            if deck is not None:
+                states[deck.index] = IN_DUEL
+                opened[deck.index] = [card.is_open() for card in deck]
+        values_opponent, opened_opponent, _ = self._sides[1]
+        numpy.multiply(self._values_opponent, opened_opponent.ravel(),
+                       out=values_opponent)
+        observation[VICTORY_ME] = agent.num_victory
+        observation[DIE_ME] = agent.num_shout_die
+        observation[DRAW_ME] = agent.num_shout_draw
+        observation[VICTORY_OPPONENT] = opponent.num_victory
+        observation[DIE_OPPONENT] = opponent.num_shout_die
+        observation[DRAW_OPPONENT] = opponent.num_shout_draw
+        duel = game.duel_ongoing
+        observation[DUEL_INDEX] = game.duel_index
+        observation[ROUND] = duel.round_
+        observation[IN_TURN] = duel.offense == agent
+        decision = self.decision
+        observation[DECISION] = -1 if decision is None else decision
+        mask = self.action_mask
+        mask[:] = False
+        if decision == OFFENSE_DECK:
+            mask[[deck.index for deck in agent.decks.undisclosed]] = True
+        elif decision == DEFENSE_DECK:
+            mask[[deck.index for deck in opponent.decks.undisclosed]] = True
+        elif decision == SHOUT:
+            mask[[ACTION_INDEXES[action] for action in
+                  agent.valid_actions(duel.round_)]] = True
+
+
+def main(num_steps, seed=None):
+    """Play num_steps random legal actions and report the speed."""
+    env = DieOrDareEnv()
+    rng = numpy.random.default_rng(seed)
+    _, info = env.reset(seed)
+    num_games = 0
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        action = rng.choice(numpy.flatnonzero(info['action_mask']))
+        _, reward, terminated, _, info = env.step(action)
+        if terminated:
+            num_games += 1
+            _, info = env.reset()
+    elapsed = time.perf_counter() - start
+    print('{} steps ({} games) in {:.3f} seconds ({:.0f} steps/s)'.format(
+        num_steps, num_games, elapsed, num_steps / elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Play random actions in DieOrDareEnv to time it.')
+    parser.add_argument('-n', '--steps', type=int, default=10000)
+    parser.add_argument('-s', '--seed', type=int, default=None)
+    args = parser.parse_args()
+    main(args.steps, args.seed)
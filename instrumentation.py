@@ -0,0 +1,180 @@
+import die_or_dare
+import functools
+import inspect
+import json
+import time
+
+# what enable() times by default, besides the apply of every strategy
+TARGETS = (
+    (die_or_dare.Game, 'prepare'),
+    (die_or_dare.Game, 'accept'),
+    (die_or_dare.Game, 'process'),
+    (die_or_dare.Game, 'to_json'),
+    (die_or_dare.Game, 'snapshot'),
+    (die_or_dare.OutputHandler, 'display'),
+    (die_or_dare.OutputHandler, 'save'),
+    (die_or_dare.TerminalRenderer, 'display'),
+    (die_or_dare.ComputerPlayer, 'get_chances'),
+    (die_or_dare.Player, 'build_decks'),
+    (die_or_dare.ReplayLog, 'process'),
+)
+STRATEGY_BASES = (die_or_dare.JokerValueStrategy,
+                  die_or_dare.JokerPositionStrategy,
+                  die_or_dare.OffenseDeckChoiceStrategy,
+                  die_or_dare.DefenseDeckChoiceStrategy,
+                  die_or_dare.ActionChoiceStrategy)
+# latencies fall in bucket b when int(microseconds).bit_length() == b, i.e.
+# below 2 ** b microseconds; the last bucket takes everything longer
+NUM_BUCKETS = 32
+
+
+class Span(object):
+    """Call count, total, extremes and a log2 histogram of the latencies of
+    one instrumented function.
+    """
+    __slots__ = ('count', 'total', 'min', 'max', 'histogram')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.total = 0.
+        self.min = float('inf')
+        self.max = 0.
+        self.histogram = [0] * NUM_BUCKETS
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration < self.min:
+            self.min = duration
+        if duration > self.max:
+            self.max = duration
+        bucket = int(duration * 1e6).bit_length()
+        self.histogram[bucket if bucket < NUM_BUCKETS else -1] += 1
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.
+
+    def percentile(self, q):
+        """Upper bound in seconds of the bucket holding the q-th percentile,
+        capped by the maximum.
+        """
+        rank = q / 100 * self.count
+        cumulative = 0
+        for bucket, count in enumerate(self.histogram):
+            cumulative += count
+            if count and cumulative >= rank:
+                return min((1 << bucket) / 1e6, self.max)
+        return self.max
+
+    def to_dict(self):
+        histogram = {str(1 << bucket): count for bucket, count in
+                     enumerate(self.histogram) if count}
+        return {'count': self.count, 'total': self.total,
+                'min': self.min if self.count else None, 'max': self.max,
+                'mean': self.mean(), 'p50': self.percentile(50),
+                'p99': self.percentile(99), 'histogram_us': histogram}
+
+
+spans = {}  # name -> Span
+_originals = {}  # (owner, attribute) -> what the class dict held
+
+
+def _wrap(function, span):
+    perf_counter = time.perf_counter
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            span.add(perf_counter() - start)
+    return wrapper
+
+
+def instrument(owner, attribute, name=None):
+    """Replace a function of a class (plain, static or class method) with a
+    timed one, until disable().
+    """
+    if (owner, attribute) in _originals:
+        return
+    if name is None:
+        name = '{}.{}'.format(owner.__name__, attribute)
+    span = spans.setdefault(name, Span())
+    original = owner.__dict__[attribute]
+    if isinstance(original, (staticmethod, classmethod)):
+        timed = type(original)(_wrap(original.__func__, span))
+    else:
+        timed = _wrap(original, span)
+    _originals[owner, attribute] = original
+    setattr(owner, attribute, timed)
+
+
+def strategy_classes(bases=STRATEGY_BASES):
+    """Every concrete strategy class loaded so far that defines apply."""
+    classes = []
+    pending = list(bases)
+    while pending:
+        class_ = pending.pop()
+        pending.extend(class_.__subclasses__())
+        if not inspect.isabstract(class_) and 'apply' in class_.__dict__:
+            classes.append(class_)
+    return classes
+
+
+def enable(targets=TARGETS, strategies=True):
+    """Start timing the targets and, if strategies is true, the apply of
+    every strategy class imported so far. Nothing is timed, and nothing
+    costs anything, until this is called.
+    """
+    for owner, attribute in targets:
+        instrument(owner, attribute)
+    if strategies:
+        for class_ in strategy_classes():
+            instrument(class_, 'apply')
+
+
+def disable():
+    """Put back the original functions; the spans are kept."""
+    for (owner, attribute), original in _originals.items():
+        setattr(owner, attribute, original)
+    _originals.clear()
+
+
+def is_enabled():
+    return bool(_originals)
+
+
+def reset():
+    for span in spans.values():
+        span.clear()
+
+
+def summary():
+    """Return a table of the spans that were called, slowest total first."""
+    lines = ['{:45}{:>9}{:>11}{:>11}{:>11}{:>11}{:>11}'.format(
+        'span', 'calls', 'total s', 'mean us', 'p50 us', 'p99 us', 'max us')]
+    for name, span in sorted(spans.items(), key=lambda item: -item[1].total):
+        if not span.count:
+            continue
+        lines.append('{:45}{:>9}{:>11.3f}{:>11.1f}{:>11.1f}{:>11.1f}{:>11.1f}'
+                     .format(name, span.count, span.total, span.mean() * 1e6,
+                             span.percentile(50) * 1e6,
+                             span.percentile(99) * 1e6, span.max * 1e6))
+    return '\n'.join(lines)
+
+
+def to_dict():
+    return {name: span.to_dict() for name, span in spans.items() if
+            span.count}
+
+
+def dump(file_path):
+    """Write the spans as JSON (times in seconds, histogram buckets keyed by
+    their upper bound in microseconds).
+    """
+    with open(file_path, 'w') as file:
+        json.dump(to_dict(), file, indent=2)
@@ -0,0 +1,345 @@
+import argparse
+import collections
+import constants
+import random
+import time
+
+UNDISCLOSED, IN_DUEL, FINISHED = (state.value for state in
+                                  constants.DeckState)
+# decisions a state waits for
+OFFENSE_DECK, DEFENSE_DECK, SHOUT = range(3)
+DARE, DIE, DONE, DRAW = (constants.Action.DARE, constants.Action.DIE,
+                         constants.Action.DONE, constants.Action.DRAW)
+ALL_VALUES = (1 << len(constants.Rank)) - 1
+NUM_DUELS = constants.DECK_PER_PILE
+
+
+class Side(collections.namedtuple('Side', (
+        'codes', 'values', 'opened', 'states', 'in_duel', 'mask',
+        'num_victory', 'num_shout_die', 'num_shout_done',
+        'num_shout_draw'))):
+    """One player in a GameState.
+
+    codes[d] are the Card.to_code of the cards of deck d without the open
+    bit and values[d] their values; both never change, so every state of a
+    game shares them. opened[d] is the number of open cards of deck d (they
+    are opened in order), states[d] its DeckState value, in_duel the index of
+    the deck in duel or None and mask the Decks.disclosed_mask.
+    """
+    __slots__ = ()
+
+    def open_sum(self):
+        deck_index = self.in_duel
+        return sum(self.values[deck_index][:self.opened[deck_index]])
+
+    def enter_duel(self, deck_index):
+        mask = self.mask
+        for value in self.values[deck_index][:self.opened[deck_index]]:
+            mask |= 1 << value - 1
+        states = list(self.states)
+        states[deck_index] = IN_DUEL
+        return self._replace(states=tuple(states), in_duel=deck_index,
+                             mask=mask)
+
+    def open_next_card(self):
+        deck_index = self.in_duel
+        opened = list(self.opened)
+        value = self.values[deck_index][opened[deck_index]]
+        opened[deck_index] += 1
+        return self._replace(opened=tuple(opened),
+                             mask=self.mask | 1 << value - 1)
+
+    def finish(self, point=0):
+        deck_index = self.in_duel
+        mask = self.mask
+        for value in self.values[deck_index]:
+            mask |= 1 << value - 1
+        opened = list(self.opened)
+        opened[deck_index] = constants.CARD_PER_DECK
+        states = list(self.states)
+        states[deck_index] = FINISHED
+        return self._replace(opened=tuple(opened), states=tuple(states),
+                             in_duel=None, mask=mask,
+                             num_victory=self.num_victory + point)
+
+    def valid_actions(self, round_):
+        """Same as Player.valid_actions."""
+        actions = [DONE]
+        if round_ in (1, 2):
+            actions.append(DARE)
+            if self.num_shout_die < constants.MAX_DIE:
+                actions.append(DIE)
+        elif round_ == 3:
+            actions.append(None)
+            if self.num_shout_draw < constants.MAX_DRAW:
+                actions.append(DRAW)
+        else:
+            raise ValueError('Something went wrong.')
+        return actions
+
+
+class DuelRecord(collections.namedtuple('DuelRecord',
+                                         ('state', 'round_', 'winner'))):
+    """A duel in a GameState: its DuelState, round and the seat of the
+    winner or None.
+    """
+    __slots__ = ()
+
+    def is_over(self):
+        return self.state not in (constants.DuelState.UNSTARTED,
+                                  constants.DuelState.ONGOING)
+
+
+UNSTARTED_DUEL = DuelRecord(constants.DuelState.UNSTARTED, 1, None)
+
+
+class GameState(collections.namedtuple('GameState', (
+        'sides', 'duel_index', 'duels', 'over', 'result', 'winner'))):
+    """An immutable game, as Game.to_state makes it between two steps.
+
+    sides is (red, black), duels a DuelRecord per duel, result a GameResult
+    or None and winner the seat (0 for red) of the winner or None. Seats
+    stand in for players throughout. step returns a new state that shares
+    everything it has not changed with the old one, so a search can keep
+    any number of branches around.
+    """
+    __slots__ = ()
+
+    @property
+    def duel(self):
+        if self.duel_index == -1:
+            return None
+        return self.duels[self.duel_index]
+
+    def is_over(self):
+        return self.over
+
+
+def _replace_at(tuple_, index, item):
+    return tuple_[:index] + (item,) + tuple_[index + 1:]
+
+
+def _prepare(state):
+    """Game.to_next_duel if needed, then Game.prepare: the state right
+    before the input of the next step is processed.
+    """
+    duel_index = state.duel_index
+    duels = state.duels
+    if duel_index == -1 or duels[duel_index].is_over():
+        duel_index += 1
+        duel = DuelRecord(constants.DuelState.ONGOING,
+                          duels[duel_index].round_, None)
+        duels = _replace_at(duels, duel_index, duel)
+    else:
+        duel = duels[duel_index]
+    sides = state.sides
+    red, black = sides
+    if (red.in_duel is not None and black.in_duel is not None and
+            duel.round_ in (1, 2)):
+        sides = red.open_next_card(), black.open_next_card()
+        duels = _replace_at(duels, duel_index,
+                            duel._replace(round_=duel.round_ + 1))
+    return state._replace(sides=sides, duel_index=duel_index, duels=duels)
+
+
+def decision(state):
+    """Return what the next step of a state decides: OFFENSE_DECK,
+    DEFENSE_DECK or SHOUT, or None if the game is over.
+    """
+    if state.over:
+        return None
+    duel = state.duel
+    if duel is None or duel.is_over():
+        return OFFENSE_DECK
+    offense = state.duel_index % 2
+    if state.sides[offense].in_duel is None:
+        return OFFENSE_DECK
+    elif state.sides[1 - offense].in_duel is None:
+        return DEFENSE_DECK
+    return SHOUT
+
+
+def _offense(state):
+    """Seat of the offense of the duel the next step plays."""
+    duel_index = state.duel_index
+    if duel_index == -1 or state.duels[duel_index].is_over():
+        duel_index += 1
+    return duel_index % 2
+
+
+def valid_inputs(state):
+    """All inputs step accepts in a state: undisclosed deck indexes, or
+    (red, black) pairs of valid actions.
+    """
+    kind = decision(state)
+    if kind is None:
+        return []
+    offense = _offense(state)
+    sides = state.sides
+    if kind == OFFENSE_DECK:
+        return [index for index, deck_state in
+                enumerate(sides[offense].states) if deck_state == UNDISCLOSED]
+    elif kind == DEFENSE_DECK:
+        return [index for index, deck_state in
+                enumerate(sides[1 - offense].states) if
+                deck_state == UNDISCLOSED]
+    round_ = state.duel.round_
+    if round_ in (1, 2):
+        round_ += 1  # the cards are opened first
+    red, black = sides
+    return [(action_red, action_black) for action_red in
+            red.valid_actions(round_) for action_black in
+            black.valid_actions(round_)]
+
+
+def step(state, input_):
+    """Play one Game.prepare and Game.process on a state and return the new
+    state, leaving the old one as it is.
+
+    The input is a deck index when a deck is chosen (see decision) and a
+    (red, black) pair of actions when shouting, with None for no shout. As
+    in Game.process, a deck that is not undisclosed is ignored and so are
+    invalid actions.
+    """
+    if state.over:
+        raise ValueError('The game is over.')
+    state = _prepare(state)
+    duel_index = state.duel_index
+    offense = duel_index % 2
+    defense = 1 - offense
+    sides = list(state.sides)
+    if sides[offense].in_duel is None:
+        if sides[offense].states[input_] == UNDISCLOSED:
+            sides[offense] = sides[offense].enter_duel(input_)
+            state = state._replace(sides=tuple(sides))
+        return state
+    if sides[defense].in_duel is None:
+        if sides[defense].states[input_] == UNDISCLOSED:
+            sides[defense] = sides[defense].enter_duel(input_)
+            state = state._replace(sides=tuple(sides))
+        return state
+    return _process_shouts(state, sides, offense, defense, input_)
+
+
+def _process_shouts(state, sides, offense, defense, actions):
+    """Game.process_shout: done > die > draw > dare (then offense >
+    defense).
+    """
+    duel = state.duel
+    round_ = duel.round_
+    for seat in offense, defense:
+        if actions[seat] is DONE:
+            side = sides[seat]
+            sides[seat] = side._replace(
+                num_shout_done=side.num_shout_done + 1)
+            if side.mask == ALL_VALUES:
+                return _end_duel(
+                    state, sides, constants.DuelState.ABORTED_BY_CORRECT_DONE,
+                    None, constants.GameResult.DONE, seat)
+    if round_ in (1, 2):
+        for seat in offense, defense:
+            side = sides[seat]
+            if (actions[seat] is DIE and
+                    side.num_shout_die < constants.MAX_DIE):
+                sides[seat] = side._replace(
+                    num_shout_die=side.num_shout_die + 1)
+                return _end_duel(state, sides, constants.DuelState.DIED)
+        return state._replace(sides=tuple(sides))  # double dare
+    drawn = sides[offense].open_sum() == sides[defense].open_sum()
+    for seat in offense, defense:
+        side = sides[seat]
+        if (actions[seat] is DRAW and
+                side.num_shout_draw < constants.MAX_DRAW):
+            sides[seat] = side._replace(
+                num_shout_draw=side.num_shout_draw + 1)
+            if drawn:
+                return _end_duel(state, sides, constants.DuelState.DRAWN,
+                                 seat)
+    if drawn:
+        return _end_duel(state, sides, constants.DuelState.DRAWN, defense)
+    if sides[offense].open_sum() > sides[defense].open_sum():
+        winner = offense
+    else:
+        winner = defense
+    return _end_duel(state, sides, constants.DuelState.FINISHED, winner)
+
+
+def _end_duel(state, sides, duel_state, winner=None, result=None,
+              game_winner=None):
+    """Duel.end, then Game._end if the game is over too."""
+    for seat in 0, 1:
+        sides[seat] = sides[seat].finish(int(seat == winner))
+    duel = state.duel._replace(state=duel_state, winner=winner)
+    if (winner is not None and
+            sides[winner].num_victory == constants.REQUIRED_WIN):
+        result, game_winner = constants.GameResult.FINISHED, winner
+    return state._replace(
+        sides=tuple(sides),
+        duels=_replace_at(state.duels, state.duel_index, duel),
+        over=result is not None, result=result, winner=game_winner)
+
+
+def deck_codes(codes):
+    """Split the cards of a player as Player.to_codes makes them into the
+    codes of each deck, without their open bits.
+    """
+    return tuple(tuple(code & ~constants.CARD_OPEN_BIT for code in
+                       codes[i:i + constants.CARD_PER_DECK]) for i in
+                 range(0, len(codes), constants.CARD_PER_DECK))
+
+
+def new_state(codes_red, codes_black):
+    """Return the state of a game about to start from the cards of both
+    players as Player.to_codes makes them, with the delegates open.
+    """
+    sides = []
+    for codes in codes_red, codes_black:
+        codes = deck_codes(codes)
+        values = tuple(tuple(code >> constants.CARD_VALUE_SHIFT &
+                             constants.CARD_FIELD_MASK for code in deck_codes)
+                       for deck_codes in codes)
+        sides.append(Side(codes, values, (1,) * len(codes),
+                          (UNDISCLOSED,) * len(codes), None, 0, 0, 0, 0, 0))
+    return GameState(tuple(sides), -1, (UNSTARTED_DUEL,) * NUM_DUELS, False,
+                     None, None)
+
+
+def play_out(state, rng=random):
+    """Play a state to the end with uniformly random valid inputs and
+    return the final state.
+    """
+    while not state.over:
+        state = step(state, rng.choice(valid_inputs(state)))
+    return state
+
+
+def main(num_games, seed=None):
+    """Time random play-outs of the kernel from fresh deals."""
+    import simulation
+    import seeding
+    seed_stream = seeding.SeedStream(seed)
+    orders = seed_stream.shuffle_orders(num_games)
+    rngs = seed_stream.rngs(num_games)
+    states = []
+    for order, rng_pair in zip(orders, rngs):
+        game = simulation.new_game(rngs=rng_pair, orders=order)
+        states.append(game.to_state())
+    rng = random.Random(seed)
+    num_steps = 0
+    start = time.perf_counter()
+    for state in states:
+        while not state.over:
+            state = step(state, rng.choice(valid_inputs(state)))
+            num_steps += 1
+    elapsed = time.perf_counter() - start
+    print('{} games ({} steps) in {:.3f} seconds ({:.0f} steps/s)'.format(
+        num_games, num_steps, elapsed, num_steps / elapsed))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Play random games on the state kernel to time it.')
+    parser.add_argument('-n', '--games', type=int, default=1000)
+    parser.add_argument('-s', '--seed', type=int, default=None)
+    args = parser.parse_args()
+    main(args.games, args.seed)
@@ -0,0 +1,393 @@
+import bisect
+import concurrent.futures
+import constants
+import die_or_dare
+import math
+import random
+import time
+
+# decisions
+OFFENSE_DECK, DEFENSE_DECK, SHOUT = range(3)
+# deck states and shouts of the rollout kernel
+UNDISCLOSED, IN_DUEL, FINISHED = range(3)
+PASS, DARE, DIE, DONE, DRAW = (None, constants.Action.DARE,
+                               constants.Action.DIE, constants.Action.DONE,
+                               constants.Action.DRAW)
+ALL_VALUES = die_or_dare.Decks.ALL_VALUES
+EXPLORATION = math.sqrt(2)
+
+
+class Side(object):
+    """One player in the rollout kernel: plain lists instead of objects.
+
+    values[d] are the values of the cards of deck d in order, opened[d] how
+    many of them are open and states[d] the state of the deck. A side seen
+    by the other player has 0 for its unopened values and a pool of the
+    values they may take, with None for a joker (see determinize).
+    """
+    __slots__ = ('values', 'opened', 'states', 'mask', 'num_victory',
+                 'num_shout_die', 'num_shout_draw', 'pool')
+
+    def __init__(self, values, opened, states, mask, num_victory,
+                 num_shout_die, num_shout_draw=0, pool=None):
+        self.values = values
+        self.opened = opened
+        self.states = states
+        self.mask = mask
+        self.num_victory = num_victory
+        self.num_shout_die = num_shout_die
+        self.num_shout_draw = num_shout_draw
+        self.pool = pool
+
+    def copy(self):
+        return Side(self.values, self.opened[:], self.states[:], self.mask,
+                    self.num_victory, self.num_shout_die, self.num_shout_draw,
+                    self.pool)
+
+    def undisclosed(self):
+        return [index for index, state in enumerate(self.states) if
+                state == UNDISCLOSED]
+
+    def in_duel(self):
+        return self.states.index(IN_DUEL)
+
+    def open_sum(self, deck_index):
+        return sum(self.values[deck_index][:self.opened[deck_index]])
+
+    def enter_duel(self, deck_index):
+        self.states[deck_index] = IN_DUEL
+        for value in self.values[deck_index][:self.opened[deck_index]]:
+            self.mask |= 1 << value - 1
+
+    def open_next_card(self, deck_index):
+        value = self.values[deck_index][self.opened[deck_index]]
+        self.opened[deck_index] += 1
+        self.mask |= 1 << value - 1
+
+    def finish(self, deck_index):
+        self.states[deck_index] = FINISHED
+        self.opened[deck_index] = constants.CARD_PER_DECK
+        for value in self.values[deck_index]:
+            self.mask |= 1 << value - 1
+
+
+def observe(decks, num_victory, num_shout_die, hidden=False):
+    """Turn the Decks of a player into a Side, as the player sees them, or
+    if hidden is true as the opponent does: only from the open cards and
+    what every pile holds.
+    """
+    if hidden:
+        values = tuple(tuple(card.value if card.is_open() else 0 for card in
+                             deck) for deck in decks)
+        counts = decks.public_hidden_counts()
+        pool = [None] * counts[0]
+        for value in range(1, len(counts)):
+            pool.extend([value] * counts[value])
+    else:
+        values = tuple(tuple(card.value for card in deck) for deck in decks)
+        pool = None
+    opened = [sum(1 for card in deck if card.is_open()) for deck in decks]
+    states = []
+    for deck in decks:
+        if deck.is_undisclosed():
+            states.append(UNDISCLOSED)
+        elif deck.is_in_duel():
+            states.append(IN_DUEL)
+        else:
+            states.append(FINISHED)
+    return Side(values, opened, states, decks.disclosed_mask, num_victory,
+                num_shout_die, pool=pool)
+
+
+def _fits(delegates, pool):
+    """Whether the cards of a sorted pool (jokers, as None, first) can be
+    dealt below the given sorted delegates, one card per delegate.
+    """
+    num_jokers = pool.count(None)
+    return all(bisect.bisect_right(pool, delegate, num_jokers) > index for
+               index, delegate in enumerate(delegates))
+
+
+def _deal(slots, pool, values, rng):
+    """Deal a sorted pool (see _fits) into sorted (delegate, deck index,
+    position) slots, each from the cards that fit it, the smallest delegates
+    first. Any card fitting a slot fits every later one, so this never gets
+    stuck when _fits, and every consistent deal is equally likely.
+    """
+    num_jokers = pool.count(None)
+    for delegate, deck_index, position in slots:
+        value = pool.pop(rng.randrange(bisect.bisect_right(pool, delegate,
+                                                           num_jokers)))
+        if value is None:
+            num_jokers -= 1
+            value = rng.randint(1, delegate)
+        values[deck_index][position] = value
+
+
+def determinize(side, rng):
+    """Deal the unopened cards of a side seen by the opponent (see observe)
+    anew, as the opponent imagines them.
+
+    The values of unopened cards are known as a whole (every pile has the
+    same cards) but not where they are, nor the value of a hidden joker.
+    Every card goes below the delegate of its deck and a joker takes a value
+    up to it. The one exception the joker strategies make is a deck whose
+    joker was moved away from the top (JokerLast): when the open delegates
+    leave no other way, the hidden joker is put in a deck that may then hold
+    anything, picked among those that make the rest of the deal fit.
+    """
+    values = [list(deck_values) for deck_values in side.values]
+    slots = sorted((deck_values[0], deck_index, position) for
+                   deck_index, deck_values in enumerate(values) for position
+                   in range(side.opened[deck_index], len(deck_values)))
+    pool = sorted(side.pool, key=lambda value: 0 if value is None else value)
+    if not _fits([slot[0] for slot in slots], pool):
+        if None not in pool:
+            raise ValueError('No deal fits the delegates.')
+        pool.remove(None)
+        candidates = []
+        for deck_index in sorted(set(slot[1] for slot in slots)):
+            others = [slot for slot in slots if slot[1] != deck_index]
+            if _fits([slot[0] for slot in others], pool):
+                candidates.append(deck_index)
+        if not candidates:
+            raise ValueError('No deal fits the delegates.')
+        deck_index = rng.choice(candidates)
+        free = [slot for slot in slots if slot[1] == deck_index]
+        slots = [slot for slot in slots if slot[1] != deck_index]
+        _, _, position = free.pop(rng.randrange(len(free)))
+        values[deck_index][position] = rng.randint(1, len(constants.Rank))
+        _deal(slots, pool, values, rng)
+        for _, _, position in free:
+            values[deck_index][position] = pool.pop(rng.randrange(len(pool)))
+    else:
+        _deal(slots, pool, values, rng)
+    determinized = side.copy()
+    determinized.values = tuple(tuple(deck_values) for deck_values in values)
+    determinized.pool = None
+    return determinized
+
+
+def rollout_shout(me, opponent, round_, in_turn, rng):
+    """Fast default policy of the rollouts."""
+    if me.mask == ALL_VALUES:
+        return DONE
+    sum_me = me.open_sum(me.in_duel())
+    sum_opponent = opponent.open_sum(opponent.in_duel())
+    if round_ == 2:
+        behind = sum_me < sum_opponent or (in_turn and
+                                           sum_me == sum_opponent)
+        if (behind and me.num_shout_die < constants.MAX_DIE and
+                rng.random() < .5):
+            return DIE
+        return DARE
+    if sum_me == sum_opponent and me.num_shout_draw < constants.MAX_DRAW:
+        return DRAW
+    return PASS
+
+
+def play_out(sides, duel_index, offense, decision, round_, action, rng):
+    """Play a game on from a decision of sides[0] and return 1 if sides[0]
+    wins, 0 if it loses.
+
+    offense is the index in sides of the offense of the current duel; the
+    decision is made with action, everything else by the default policy.
+    """
+    pending = True  # sides[0] has yet to take action
+    while True:
+        defense = 1 - offense
+        last_duel = duel_index == constants.DECK_PER_PILE - 1
+        if decision == OFFENSE_DECK:
+            choices = sides[offense].undisclosed()
+            if pending and offense == 0:
+                deck_index, pending = action, False
+            else:
+                deck_index = choices[0] if last_duel else rng.choice(choices)
+            sides[offense].enter_duel(deck_index)
+            decision = DEFENSE_DECK
+            continue
+        if decision == DEFENSE_DECK:
+            choices = sides[defense].undisclosed()
+            if pending and offense == 0:
+                deck_index, pending = action, False
+            else:
+                deck_index = choices[0] if last_duel else rng.choice(choices)
+            sides[defense].enter_duel(deck_index)
+            for side in sides:
+                side.open_next_card(side.in_duel())
+            decision, round_ = SHOUT, 2
+        shouts = [None, None]
+        for index in (offense, defense):
+            if index == 0 and pending:
+                shouts[0], pending = action, False
+            else:
+                shouts[index] = rollout_shout(sides[index], sides[1 - index],
+                                              round_, index == offense, rng)
+        # priority: done > die > draw > dare (then offense > defense)
+        for index in (offense, defense):
+            if shouts[index] is DONE and sides[index].mask == ALL_VALUES:
+                return int(index == 0)
+        point = None
+        duel_over = False
+        for index in (offense, defense):
+            side = sides[index]
+            if (shouts[index] is DIE and round_ == 2 and
+                    side.num_shout_die < constants.MAX_DIE):
+                side.num_shout_die += 1
+                duel_over = True
+                break
+        sums = [side.open_sum(side.in_duel()) for side in sides]
+        if not duel_over and round_ == 3:
+            for index in (offense, defense):
+                side = sides[index]
+                if (shouts[index] is DRAW and
+                        side.num_shout_draw < constants.MAX_DRAW):
+                    side.num_shout_draw += 1
+                    if sums[0] == sums[1]:
+                        point = index
+                        break
+            if point is None:
+                point = offense if sums[offense] > sums[defense] else defense
+            duel_over = True
+        if not duel_over:
+            for side in sides:
+                side.open_next_card(side.in_duel())
+            round_ = 3
+            continue
+        for side in sides:
+            side.finish(side.in_duel())
+        if point is not None:
+            sides[point].num_victory += 1
+            if sides[point].num_victory == constants.REQUIRED_WIN:
+                return int(point == 0)
+        duel_index += 1
+        if duel_index == constants.DECK_PER_PILE:
+            return .5
+        offense, decision = defense, OFFENSE_DECK
+
+
+def search_worker(me, opponent, duel_index, offense, decision, round_,
+                  candidates, time_budget, max_iterations, seed):
+    """Run UCB1 over the candidates at the root of an information set.
+
+    Every iteration deals the opponent's hidden cards anew and plays the
+    chosen candidate out, so the statistics are over determinizations.
+    Returns the number of visits and the total reward of each candidate.
+    """
+    rng = random.Random(seed)
+    visits = [0] * len(candidates)
+    rewards = [0.] * len(candidates)
+    deadline = time.perf_counter() + time_budget
+    iteration = 0
+    while max_iterations is None or iteration < max_iterations:
+        if iteration >= len(candidates) and time.perf_counter() > deadline:
+            break
+        iteration += 1
+        if iteration <= len(candidates):
+            choice = iteration - 1
+        else:
+            log_total = math.log(iteration)
+            choice = max(range(len(candidates)), key=lambda i: (
+                rewards[i] / visits[i] +
+                EXPLORATION * math.sqrt(log_total / visits[i])))
+        sides = [me.copy(), determinize(opponent, rng)]
+        reward = play_out(sides, duel_index, offense, decision, round_,
+                          candidates[choice], rng)
+        visits[choice] += 1
+        rewards[choice] += reward
+    return visits, rewards
+
+
+_executor = None
+
+
+def _get_executor(num_workers):
+    global _executor
+    if _executor is None or _executor._max_workers != num_workers:
+        if _executor is not None:
+            _executor.shutdown()
+        _executor = concurrent.futures.ProcessPoolExecutor(num_workers)
+    return _executor
+
+
+class MCTSStrategy(object):
+    """Settings shared by the information-set Monte Carlo strategies.
+
+    Subclass to change them, e.g. type('Slow', (MCTSActionChoice,),
+    {'time_budget': 1.}). With num_workers > 1 every worker process searches
+    for the whole time budget and their statistics are added up (root
+    parallelization).
+    """
+    time_budget = .05  # seconds per decision
+    num_workers = 1
+    max_iterations = None  # per worker; caps the search for reproducibility
+
+    @classmethod
+    def search(cls, me, opponent, duel_index, offense, decision, round_,
+               candidates, rng):
+        if len(candidates) == 1:
+            return candidates[0]
+        arguments = (me, opponent, duel_index, offense, decision, round_,
+                     candidates, cls.time_budget, cls.max_iterations)
+        seeds = [rng.getrandbits(64) for _ in range(cls.num_workers)]
+        if cls.num_workers == 1:
+            results = [search_worker(*arguments, seeds[0])]
+        else:
+            executor = _get_executor(cls.num_workers)
+            futures = [executor.submit(search_worker, *arguments, seed) for
+                       seed in seeds]
+            results = [future.result() for future in futures]
+        visits = [sum(counts) for counts in zip(*(visits for visits, _ in
+                                                  results))]
+        best = max(range(len(candidates)), key=lambda i: visits[i])
+        return candidates[best]
+
+
+class MCTSOffenseDeck(MCTSStrategy, die_or_dare.OffenseDeckChoiceStrategy):
+    @classmethod
+    def apply(cls, decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+              num_victory_opponent, num_shout_die_opponent, rng=random):
+        me = observe(decks_me, num_victory_me, num_shout_die_me)
+        opponent = observe(decks_opponent, num_victory_opponent,
+                           num_shout_die_opponent, hidden=True)
+        duel_index = len(decks_me.finished)
+        candidates = [deck.index for deck in decks_me.undisclosed]
+        index = cls.search(me, opponent, duel_index, 0, OFFENSE_DECK, None,
+                           candidates, rng)
+        return decks_me[index]
+
+
+class MCTSDefenseDeck(MCTSStrategy, die_or_dare.DefenseDeckChoiceStrategy):
+    @classmethod
+    def apply(cls, decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+              num_victory_opponent, num_shout_die_opponent, offense_deck=None,
+              rng=random):
+        me = observe(decks_me, num_victory_me, num_shout_die_me)
+        opponent = observe(decks_opponent, num_victory_opponent,
+                           num_shout_die_opponent, hidden=True)
+        duel_index = len(decks_me.finished)
+        candidates = [deck.index for deck in decks_opponent.undisclosed]
+        index = cls.search(me, opponent, duel_index, 0, DEFENSE_DECK, None,
+                           candidates, rng)
+        return decks_opponent[index]
+
+
+class MCTSActionChoice(MCTSStrategy, die_or_dare.ActionChoiceStrategy):
+    @classmethod
+    def apply(cls, decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+              num_victory_opponent, num_shout_die_opponent, round_, in_turn,
+              rng=random):
+        if decks_me.disclosed_mask == ALL_VALUES:
+            return constants.Action.DONE
+        me = observe(decks_me, num_victory_me, num_shout_die_me)
+        opponent = observe(decks_opponent, num_victory_opponent,
+                           num_shout_die_opponent, hidden=True)
+        duel_index = len(decks_me.finished)
+        if round_ == 2:
+            candidates = [DARE]
+            if num_shout_die_me < constants.MAX_DIE:
+                candidates.append(DIE)
+        else:
+            candidates = [PASS, DRAW]
+        return cls.search(me, opponent, duel_index, 0 if in_turn else 1,
+                          SHOUT, round_, candidates, rng)
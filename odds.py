@@ -0,0 +1,217 @@
+import collections
+import constants
+import functools
+import math
+
+# the duel odds cache is keyed by both hidden multisets and the lead, so it
+# would grow without bound over long runs; the histograms stay few
+DUEL_ODDS_CACHE_SIZE = 1 << 14
+
+
+@functools.lru_cache(maxsize=None)
+def sum_histogram(hidden_cards, num_to_open):
+    """Count the ways of opening num_to_open of the hidden cards by their sum.
+
+    hidden_cards is a canonical (sorted) tuple of (values, count) pairs, where
+    values is a tuple of equally likely values of a card: a 1-tuple when the
+    value is known, or every value a joker might take. Cards sharing a known
+    value are chosen together with binomial weights, so the work depends on
+    the number of distinct values rather than on the number of cards.
+    Returns a tuple of (sum, weight) pairs sorted by sum.
+    """
+    histograms = [{} for _ in range(num_to_open + 1)]
+    histograms[0][0] = 1.
+    for values, count in hidden_cards:
+        if len(values) == 1:
+            value = values[0]
+            for num_chosen in range(num_to_open, 0, -1):
+                target = histograms[num_chosen]
+                for num_taken in range(1, min(count, num_chosen) + 1):
+                    ways = math.comb(count, num_taken)
+                    shift = value * num_taken
+                    source = histograms[num_chosen - num_taken]
+                    for sum_, weight in source.items():
+                        key = sum_ + shift
+                        target[key] = target.get(key, 0.) + weight * ways
+        else:
+            probability = 1. / len(values)
+            for _ in range(count):
+                for num_chosen in range(num_to_open, 0, -1):
+                    target = histograms[num_chosen]
+                    for sum_, weight in histograms[num_chosen - 1].items():
+                        for value in values:
+                            key = sum_ + value
+                            target[key] = (target.get(key, 0.) +
+                                           weight * probability)
+    return tuple(sorted(histograms[num_to_open].items()))
+
+
+def canonicalize(hidden_cards):
+    """Turn hidden cards into the multiset key used by sum_histogram."""
+    return tuple(sorted(collections.Counter(hidden_cards).items()))
+
+
+@functools.lru_cache(maxsize=DUEL_ODDS_CACHE_SIZE)
+def _duel_odds(hidden_cards_me, hidden_cards_opponent, num_to_open, lead):
+    histogram_me = sum_histogram(hidden_cards_me, num_to_open)
+    histogram_opponent = sum_histogram(hidden_cards_opponent, num_to_open)
+    num_win, num_draw, num_lose = 0., 0., 0.
+    for sum_me, count_me in histogram_me:
+        for sum_opponent, count_opponent in histogram_opponent:
+            count = count_me * count_opponent
+            difference = lead + sum_me - sum_opponent
+            if difference > 0:
+                num_win += count
+            elif difference == 0:
+                num_draw += count
+            else:
+                num_lose += count
+    total = num_win + num_draw + num_lose
+    if not total:
+        return 0., 0., 0.
+    return num_win / total, num_draw / total, num_lose / total
+
+
+def duel_odds(hidden_cards_me, current_sum_me, hidden_cards_opponent,
+              current_sum_opponent, num_to_open):
+    """Exact odds of winning, tying and losing a duel.
+
+    Every combination of num_to_open hidden cards of mine is weighed against
+    every combination of the opponent's, so the result only depends on the
+    two hidden multisets and the difference of the sums opened so far, which
+    is what the cache is keyed by.
+    """
+    hidden_cards_me = canonicalize(hidden_cards_me)
+    hidden_cards_opponent = canonicalize(hidden_cards_opponent)
+    lead = current_sum_me - current_sum_opponent
+    return _duel_odds(hidden_cards_me, hidden_cards_opponent, num_to_open,
+                      lead)
+
+
+CARD_FIELDS = 5  # suit, colored, rank, value, open (see Card.to_array)
+DECK_FIELDS = constants.CARD_PER_DECK * CARD_FIELDS + 4
+MAX_SUM = constants.CARD_PER_DECK * len(constants.Rank)
+
+
+def _unpack(players):
+    """Split stacked Player.to_array() encodings into card fields."""
+    import numpy  # only the batch odds need it, not die_or_dare's duel_odds
+    players = numpy.asarray(players)
+    num_situations = players.shape[0]
+    decks = players[:, :constants.DECK_PER_PILE * DECK_FIELDS].reshape(
+        num_situations, constants.DECK_PER_PILE, DECK_FIELDS)
+    cards = decks[:, :, :constants.CARD_PER_DECK * CARD_FIELDS].reshape(
+        num_situations, constants.DECK_PER_PILE, constants.CARD_PER_DECK,
+        CARD_FIELDS)
+    states = decks[:, :, -4]
+    return cards, states
+
+
+def _side(players):
+    """Return the open sum, number of opened cards and hidden value counts of
+    the deck in duel of each situation, guessing jokers as SameAsMax would.
+    """
+    import numpy
+    cards, states = _unpack(players)
+    rows = numpy.arange(cards.shape[0])
+    deck_in_duel = cards[rows, numpy.argmax(
+        states == constants.DeckState.IN_DUEL.value, axis=1)]
+    is_open = deck_in_duel[:, :, 4] == 1
+    current_sums = (deck_in_duel[:, :, 3] * is_open).sum(axis=1)
+    num_opened = is_open.sum(axis=1)
+    delegate_values = deck_in_duel[:, 0, 3]
+    all_cards = cards.reshape(cards.shape[0], -1, CARD_FIELDS)
+    is_joker = all_cards[:, :, 0] == -1
+    values = numpy.where(is_joker, delegate_values[:, None],
+                         all_cards[:, :, 3])
+    is_hidden = all_cards[:, :, 4] != 1
+    is_candidate = is_hidden & (is_joker |
+                                (values <= delegate_values[:, None]))
+    num_values = len(constants.Rank) + 1
+    bins = rows[:, None] * num_values + numpy.clip(values, 0, num_values - 1)
+    counts = numpy.bincount(bins.ravel(), weights=is_candidate.ravel(),
+                            minlength=cards.shape[0] * num_values)
+    counts = counts.reshape(cards.shape[0], num_values)
+    return current_sums, num_opened, counts
+
+
+def _batch_sum_histograms(counts, num_to_open):
+    """Vectorized sum_histogram over rows of per-value hidden card counts.
+
+    When no row opens more than one card, the counts already are the
+    histograms, only as wide as the largest value.
+    """
+    import numpy
+    num_situations = counts.shape[0]
+    max_to_open = int(num_to_open.max()) if num_situations else 0
+    if max_to_open <= 1:
+        histograms = numpy.array(counts, dtype=float)
+        histograms[:, 0] = num_to_open == 0
+        histograms[num_to_open == 0, 1:] = 0.
+        return histograms
+    # situations on the last axis keep every shifted slice contiguous
+    histograms = numpy.zeros((max_to_open + 1, MAX_SUM + 1, num_situations))
+    histograms[0, 0] = 1.
+    for value in range(1, counts.shape[1]):
+        count = counts[:, value]
+        ways = [numpy.ones(num_situations)]
+        for num_taken in range(1, max_to_open + 1):
+            ways.append(numpy.maximum(
+                ways[-1] * (count - num_taken + 1) / num_taken, 0.))
+        # update in place from the largest number of chosen cards down, so
+        # every source still holds the histogram before this value
+        for num_chosen in range(max_to_open, 0, -1):
+            for num_taken in range(1, num_chosen + 1):
+                shift = value * num_taken
+                if shift > MAX_SUM:
+                    break
+                histograms[num_chosen, shift:] += (
+                    histograms[num_chosen - num_taken, :MAX_SUM + 1 - shift]
+                    * ways[num_taken])
+    rows = numpy.arange(num_situations)
+    return histograms[num_to_open, :, rows]
+
+
+def batch_duel_odds(players_me, players_opponent):
+    """Odds of winning, tying and losing for many duel situations at once.
+
+    players_me and players_opponent are stacked Player.to_array() encodings
+    (one row per situation) taken while a duel is ongoing. Like
+    ComputerPlayer.get_chances, jokers are assumed to equal the delegate of
+    their deck. Returns three arrays of probabilities, one entry per row.
+    """
+    current_sums_me, num_opened, counts_me = _side(players_me)
+    current_sums_opponent, _, counts_opponent = _side(players_opponent)
+    num_to_open = constants.CARD_PER_DECK - num_opened
+    return batch_odds(current_sums_me, counts_me, current_sums_opponent,
+                      counts_opponent, num_to_open)
+
+
+def batch_odds(current_sums_me, counts_me, current_sums_opponent,
+               counts_opponent, num_to_open):
+    """Odds of winning, tying and losing from the open sums of the decks in
+    duel and the per-value counts of the hidden cards that may still be
+    opened (see _side), one row per situation.
+    """
+    import numpy
+    histograms_me = _batch_sum_histograms(counts_me, num_to_open)
+    histograms_opponent = _batch_sum_histograms(counts_opponent, num_to_open)
+    max_sum = histograms_me.shape[1] - 1
+    totals = histograms_me.sum(axis=1) * histograms_opponent.sum(axis=1)
+    cumulative_opponent = numpy.cumsum(histograms_opponent, axis=1)
+    # my sum i beats every opponent sum below i + lead and ties i + lead
+    leads = current_sums_me - current_sums_opponent
+    targets = numpy.arange(max_sum + 1)[None, :] + leads[:, None]
+    clipped = numpy.clip(targets, 0, max_sum)
+    pmf = numpy.take_along_axis(histograms_opponent, clipped, axis=1)
+    pmf = numpy.where((targets >= 0) & (targets <= max_sum), pmf, 0.)
+    below = numpy.take_along_axis(cumulative_opponent,
+                                  numpy.clip(targets - 1, 0, max_sum), axis=1)
+    below = numpy.where(targets - 1 < 0, 0., below)
+    num_win = (histograms_me * below).sum(axis=1)
+    num_draw = (histograms_me * pmf).sum(axis=1)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        odds_win = numpy.where(totals > 0, num_win / totals, 0.)
+        odds_draw = numpy.where(totals > 0, num_draw / totals, 0.)
+        odds_lose = numpy.where(totals > 0, 1. - odds_win - odds_draw, 0.)
+    return odds_win, odds_draw, odds_lose
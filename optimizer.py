@@ -0,0 +1,356 @@
+import argparse
+import collections
+import concurrent.futures
+import constants
+import die_or_dare
+import json
+import os
+import random
+import simulation
+import time
+
+JOKER_VALUE_STRATEGIES = (die_or_dare.Thirteen, die_or_dare.SameAsMax,
+                          die_or_dare.RandomNumber, die_or_dare.NextBiggest)
+JOKER_POSITION_STRATEGIES = (die_or_dare.JokerFirst, die_or_dare.JokerLast,
+                             die_or_dare.JokerAnywhere)
+# int bounds make a categorical gene (an index), float bounds a real one
+Gene = collections.namedtuple('Gene', ('name', 'low', 'high', 'default'))
+GENES = (
+    Gene('joker_value', 0, len(JOKER_VALUE_STRATEGIES) - 1, 2),
+    Gene('joker_position', 0, len(JOKER_POSITION_STRATEGIES) - 1, 2),
+    Gene('offense_quantile', 0., 1., 1.),
+    Gene('offense_greed', 0., 1., 0.),
+    Gene('defense_quantile', 0., 1., 0.),
+    Gene('defense_greed', 0., 1., 0.),
+    Gene('margin', -.5, .5, .1),
+    Gene('die_probability', 0., 1., .7),
+)
+Genome = collections.namedtuple('Genome', [gene.name for gene in GENES])
+# the strategies of a ComputerPlayer left to its defaults
+DEFAULT_GENOME = Genome(*(gene.default for gene in GENES))
+PRECISION = 2  # decimals real genes are rounded to, so genomes repeat
+MUTATION_RATE = .2
+MUTATION_SCALE = .15  # standard deviation relative to the range of a gene
+TOURNAMENT_SIZE = 3
+CACHE_VERSION = 2  # bumped whenever the same settings give other fitnesses
+
+
+class ParametrizedOffenseDeck(die_or_dare.OffenseDeckChoiceStrategy):
+    """With probability greed, take the undisclosed deck at the given
+    quantile of the delegates (1 is BiggestOffenseDeck), else any deck.
+
+    Unlike the built-in strategies this is used as an instance, so it can
+    carry its parameters to worker processes.
+    """
+
+    def __init__(self, quantile=1., greed=1.):
+        self.quantile = quantile
+        self.greed = greed
+
+    def apply(self, decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+              num_victory_opponent, num_shout_die_opponent, rng=random):
+        return pick(decks_me.undisclosed, self.quantile, self.greed, rng)
+
+
+class ParametrizedDefenseDeck(die_or_dare.DefenseDeckChoiceStrategy):
+    """Same as ParametrizedOffenseDeck over the opponent's decks (0 is
+    SmallestDefenseDeck).
+    """
+
+    def __init__(self, quantile=0., greed=1.):
+        self.quantile = quantile
+        self.greed = greed
+
+    def apply(self, decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+              num_victory_opponent, num_shout_die_opponent, offense_deck=None,
+              rng=random):
+        return pick(decks_opponent.undisclosed, self.quantile, self.greed,
+                    rng)
+
+
+def pick(decks, quantile, greed, rng):
+    """A greed of 0 or 1 draws nothing to decide, so it plays the same
+    games as AnyOffenseDeck (or AnyDefenseDeck) and the quantile strategy.
+    """
+    if greed >= 1 or greed > 0 and rng.random() < greed:
+        return decks[round(quantile * (len(decks) - 1))]
+    return rng.choice(decks)
+
+
+class ParametrizedActionChoice(die_or_dare.ActionChoiceStrategy):
+    """SimpleActionChoiceStrategy with its odds margin and die probability as
+    parameters: die with probability die_probability when the odds to lose
+    exceed the odds to win by more than margin.
+    """
+
+    def __init__(self, margin=.1, die_probability=.7):
+        self.margin = margin
+        self.die_probability = die_probability
+
+    def apply(self, decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+              num_victory_opponent, num_shout_die_opponent, round_, in_turn,
+              rng=random):
+        if not decks_me.undisclosed_values():
+            return constants.Action.DONE
+        elif round_ in (1, 2):
+            if num_shout_die_me < constants.MAX_DIE:
+                odds_win, odds_draw, odds_lose = (
+                    die_or_dare.ComputerPlayer.get_chances(decks_me,
+                                                           decks_opponent))
+                if in_turn:
+                    odds_lose += odds_draw
+                else:
+                    odds_win += odds_draw
+                if (odds_lose > odds_win + self.margin and
+                        rng.random() < self.die_probability):
+                    return constants.Action.DIE
+            return constants.Action.DARE
+        elif round_ == 3:
+            sum_me = sum(card.value for card in decks_me.in_duel)
+            sum_opponent = sum(card.value for card in decks_opponent.in_duel)
+            if sum_me == sum_opponent:
+                return constants.Action.DRAW
+            return None
+        else:
+            raise Exception('Something went wrong.')
+
+
+def describe_strategy(strategy):
+    """Name a strategy class, or an instance along with its parameters."""
+    if isinstance(strategy, type):
+        return strategy.__name__
+    parameters = ', '.join('{}={!r}'.format(name, value) for name, value in
+                           sorted(vars(strategy).items()))
+    return '{}({})'.format(type(strategy).__name__, parameters)
+
+
+def to_strategies(genome):
+    """Turn a genome into ComputerPlayer keyword arguments."""
+    return {
+        'joker_value_strategy': JOKER_VALUE_STRATEGIES[genome.joker_value],
+        'joker_position_strategy':
+            JOKER_POSITION_STRATEGIES[genome.joker_position],
+        'offense_deck_index_strategy': ParametrizedOffenseDeck(
+            genome.offense_quantile, genome.offense_greed),
+        'defense_deck_index_strategy': ParametrizedDefenseDeck(
+            genome.defense_quantile, genome.defense_greed),
+        'action_choice_strategy': ParametrizedActionChoice(
+            genome.margin, genome.die_probability),
+    }
+
+
+def random_genome(rng):
+    genes = []
+    for gene in GENES:
+        if isinstance(gene.low, int):
+            genes.append(rng.randint(gene.low, gene.high))
+        else:
+            genes.append(round(rng.uniform(gene.low, gene.high), PRECISION))
+    return Genome(*genes)
+
+
+def mutate(genome, rng, rate=MUTATION_RATE, scale=MUTATION_SCALE):
+    genes = []
+    for gene, value in zip(GENES, genome):
+        if rng.random() < rate:
+            if isinstance(gene.low, int):
+                value = rng.randint(gene.low, gene.high)
+            else:
+                value += rng.gauss(0., scale * (gene.high - gene.low))
+                value = round(min(max(value, gene.low), gene.high),
+                              PRECISION)
+        genes.append(value)
+    return Genome(*genes)
+
+
+def crossover(genome1, genome2, rng):
+    """Uniform crossover: every gene from either parent."""
+    return Genome(*(rng.choice(genes) for genes in zip(genome1, genome2)))
+
+
+def select(population, fitnesses, rng, size=TOURNAMENT_SIZE):
+    """Tournament selection."""
+    contenders = rng.sample(range(len(population)), size)
+    return population[max(contenders, key=lambda i: fitnesses[i])]
+
+
+def play_chunk(genome, opponent_strategies, num_games, seed):
+    """Worker entry point: play a chunk of deals from both seats and return
+    the number of wins of the genome.
+
+    Both seats get the same seed, so the genome plays every deal once as
+    Player Red and once in the place of Player Black (paired deals).
+    """
+    strategies = to_strategies(genome)
+    num_wins = 0
+    for red, black, alias in (
+            (strategies, opponent_strategies, constants.PLAYER_RED),
+            (opponent_strategies, strategies, constants.PLAYER_BLACK)):
+        records = simulation.simulate(num_games, red, black, seed)
+        num_wins += sum(1 for record in records if record.winner == alias)
+    return genome, num_wins
+
+
+class Optimizer(object):
+    """Evolve genomes against fixed opponent strategies.
+
+    Every genome plays the same deals, seeded from (master_seed, chunk
+    index) as in tournament.run, so fitnesses compare on equal footing and
+    the fitness of a genome never changes: it is computed once and cached,
+    optionally in a JSON file kept across runs with the same settings.
+    """
+
+    def __init__(self, opponent_strategies=None, games_per_genome=200,
+                 chunk_size=50, max_workers=None, master_seed=0,
+                 cache_path=None):
+        if opponent_strategies is None:
+            opponent_strategies = {}
+        self.opponent_strategies = opponent_strategies
+        self.games_per_genome = games_per_genome
+        self.chunk_size = chunk_size
+        if max_workers is None:
+            max_workers = os.cpu_count()
+        self.max_workers = max_workers
+        self.master_seed = master_seed
+        self.cache_path = cache_path
+        self.cache = {}
+        if cache_path is not None and os.path.exists(cache_path):
+            self.load_cache()
+
+    def evaluate(self, genomes, executor):
+        """Return the win rate of every genome, playing only the genomes
+        that are not in the cache.
+        """
+        num_wins = collections.Counter()
+        futures = []
+        for genome in set(genomes) - set(self.cache):
+            num_chunks = -(-self.games_per_genome // self.chunk_size)
+            for chunk_index in range(num_chunks):
+                start = chunk_index * self.chunk_size
+                num_games = min(self.chunk_size,
+                                self.games_per_genome - start)
+                seed = self.master_seed, chunk_index
+                futures.append(executor.submit(
+                    play_chunk, genome, self.opponent_strategies, num_games,
+                    seed))
+        for future in concurrent.futures.as_completed(futures):
+            genome, chunk_wins = future.result()
+            num_wins[genome] += chunk_wins
+        for genome, wins in num_wins.items():
+            self.cache[genome] = wins / (2 * self.games_per_genome)
+        return [self.cache[genome] for genome in genomes]
+
+    def run(self, population_size=16, num_generations=10, num_elites=2,
+            seed=None, callback=None):
+        """Return the best genome and its fitness after num_generations.
+
+        The first population is the default genome plus random ones; the
+        num_elites best genomes survive every generation unchanged. callback
+        is called with (generation, population, fitnesses), e.g. to report
+        progress.
+        """
+        rng = random.Random(seed)
+        population = [DEFAULT_GENOME]
+        population += [random_genome(rng) for _ in
+                       range(population_size - 1)]
+        with concurrent.futures.ProcessPoolExecutor(
+                self.max_workers) as executor:
+            for generation in range(num_generations):
+                fitnesses = self.evaluate(population, executor)
+                if callback is not None:
+                    callback(generation, population, fitnesses)
+                if self.cache_path is not None:
+                    self.save_cache()
+                if generation == num_generations - 1:
+                    break
+                ranked = sorted(range(population_size),
+                                key=lambda i: fitnesses[i], reverse=True)
+                offspring = [population[i] for i in ranked[:num_elites]]
+                while len(offspring) < population_size:
+                    parent1 = select(population, fitnesses, rng)
+                    parent2 = select(population, fitnesses, rng)
+                    child = mutate(crossover(parent1, parent2, rng), rng)
+                    offspring.append(child)
+                population = offspring
+        best = max(range(population_size), key=lambda i: fitnesses[i])
+        return population[best], fitnesses[best]
+
+    def settings(self):
+        opponent = {key: describe_strategy(strategy) for key, strategy in
+                    sorted(self.opponent_strategies.items())}
+        return {'version': CACHE_VERSION, 'opponent': opponent,
+                'games': self.games_per_genome, 'chunk_size': self.chunk_size,
+                'seed': self.master_seed}
+
+    def save_cache(self):
+        """Write the cache along with the settings it is valid for."""
+        entries = [[list(genome), fitness] for genome, fitness in
+                   self.cache.items()]
+        temporary_path = self.cache_path + '.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump({'settings': self.settings(), 'entries': entries}, file)
+        os.replace(temporary_path, self.cache_path)
+
+    def load_cache(self):
+        with open(self.cache_path) as file:
+            cache = json.load(file)
+        if cache['settings'] != self.settings():
+            raise ValueError('The cache at {} was made with other settings.'
+                             .format(self.cache_path))
+        self.cache = {Genome(*genes): fitness for genes, fitness in
+                      cache['entries']}
+
+
+def describe(genome):
+    return ', '.join('{}={}'.format(name, value) for name, value in
+                     genome._asdict().items())
+
+
+def main(population_size, num_generations, games_per_genome, chunk_size,
+         max_workers, master_seed, cache_path, output_path):
+    optimizer = Optimizer(games_per_genome=games_per_genome,
+                          chunk_size=chunk_size, max_workers=max_workers,
+                          master_seed=master_seed, cache_path=cache_path)
+    start = time.perf_counter()
+
+    def report(generation, population, fitnesses):
+        print('generation {}: best {:.4f}, mean {:.4f}, {} cached, '
+              '{:.1f} seconds'.format(
+                  generation, max(fitnesses),
+                  sum(fitnesses) / len(fitnesses), len(optimizer.cache),
+                  time.perf_counter() - start))
+
+    best, fitness = optimizer.run(population_size, num_generations,
+                                  seed=master_seed, callback=report)
+    print('best {:.4f} against the defaults ({:.4f} for the defaults): '
+          '{}'.format(fitness, optimizer.cache[DEFAULT_GENOME],
+                      describe(best)))
+    if output_path is not None:
+        with open(output_path, 'w') as file:
+            json.dump({'fitness': fitness, 'genome': best._asdict()}, file,
+                      indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Evolve ComputerPlayer strategy parameters against the '
+                    'default strategies.')
+    parser.add_argument('-p', '--population', help='genomes per generation',
+                        type=int, default=16)
+    parser.add_argument('-g', '--generations', type=int, default=10)
+    parser.add_argument('-n', '--games', help='deals per genome, each played '
+                                              'from both seats',
+                        type=int, default=200)
+    parser.add_argument('-c', '--chunk-size', help='games per worker task',
+                        type=int, default=50)
+    parser.add_argument('-w', '--workers', help='number of worker processes',
+                        type=int, default=None)
+    parser.add_argument('-s', '--seed', help='master seed', type=int,
+                        default=0)
+    parser.add_argument('--cache', help='JSON file to keep fitnesses in '
+                                        'across runs', default=None)
+    parser.add_argument('-o', '--output', help='JSON file to write the best '
+                                               'genome to', default=None)
+    args = parser.parse_args()
+    main(args.population, args.generations, args.games, args.chunk_size,
+         args.workers, args.seed, args.cache, args.output)
@@ -0,0 +1,214 @@
+import argparse
+import constants
+import die_or_dare
+import json
+import numpy
+import os
+import time
+
+SEATS = ('red', 'black')
+STRATEGY_ATTRIBUTES = die_or_dare.OutputHandler.STRATEGY_ATTRIBUTES
+# name -> (dtype, shape of one record); categorical columns hold vocab codes
+COLUMNS = {
+    'winner': ('int8', ()),  # 0 for Player Red, 1 for Player Black
+    'game_result': ('int8', ()),
+    'duel_index': ('int8', ()),
+    'duel_states': ('int8', (constants.DECK_PER_PILE,)),
+    'duel_winners': ('int8', (constants.DECK_PER_PILE,)),
+    'time_started': ('float64', ()),
+    'duration': ('float64', ()),
+}
+for seat in SEATS:
+    COLUMNS[seat + '_class'] = ('uint16', ())
+    COLUMNS[seat + '_num_victory'] = ('int8', ())
+    COLUMNS[seat + '_num_shout_die'] = ('int8', ())
+    for attribute in STRATEGY_ATTRIBUTES:
+        COLUMNS['{}_{}'.format(seat, attribute)] = ('uint16', ())
+SCHEMA_FILE_NAME = 'schema.json'
+BUFFER_SIZE = 4096
+
+
+class ResultsStore(object):
+    """Append-only columnar store of game outcomes.
+
+    Every column is a raw file of fixed-width records in a directory, which
+    is read back as a numpy.memmap; class and strategy names are stored as
+    codes into a vocabulary kept in schema.json. Only one process should
+    append to a store at a time.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        schema_path = os.path.join(directory, SCHEMA_FILE_NAME)
+        if os.path.exists(schema_path):
+            with open(schema_path) as file:
+                self.vocabulary = json.load(file)['vocabulary']
+        else:
+            self.vocabulary = []
+        self._codes = {name: code for code, name in enumerate(self.vocabulary)}
+        self._buffer = {name: [] for name in COLUMNS}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def code(self, name):
+        """Return the vocabulary code of a class or strategy name."""
+        if name not in self._codes:
+            self._codes[name] = len(self.vocabulary)
+            self.vocabulary.append(name)
+        return self._codes[name]
+
+    def append(self, game):
+        players = game.players
+        row = {
+            'winner': players.index(game.winner),
+            'game_result': game.result.value,
+            'duel_index': game.duel_index,
+            'duel_states': [duel.to_list()[0] for duel in game.duels],
+            'duel_winners': [duel.to_list()[3] for duel in game.duels],
+            'time_started': game.time_started,
+            'duration': (time.time() if game.time_ended is None else
+                         game.time_ended) - game.time_started,
+        }
+        descriptions = die_or_dare.OutputHandler.describe_players(game)
+        for seat, player, description in zip(SEATS, players, descriptions):
+            row[seat + '_class'] = self.code(description['class'])
+            row[seat + '_num_victory'] = player.num_victory
+            row[seat + '_num_shout_die'] = player.num_shout_die
+            for attribute in STRATEGY_ATTRIBUTES:
+                name = '{}_{}'.format(seat, attribute)
+                row[name] = self.code(str(description[attribute]))
+        for name, value in row.items():
+            self._buffer[name].append(value)
+        if len(self._buffer['winner']) >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer['winner']:
+            return
+        self.append_columns(self._buffer)
+        self._buffer = {name: [] for name in COLUMNS}
+
+    def append_columns(self, columns):
+        """Append records given column by column, e.g. many at once from a
+        batch run: columns maps every name of COLUMNS to its values, with
+        names coded by code().
+        """
+        for name, (dtype, shape) in COLUMNS.items():
+            values = numpy.asarray(columns[name], dtype=dtype)
+            with open(self._column_path(name), 'ab') as file:
+                file.write(values.tobytes())
+        schema = {'vocabulary': self.vocabulary,
+                  'columns': {name: [dtype, list(shape)] for
+                              name, (dtype, shape) in COLUMNS.items()}}
+        schema_path = os.path.join(self.directory, SCHEMA_FILE_NAME)
+        with open(schema_path + '.tmp', 'w') as file:
+            json.dump(schema, file)
+        os.replace(schema_path + '.tmp', schema_path)
+
+    def _column_path(self, name):
+        return os.path.join(self.directory, name + '.bin')
+
+    def __len__(self):
+        dtype, shape = COLUMNS['winner']
+        path = self._column_path('winner')
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // numpy.dtype(dtype).itemsize
+
+    def column(self, name):
+        """Map a column into memory without reading it."""
+        dtype, shape = COLUMNS[name]
+        num_records = len(self)
+        if not num_records:
+            return numpy.zeros((0,) + shape, dtype=dtype)
+        return numpy.memmap(self._column_path(name), dtype=dtype, mode='r',
+                            shape=(num_records,) + shape)
+
+    def win_rates(self, group_by=('joker_value_strategy',)):
+        """Win rate of each combination of strategies over both seats.
+
+        Returns (names, games, wins, win rate) rows sorted by win rate.
+        """
+        winner = numpy.asarray(self.column('winner'))
+        won = numpy.concatenate([winner == seat_index for seat_index in
+                                 range(len(SEATS))])
+        # renumber the names of every column densely, so the keys only span
+        # the names that occur, then combine the columns into one int64 key
+        names = []
+        dense_codes = []
+        for attribute in group_by:
+            codes = numpy.concatenate([self.column('{}_{}'.format(
+                seat, attribute)) for seat in SEATS])
+            present = numpy.bincount(codes, minlength=1) > 0
+            names.append(numpy.flatnonzero(present))
+            dense_codes.append((numpy.cumsum(present) - 1)[codes])
+        shape = tuple(len(column_names) for column_names in names)
+        keys = numpy.ravel_multi_index(dense_codes, shape)
+        if numpy.prod(shape, dtype=float) > len(keys):
+            # more combinations than rows: count the ones that occur
+            occurring, keys = numpy.unique(keys, return_inverse=True)
+        else:
+            occurring = numpy.arange(numpy.prod(shape, dtype='int64'))
+        games = numpy.bincount(keys, minlength=len(occurring))
+        wins = numpy.bincount(keys, weights=won, minlength=len(occurring))
+        table = []
+        for index in numpy.flatnonzero(games):
+            codes = numpy.unravel_index(occurring[index], shape)
+            row_names = tuple(self.vocabulary[column_names[code]] for
+                              column_names, code in zip(names, codes))
+            table.append((row_names, int(games[index]), int(wins[index]),
+                          wins[index] / games[index]))
+        return sorted(table, key=lambda row: row[-1], reverse=True)
+
+    def result_counts(self):
+        counts = numpy.bincount(self.column('game_result'),
+                                minlength=len(constants.GameResult) + 1)
+        return {result: int(counts[result.value]) for result in
+                constants.GameResult}
+
+
+def ingest(store, input_directory_path):
+    """Append the final state of every saved game in a directory."""
+    extensions = ('.json', constants.SNAPSHOT_FILE_EXTENSION,
+                  constants.REPLAY_FILE_EXTENSION)
+    for file_name in sorted(os.listdir(input_directory_path)):
+        if file_name.endswith(extensions):
+            file_path = os.path.join(input_directory_path, file_name)
+            store.append(die_or_dare.OutputHandler.load_final_game(file_path))
+    store.flush()
+
+
+def main(directory, group_by, input_directory_path=None):
+    store = ResultsStore(directory)
+    if input_directory_path is not None:
+        ingest(store, input_directory_path)
+    start = time.perf_counter()
+    table = store.win_rates(group_by)
+    result_counts = store.result_counts()
+    elapsed = time.perf_counter() - start
+    print('{} games, queried in {:.3f} seconds'.format(len(store), elapsed))
+    for names, games, wins, win_rate in table:
+        print('{:.4f} {:>10} {:>10}  {}'.format(win_rate, wins, games,
+                                                '/'.join(names)))
+    for result, count in result_counts.items():
+        print('{:30}{}'.format(result.name, count))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Report win rates from a results store.')
+    parser.add_argument('directory', help='directory of the results store')
+    parser.add_argument('-g', '--group-by', nargs='+',
+                        choices=STRATEGY_ATTRIBUTES,
+                        default=['joker_value_strategy'],
+                        help='strategy families to group by')
+    parser.add_argument('-i', '--ingest', default=None,
+                        help='directory of saved games to append first')
+    args = parser.parse_args()
+    main(args.directory, args.group_by, args.ingest)
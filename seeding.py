@@ -0,0 +1,52 @@
+import constants
+import numpy
+import random
+
+PILE_SIZE = constants.DECK_PER_PILE * constants.CARD_PER_DECK
+
+
+class SeedStream(object):
+    """Reproducible random streams for a batch of games under a master seed.
+
+    The seed may be None (fresh entropy, which is kept in self.seed so the
+    run can be repeated), an int or a sequence of ints such as (master seed,
+    worker, chunk). Every game draws from its own random.Random instances
+    instead of the global random module, and the shuffles of the piles are
+    drawn for many games at once from a NumPy Generator. Game i gets the same
+    streams no matter how many games are drawn at a time.
+    """
+
+    def __init__(self, seed=None):
+        root = numpy.random.SeedSequence(seed)
+        self.seed = root.entropy
+        order_sequence, self._rng_sequence = root.spawn(2)
+        self._generator = numpy.random.default_rng(order_sequence)
+
+    def shuffle_orders(self, num_games):
+        """Return the pile permutations of the next num_games games.
+
+        The result has the shape (num_games, 2, PILE_SIZE), with the orders
+        of Player Red and Player Black (see Player.build_decks) per game.
+        """
+        keys = self._generator.random((num_games, 2, PILE_SIZE))
+        return keys.argsort(axis=-1)
+
+    def rngs(self, num_games, num_streams=2):
+        """Return num_streams random.Random instances for each of the next
+        num_games games, e.g. one per player.
+        """
+        rngs = []
+        for game_sequence in self._rng_sequence.spawn(num_games):
+            streams = []
+            for sequence in game_sequence.spawn(num_streams):
+                state = sequence.generate_state(4, numpy.uint64)
+                streams.append(random.Random(
+                    int.from_bytes(state.tobytes(), 'little')))
+            rngs.append(tuple(streams))
+        return rngs
+
+    def generator(self):
+        """Return a NumPy Generator of its own, e.g. for the random decisions
+        of a batch of games played at once.
+        """
+        return numpy.random.default_rng(self._rng_sequence.spawn(1)[0])
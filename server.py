@@ -0,0 +1,358 @@
+import argparse
+import async_game
+import asyncio
+import constants
+import die_or_dare
+import numpy
+import seeding
+import struct
+import time
+
+# A frame is a header (kind, sequence number, payload length) and a payload.
+# The server asks with a sequence number and ignores answers to older asks,
+# e.g. a shout that arrives after the time to shout is up.
+FRAME_HEADER = struct.Struct('<BBH')
+# client -> server
+JOIN = 0x01  # joker value strategy, joker position strategy, utf-8 name
+DECK = 0x02  # deck index
+SHOUT = 0x03  # action (see encode_action)
+# server -> client; snapshots are made for the seat they are sent to, with
+# the opponent's unopened cards unknown (see Game.snapshot)
+START = 0x81  # seat (0 for Player Red, 1 for Player Black), snapshot
+ASK_OFFENSE_DECK = 0x82  # snapshot
+ASK_DEFENSE_DECK = 0x83  # snapshot
+ASK_SHOUT = 0x84  # in turn, snapshot
+GAME_OVER = 0x85  # snapshot
+JOKER_VALUE_STRATEGIES = (die_or_dare.Thirteen, die_or_dare.SameAsMax,
+                          die_or_dare.RandomNumber, die_or_dare.NextBiggest)
+JOKER_POSITION_STRATEGIES = (die_or_dare.JokerFirst, die_or_dare.JokerLast,
+                             die_or_dare.JokerAnywhere)
+ACTIONS = {action.value: action for action in constants.Action}
+
+
+def encode_action(action):
+    return 0 if action is None else action.value
+
+
+def decode_action(code):
+    return ACTIONS.get(code)
+
+
+def encode_frame(kind, payload=b'', sequence=0):
+    return FRAME_HEADER.pack(kind, sequence, len(payload)) + payload
+
+
+async def read_frame(reader):
+    """Return (kind, sequence number, payload), or None at end of stream or
+    when the connection is reset.
+    """
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+        kind, sequence, length = FRAME_HEADER.unpack(header)
+        payload = await reader.readexactly(length)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    return kind, sequence, payload
+
+
+class Connection(object):
+    """One client; frames are read by a task of their own, so an ask that
+    is cancelled never loses half a frame. closed is set once the client
+    has left or the connection is closed.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.closed = asyncio.get_running_loop().create_future()
+        self._frames = asyncio.Queue()
+        self._sequence = 0
+        self._task = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        while True:
+            frame = await read_frame(self.reader)
+            await self._frames.put(frame)
+            if frame is None:
+                break
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    async def receive(self):
+        frame = await self._frames.get()
+        if frame is None:
+            raise ConnectionError('The client has left.')
+        return frame
+
+    def send(self, kind, payload=b'', sequence=0):
+        self.writer.write(encode_frame(kind, payload, sequence))
+
+    async def ask(self, kind, payload):
+        self._sequence = (self._sequence + 1) % 256
+        self.send(kind, payload, self._sequence)
+        await self.writer.drain()
+        while True:
+            _, sequence, answer = await self.receive()
+            if sequence == self._sequence:
+                return answer
+
+    def close(self):
+        self._task.cancel()
+        self.writer.close()
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+
+class RemotePlayer(die_or_dare.Player):
+    """A player whose decisions arrive over a Connection."""
+
+
+class RemoteSource(async_game.InputSource):
+    """Relay the questions of the game to a client and its answers back.
+
+    Clients get snapshots of the game as their player sees it, so they
+    never learn the opponent's unopened cards.
+    """
+
+    def __init__(self, player, connection):
+        super().__init__(player)
+        self.connection = connection
+
+    async def choose_deck(self, game, is_opponent):
+        kind = ASK_DEFENSE_DECK if is_opponent else ASK_OFFENSE_DECK
+        while True:
+            answer = await self.connection.ask(kind,
+                                               game.snapshot(self.player))
+            if answer and answer[0] < constants.DECK_PER_PILE:
+                return answer[0]
+
+    async def shout(self, game, in_turn):
+        payload = bytes((int(in_turn),)) + game.snapshot(self.player)
+        answer = await self.connection.ask(ASK_SHOUT, payload)
+        return decode_action(answer[0]) if answer else None
+
+
+class Server(object):
+    """Host a table for every two clients that join, all on one event loop.
+    """
+
+    def __init__(self, time_scale=0., seed=None):
+        self.time_scale = time_scale
+        self.seed_stream = seeding.SeedStream(seed)
+        self.waiting = None  # (player, connection) without an opponent yet
+        self.num_tables = 0
+        self.num_games = 0
+
+    async def handle(self, reader, writer):
+        connection = Connection(reader, writer)
+        try:
+            kind, _, payload = await connection.receive()
+        except ConnectionError:
+            connection.close()
+            return
+        if kind != JOIN or len(payload) < 2:
+            connection.close()
+            return
+        rng, = self.seed_stream.rngs(1, 1)[0]
+        value_index, position_index = payload[0], payload[1]
+        player = RemotePlayer(
+            name=payload[2:].decode(errors='replace'),
+            joker_value_strategy=JOKER_VALUE_STRATEGIES[
+                value_index % len(JOKER_VALUE_STRATEGIES)],
+            joker_position_strategy=JOKER_POSITION_STRATEGIES[
+                position_index % len(JOKER_POSITION_STRATEGIES)],
+            rng=rng)
+        if self.waiting is not None and self.waiting[1].closed.done():
+            self.waiting = None  # its client left before an opponent came
+        if self.waiting is None:
+            self.waiting = player, connection
+        else:
+            opponent, opponent_connection = self.waiting
+            self.waiting = None
+            asyncio.ensure_future(self.run_table(
+                ((opponent, opponent_connection), (player, connection))))
+        await connection.closed
+        if self.waiting is not None and self.waiting[1] is connection:
+            self.waiting = None
+        connection.close()
+
+    async def run_table(self, seats):
+        self.num_tables += 1
+        (player_red, connection_red), (player_black, connection_black) = seats
+        game = die_or_dare.Game(player_red, player_black)
+        game.distribute_piles()
+        game.build_decks(self.seed_stream.shuffle_orders(1)[0])
+        sources = {player_red: RemoteSource(player_red, connection_red),
+                   player_black: RemoteSource(player_black, connection_black)}
+        try:
+            for seat, (player, connection) in enumerate(seats):
+                connection.send(START, bytes((seat,)) + game.snapshot(player))
+            await async_game.play(game, sources, time_scale=self.time_scale)
+            self.num_games += 1
+            for player, connection in seats:
+                connection.send(GAME_OVER, game.snapshot(player))
+                await connection.writer.drain()
+        except ConnectionError:
+            pass  # a client left; the table is closed
+        finally:
+            connection_red.close()
+            connection_black.close()
+
+
+async def serve(host='127.0.0.1', port=8888, path=None, time_scale=0.,
+                seed=None):
+    """Run a Server on localhost, or on a Unix socket if path is given."""
+    server = Server(time_scale, seed)
+    if path is None:
+        listener = await asyncio.start_server(server.handle, host, port)
+    else:
+        listener = await asyncio.start_unix_server(server.handle, path)
+    async with listener:
+        await listener.serve_forever()
+
+
+class Bot(object):
+    """A client playing like a ComputerPlayer, for load tests.
+
+    Latencies are the times from sending an answer to a shout until the
+    next frame from the server comes in.
+    """
+
+    def __init__(self, rng):
+        self.player = die_or_dare.ComputerPlayer(rng=rng)
+        self.game = die_or_dare.Game(self.player, die_or_dare.Player())
+        self.latencies = []
+
+    def _seat(self, seat):
+        if seat == 1:
+            self.game = die_or_dare.Game(die_or_dare.Player(), self.player)
+
+    def _opponent(self):
+        duel = self.game.duel_ongoing
+        return duel.defense if self.player == duel.offense else duel.offense
+
+    def restore(self, snapshot):
+        """Load a snapshot, in which the opponent's unopened cards are
+        unknown, and count them from what has been opened instead.
+        """
+        self.game.restore(snapshot)
+        for player in self.game.players:
+            if player is not self.player:
+                player.decks.hidden_counts = (
+                    player.decks.public_hidden_counts())
+
+    def answer(self, kind, payload):
+        if kind == ASK_SHOUT:
+            self.restore(payload[1:])
+            opponent = self._opponent()
+            shout = self.player.shout(opponent.decks, opponent.num_victory,
+                                      opponent.num_shout_die,
+                                      self.game.duel_ongoing.round_,
+                                      bool(payload[0]))
+            return SHOUT, bytes((encode_action(shout.action),))
+        self.restore(payload)
+        opponent = self._opponent()
+        if kind == ASK_OFFENSE_DECK:
+            deck = self.player.decide_offense_deck(opponent.decks,
+                                                   opponent.num_victory,
+                                                   opponent.num_shout_die)
+        else:
+            deck = self.player.decide_defense_deck(opponent.decks,
+                                                   opponent.num_victory,
+                                                   opponent.num_shout_die,
+                                                   self.player.deck_in_duel)
+        return DECK, bytes((deck.index,))
+
+    async def play(self, host='127.0.0.1', port=8888, path=None):
+        if path is None:
+            reader, writer = await asyncio.open_connection(host, port)
+        else:
+            reader, writer = await asyncio.open_unix_connection(path)
+        name = self.player.name.encode()
+        value_index = JOKER_VALUE_STRATEGIES.index(
+            self.player.joker_value_strategy)
+        position_index = JOKER_POSITION_STRATEGIES.index(
+            self.player.joker_position_strategy)
+        writer.write(encode_frame(JOIN, bytes((value_index, position_index)) +
+                                  name))
+        sent = None
+        while True:
+            frame = await read_frame(reader)
+            if sent is not None:
+                self.latencies.append(time.perf_counter() - sent)
+                sent = None
+            if frame is None:
+                break
+            kind, sequence, payload = frame
+            if kind == START:
+                self._seat(payload[0])
+            elif kind == GAME_OVER:
+                self.restore(payload)
+                break
+            else:
+                answer_kind, answer = self.answer(kind, payload)
+                writer.write(encode_frame(answer_kind, answer, sequence))
+                await writer.drain()
+                if answer_kind == SHOUT:
+                    sent = time.perf_counter()
+        writer.close()
+        return self.game
+
+
+async def load(num_tables, concurrency, host='127.0.0.1', port=8888,
+               path=None, seed=None):
+    """Play num_tables games with up to concurrency tables at a time.
+
+    Returns the number of games finished, the elapsed time and the latencies
+    of every shout.
+    """
+    seed_stream = seeding.SeedStream(seed)
+    bots = [Bot(rng) for rng, in seed_stream.rngs(2 * num_tables, 1)]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def play_table(table_bots):
+        async with semaphore:
+            return await asyncio.gather(*(bot.play(host, port, path) for bot
+                                          in table_bots))
+
+    start = time.perf_counter()
+    tables = await asyncio.gather(*(play_table(bots[i:i + 2]) for i in
+                                    range(0, len(bots), 2)))
+    elapsed = time.perf_counter() - start
+    num_finished = sum(1 for games in tables if games[0].is_over())
+    latencies = [latency for bot in bots for latency in bot.latencies]
+    return num_finished, elapsed, latencies
+
+
+def report(num_finished, elapsed, latencies):
+    print('{} tables in {:.3f} seconds ({:.1f} tables/s)'.format(
+        num_finished, elapsed, num_finished / elapsed if elapsed else 0))
+    if latencies:
+        p50, p99 = numpy.percentile(latencies, [50, 99]) * 1000
+        print('shout latency: p50 {:.3f} ms, p99 {:.3f} ms ({} shouts)'.format(
+            p50, p99, len(latencies)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Host many tables of DieOrDare, or load test a host.')
+    parser.add_argument('mode', choices=['serve', 'load'])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8888)
+    parser.add_argument('-u', '--unix', help='path of a Unix socket to use '
+                                             'instead of TCP', default=None)
+    parser.add_argument('-t', '--time-scale', help='factor of every pause',
+                        type=float, default=0.)
+    parser.add_argument('-n', '--tables', help='number of tables to play',
+                        type=int, default=1000)
+    parser.add_argument('-c', '--concurrency', help='tables at a time',
+                        type=int, default=200)
+    parser.add_argument('-s', '--seed', help='master seed', type=int,
+                        default=None)
+    args = parser.parse_args()
+    if args.mode == 'serve':
+        asyncio.run(serve(args.host, args.port, args.unix, args.time_scale,
+                          args.seed))
+    else:
+        report(*asyncio.run(load(args.tables, args.concurrency, args.host,
+                                 args.port, args.unix, args.seed)))
@@ -0,0 +1,139 @@
+import argparse
+import collections
+import constants
+import die_or_dare
+import random
+import results
+import seeding
+import time
+
+CHUNK_SIZE = 1024  # games whose random streams are drawn at a time
+GameRecord = collections.namedtuple(
+    'GameRecord', ('winner', 'result', 'duel_index', 'num_victory_red',
+                   'num_victory_black', 'num_shout_die_red',
+                   'num_shout_die_black'))
+
+
+def play(game):
+    """Play a prepared game to the end without rendering or sleeping."""
+    while not game.is_over():
+        duel = game.to_next_duel()
+        while not duel.is_over():
+            game.prepare()
+            user_input = game.accept()
+            game.process(user_input)
+    return game
+
+
+def new_game(red_strategies=None, black_strategies=None, rngs=None,
+             orders=None):
+    """Set up a game between two ComputerPlayers.
+
+    rngs is a (red, black) pair of random.Random and orders the pile orders
+    of the game (see seeding.SeedStream); the global random module is used
+    for whatever is left out.
+    """
+    if red_strategies is None:
+        red_strategies = {}
+    if black_strategies is None:
+        black_strategies = {}
+    if rngs is None:
+        rngs = random, random
+    rng_red, rng_black = rngs
+    player_red = die_or_dare.ComputerPlayer(rng=rng_red, **red_strategies)
+    player_black = die_or_dare.ComputerPlayer(player_red.name, rng=rng_black,
+                                              **black_strategies)
+    game = die_or_dare.Game(player_red, player_black)
+    game.distribute_piles()
+    game.build_decks(orders)
+    return game
+
+
+def to_record(game):
+    red, black = game.players
+    return GameRecord(game.winner.alias, game.result, game.duel_index,
+                      red.num_victory, black.num_victory, red.num_shout_die,
+                      black.num_shout_die)
+
+
+def simulate(n_games, red_strategies=None, black_strategies=None, seed=None,
+             store=None, chunk_size=CHUNK_SIZE):
+    """Play n_games between two ComputerPlayers and return their records.
+
+    Strategies are given as keyword arguments of ComputerPlayer, e.g.
+    {'joker_value_strategy': die_or_dare.Thirteen}. Player Red always takes
+    the red pile and goes first. Every game is also appended to store, a
+    results.ResultsStore, if one is given.
+
+    Each game draws from its own random streams derived from seed (see
+    seeding.SeedStream), so the same seed gives the same games in any
+    process. The streams and shuffles are drawn chunk_size games at a time
+    to bound memory, which does not change them.
+    """
+    seed_stream = seeding.SeedStream(seed)
+    records = []
+    for start in range(0, n_games, chunk_size):
+        num_games = min(chunk_size, n_games - start)
+        orders = seed_stream.shuffle_orders(num_games)
+        rngs = seed_stream.rngs(num_games)
+        for game_index in range(num_games):
+            game = play(new_game(red_strategies, black_strategies,
+                                 rngs[game_index], orders[game_index]))
+            records.append(to_record(game))
+            if store is not None:
+                store.append(game)
+    return records
+
+
+def summarize(records):
+    winners = collections.Counter(record.winner for record in records)
+    results = collections.Counter(record.result.name for record in records)
+    duels = collections.Counter(record.duel_index + 1 for record in records)
+    return winners, results, duels
+
+
+def main(n_games, seed=None, store_directory=None, instrument=False,
+         instrument_output=None):
+    if instrument or instrument_output is not None:
+        import instrumentation
+        instrumentation.enable()
+    store = None
+    if store_directory is not None:
+        store = results.ResultsStore(store_directory)
+    start = time.perf_counter()
+    records = simulate(n_games, seed=seed, store=store)
+    if store is not None:
+        store.flush()
+    elapsed = time.perf_counter() - start
+    winners, result_counts, duels = summarize(records)
+    print('{} games in {:.3f} seconds ({:.0f} games/s)'.format(
+        n_games, elapsed, n_games / elapsed if elapsed else 0))
+    for alias in (constants.PLAYER_RED, constants.PLAYER_BLACK):
+        print('{:15}{}'.format(alias, winners[alias]))
+    for result, count in sorted(result_counts.items()):
+        print('{:15}{}'.format(result, count))
+    for num_duels, count in sorted(duels.items()):
+        print('{:15}{}'.format('{} duels'.format(num_duels), count))
+    if instrument or instrument_output is not None:
+        print(instrumentation.summary())
+        if instrument_output is not None:
+            instrumentation.dump(instrument_output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Simulate games between computer players headlessly.')
+    parser.add_argument('-n', '--games', help='number of games to simulate',
+                        type=int, default=1000)
+    parser.add_argument('-s', '--seed', help='master seed of the games',
+                        type=int, default=None)
+    parser.add_argument('--store', help='directory of a results store to '
+                                        'append the games to', default=None)
+    parser.add_argument('--instrument', action='store_true',
+                        help='time the phases of the game loop and the '
+                             'strategies and print a summary at the end')
+    parser.add_argument('--instrument-output', default=None,
+                        help='also write the timings to this JSON file')
+    args = parser.parse_args()
+    main(args.games, args.seed, args.store, args.instrument,
+         args.instrument_output)
@@ -0,0 +1,440 @@
+import argparse
+import constants
+import die_or_dare
+import functools
+import itertools
+import numpy
+import os
+import random
+import time
+
+MAX_DECKS = 3  # undisclosed decks per player the table covers
+TABLEBASE_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                   'tablebase.npy')
+# value of a position for the offense of its next duel
+LOSS, UNDECIDED, WIN = 0, 1, 2
+# counters of a position, offense first
+(VICTORY_OFFENSE, VICTORY_DEFENSE, DIE_OFFENSE, DIE_DEFENSE, DRAW_OFFENSE,
+ DRAW_DEFENSE) = range(6)
+COUNTER_SHAPE = ((constants.REQUIRED_WIN,) * 2 +
+                 (constants.MAX_DIE + 1,) * 2 +
+                 (constants.MAX_DRAW + 1,) * 2)
+
+
+@functools.lru_cache(maxsize=None)
+def patterns(max_decks=MAX_DECKS):
+    """Number every pair of (offense, defense) decks up to max_decks decks
+    per player.
+
+    A deck is a (sum, needed) pair, where needed is 1 if its player still has
+    to open it to complete the disclosed mask. Only the order of the sums of
+    the remaining decks matters, so the sums are replaced by dense ranks
+    (equal sums, equal ranks) and each side is sorted. Returns a dict from
+    the pair to its row in the table.
+    """
+    index = {}
+    for num_decks in range(1, max_decks + 1):
+        decks = list(itertools.product(range(2 * num_decks), (0, 1)))
+        sides = list(itertools.combinations_with_replacement(decks,
+                                                             num_decks))
+        for offense in sides:
+            for defense in sides:
+                ranks = {rank for rank, _ in offense + defense}
+                if ranks == set(range(len(ranks))):
+                    index[offense, defense] = len(index)
+    return index
+
+
+def canonicalize(offense_decks, defense_decks):
+    sums = sorted({sum_ for sum_, _ in offense_decks + defense_decks})
+    ranks = {sum_: rank for rank, sum_ in enumerate(sums)}
+    return (tuple(sorted((ranks[sum_], needed) for
+                         sum_, needed in offense_decks)),
+            tuple(sorted((ranks[sum_], needed) for
+                         sum_, needed in defense_decks)))
+
+
+def done_value(offense_decks, defense_decks):
+    """Value for the offense once a player has no needed deck left and
+    shouts done correctly, or None. The shout of the offense has priority.
+    """
+    if not any(needed for _, needed in offense_decks):
+        return WIN
+    if not any(needed for _, needed in defense_decks):
+        return LOSS
+    return None
+
+
+def bump(counters, position):
+    counters = list(counters)
+    counters[position] += 1
+    return tuple(counters)
+
+
+def after_duel(offense_rest, defense_rest, counters, value_of):
+    """Value for the offense of a duel that is over, given the counters after
+    it and the decks left.
+
+    value_of(offense_decks, defense_decks, counters) is the value of a
+    position for the offense of its next duel, which is the defense of this
+    one.
+    """
+    if counters[VICTORY_OFFENSE] == constants.REQUIRED_WIN:
+        return WIN
+    if counters[VICTORY_DEFENSE] == constants.REQUIRED_WIN:
+        return LOSS
+    (victory_offense, victory_defense, die_offense, die_defense, draw_offense,
+     draw_defense) = counters
+    swapped = (victory_defense, victory_offense, die_defense, die_offense,
+               draw_defense, draw_offense)
+    return WIN - value_of(defense_rest, offense_rest, swapped)
+
+
+def showdown(offense_sum, defense_sum, offense_rest, defense_rest, counters,
+             value_of):
+    """Value for the offense when both dare and the sums are compared.
+
+    On equal sums the offense shouts draw if it still can (it has priority),
+    otherwise the defense gets the point without spending its draw.
+    """
+    if offense_sum > defense_sum:
+        return after_duel(offense_rest, defense_rest,
+                          bump(counters, VICTORY_OFFENSE), value_of)
+    value = after_duel(offense_rest, defense_rest,
+                       bump(counters, VICTORY_DEFENSE), value_of)
+    if (offense_sum == defense_sum and
+            counters[DRAW_OFFENSE] < constants.MAX_DRAW):
+        counters = bump(bump(counters, VICTORY_OFFENSE), DRAW_OFFENSE)
+        value = max(value, after_duel(offense_rest, defense_rest, counters,
+                                      value_of))
+    return value
+
+
+def duel_value(offense_sum, defense_sum, offense_rest, defense_rest, counters,
+               value_of):
+    """Value for the offense of a duel between two decks played perfectly.
+
+    A player with no needed deck left among the rest opens the last one in
+    this duel and shouts done, which aborts it (the rounds of a duel are not
+    told apart). Otherwise dying has priority for the offense, so it decides
+    first and the defense only gets to die if the offense dares.
+    """
+    value = done_value(offense_rest, defense_rest)
+    if value is not None:
+        return value
+    value = showdown(offense_sum, defense_sum, offense_rest, defense_rest,
+                     counters, value_of)
+    if counters[DIE_DEFENSE] < constants.MAX_DIE:
+        value = min(value, after_duel(offense_rest, defense_rest,
+                                      bump(counters, DIE_DEFENSE), value_of))
+    if counters[DIE_OFFENSE] < constants.MAX_DIE:
+        value = max(value, after_duel(offense_rest, defense_rest,
+                                      bump(counters, DIE_OFFENSE), value_of))
+    return value
+
+
+def remove(decks, index):
+    return decks[:index] + decks[index + 1:]
+
+
+def best_pair(offense_decks, defense_decks, counters, value_of):
+    """Return the value of a position and the (offense, defense) indexes of
+    the decks the offense should send to the next duel.
+    """
+    best = None
+    for i, offense_deck in enumerate(offense_decks):
+        if offense_deck in offense_decks[:i]:
+            continue  # same deck, same value
+        for j, defense_deck in enumerate(defense_decks):
+            if defense_deck in defense_decks[:j]:
+                continue
+            value = duel_value(offense_deck[0], defense_deck[0],
+                               remove(offense_decks, i),
+                               remove(defense_decks, j), counters, value_of)
+            if best is None or value > best[0]:
+                best = value, i, j
+                if value == WIN:
+                    return best
+    return best
+
+
+class Solver(object):
+    """Exact values of endgame positions, assuming both players know the sums
+    of every remaining deck and which of them are needed to complete each
+    disclosed mask, so a correct done shout ends the game as soon as a player
+    has opened its needed decks.
+
+    Positions reached in different orders are the same once canonicalized,
+    so every value is kept in a transposition table.
+    """
+
+    def __init__(self):
+        self.transpositions = {}
+
+    def value(self, offense_decks, defense_decks, counters):
+        if not offense_decks:
+            return UNDECIDED
+        value = done_value(offense_decks, defense_decks)
+        if value is not None:
+            return value
+        offense_ranks, defense_ranks = canonicalize(offense_decks,
+                                                    defense_decks)
+        key = offense_ranks, defense_ranks, counters
+        value = self.transpositions.get(key)
+        if value is None:
+            value = best_pair(offense_ranks, defense_ranks, counters,
+                              self.value)[0]
+            self.transpositions[key] = value
+        return value
+
+
+def generate(file_path=TABLEBASE_FILE_PATH, max_decks=MAX_DECKS):
+    """Solve every position with up to max_decks decks per player and write
+    the values as a .npy file of shape (len(patterns), *COUNTER_SHAPE).
+    """
+    index = patterns(max_decks)
+    temporary_path = file_path + '.tmp'
+    table = numpy.lib.format.open_memmap(temporary_path, mode='w+',
+                                         dtype=numpy.uint8,
+                                         shape=(len(index),) + COUNTER_SHAPE)
+    solver = Solver()
+    for (offense, defense), row in index.items():
+        for counters in numpy.ndindex(*COUNTER_SHAPE):
+            table[(row,) + counters] = solver.value(offense, defense,
+                                                    counters)
+    table.flush()
+    del table
+    os.replace(temporary_path, file_path)
+    return len(solver.transpositions)
+
+
+class Tablebase(object):
+    """A generated table, mapped into memory; a probe is a dict lookup and
+    an array index.
+    """
+
+    def __init__(self, file_path=TABLEBASE_FILE_PATH):
+        self.table = numpy.load(file_path, mmap_mode='r')
+        self.max_decks = 0
+        while len(patterns(self.max_decks)) < len(self.table):
+            self.max_decks += 1
+        self.index = patterns(self.max_decks)
+
+    def covers(self, num_decks):
+        return num_decks <= self.max_decks
+
+    def probe(self, offense_decks, defense_decks, counters):
+        if not offense_decks:
+            return UNDECIDED
+        row = self.index[canonicalize(offense_decks, defense_decks)]
+        return int(self.table[(row,) + tuple(counters)])
+
+
+_tablebase = None
+
+
+def get_tablebase(file_path=TABLEBASE_FILE_PATH):
+    """Return the Tablebase at file_path, loaded once, or None if it has not
+    been generated.
+    """
+    global _tablebase
+    if _tablebase is None and os.path.exists(file_path):
+        _tablebase = Tablebase(file_path)
+    return _tablebase
+
+
+def expected_sum(deck, hidden_counts):
+    """Sum of a deck with every unopened card at the mean of the hidden cards
+    up to its delegate (a joker counts as the delegate, as in
+    ComputerPlayer.get_chances).
+    """
+    open_values = [card.value for card in deck if card.is_open()]
+    num_hidden = len(deck) - len(open_values)
+    if not num_hidden:
+        return sum(open_values)
+    delegate_value = deck.delegate().value
+    weights = hidden_counts[1:delegate_value + 1]
+    count = sum(weights) + hidden_counts[0]
+    total = (sum(value * weight for value, weight in enumerate(weights, 1)) +
+             hidden_counts[0] * delegate_value)
+    mean = total / count if count else delegate_value
+    return round(sum(open_values) + num_hidden * mean)
+
+
+def needed_flags(decks, known):
+    """Flag the undisclosed decks a player still has to open to complete its
+    disclosed mask: the first smallest set of them that, with the deck in
+    duel, surely holds every value missing from it.
+
+    A deck surely holds the values of its open cards, or of all its cards if
+    known. A missing value no deck surely holds is taken to be among the
+    unopened cards of the decks whose delegate is not below it, as in
+    expected_sum, so all of them have to be opened.
+    """
+    opened = () if decks.in_duel is None else (decks.in_duel,)
+    remaining = opened + decks.undisclosed
+    any_of = []
+    all_of = []
+    for value in range(1, len(constants.Rank) + 1):
+        if decks.disclosed_mask >> value - 1 & 1:
+            continue
+        sure = {index for index, deck in enumerate(remaining) if
+                any(card.value == value for card in deck if
+                    known or card.is_open())}
+        if sure:
+            any_of.append(sure)
+            continue
+        maybe = {index for index, deck in enumerate(remaining) if
+                 not all(card.is_open() for card in deck) and
+                 deck.delegate().value >= value}
+        all_of.append(maybe or set(range(len(remaining))))
+    indexes = range(len(opened), len(remaining))
+    for size in range(len(indexes) + 1):
+        for chosen in itertools.combinations(indexes, size):
+            opened_indexes = set(range(len(opened))) | set(chosen)
+            if (all(sure & opened_indexes for sure in any_of) and
+                    all(maybe <= opened_indexes for maybe in all_of)):
+                return tuple(int(index in chosen) for index in indexes)
+
+
+def position(decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+             num_victory_opponent, num_shout_die_opponent, in_turn):
+    """Return the (sum, needed) pairs of the undisclosed decks and the
+    counters, offense first; draws are not passed to strategies, so they are
+    taken as unused.
+    """
+    sums_me = tuple(sum(card.value for card in deck) for deck in
+                    decks_me.undisclosed)
+    sums_opponent = tuple(expected_sum(deck, decks_opponent.hidden_counts) for
+                          deck in decks_opponent.undisclosed)
+    decks_me = tuple(zip(sums_me, needed_flags(decks_me, True)))
+    decks_opponent = tuple(zip(sums_opponent,
+                               needed_flags(decks_opponent, False)))
+    if in_turn:
+        return decks_me, decks_opponent, (num_victory_me,
+                                          num_victory_opponent,
+                                          num_shout_die_me,
+                                          num_shout_die_opponent, 0, 0)
+    return decks_opponent, decks_me, (num_victory_opponent, num_victory_me,
+                                      num_shout_die_opponent,
+                                      num_shout_die_me, 0, 0)
+
+
+class TablebaseOffenseDeck(die_or_dare.OffenseDeckChoiceStrategy):
+    fallback = die_or_dare.BiggestOffenseDeck
+
+    @classmethod
+    def apply(cls, decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+              num_victory_opponent, num_shout_die_opponent, rng=random):
+        tablebase = get_tablebase()
+        if tablebase is None or not tablebase.covers(
+                len(decks_me.undisclosed)):
+            return cls.fallback.apply(
+                decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+                num_victory_opponent, num_shout_die_opponent, rng=rng)
+        offense_decks, defense_decks, counters = position(
+            decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+            num_victory_opponent, num_shout_die_opponent, True)
+        _, i, _ = best_pair(offense_decks, defense_decks, counters,
+                            tablebase.probe)
+        return decks_me.undisclosed[i]
+
+
+class TablebaseDefenseDeck(die_or_dare.DefenseDeckChoiceStrategy):
+    fallback = die_or_dare.SmallestDefenseDeck
+
+    @classmethod
+    def apply(cls, decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+              num_victory_opponent, num_shout_die_opponent, offense_deck=None,
+              rng=random):
+        tablebase = get_tablebase()
+        if (offense_deck is None or tablebase is None or
+                not tablebase.covers(len(decks_opponent.undisclosed))):
+            return cls.fallback.apply(
+                decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+                num_victory_opponent, num_shout_die_opponent, offense_deck,
+                rng=rng)
+        offense_rest, defense_decks, counters = position(
+            decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+            num_victory_opponent, num_shout_die_opponent, True)
+        offense_sum = sum(card.value for card in offense_deck)
+        values = [duel_value(offense_sum, defense_sum, offense_rest,
+                             remove(defense_decks, j), counters,
+                             tablebase.probe) for
+                  j, (defense_sum, _) in enumerate(defense_decks)]
+        return decks_opponent.undisclosed[values.index(max(values))]
+
+
+class TablebaseActionChoice(die_or_dare.ActionChoiceStrategy):
+    fallback = die_or_dare.SimpleActionChoiceStrategy
+
+    @classmethod
+    def apply(cls, decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+              num_victory_opponent, num_shout_die_opponent, round_, in_turn,
+              rng=random):
+        tablebase = get_tablebase()
+        position_ = None
+        if (tablebase is not None and round_ in (2, 3) and
+                tablebase.covers(len(decks_me.undisclosed))):
+            position_ = position(
+                decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+                num_victory_opponent, num_shout_die_opponent, in_turn)
+        # a player who completes its mask in this duel shouts done instead
+        if position_ is None or done_value(*position_[:2]) is not None:
+            return cls.fallback.apply(
+                decks_me, decks_opponent, num_victory_me, num_shout_die_me,
+                num_victory_opponent, num_shout_die_opponent, round_, in_turn,
+                rng=rng)
+        offense_rest, defense_rest, counters = position_
+        sum_me = sum(card.value for card in decks_me.in_duel)
+        sum_opponent = expected_sum(decks_opponent.in_duel,
+                                    decks_opponent.hidden_counts)
+        if round_ == 3:
+            if in_turn and sum_me == sum_opponent:
+                return constants.Action.DRAW
+            return None
+        if num_shout_die_me == constants.MAX_DIE:
+            return constants.Action.DARE
+        offense_sum, defense_sum = ((sum_me, sum_opponent) if in_turn else
+                                    (sum_opponent, sum_me))
+        dare = showdown(offense_sum, defense_sum, offense_rest, defense_rest,
+                        counters, tablebase.probe)
+        if in_turn:
+            if num_shout_die_opponent < constants.MAX_DIE:
+                dare = min(dare, after_duel(offense_rest, defense_rest,
+                                            bump(counters, DIE_DEFENSE),
+                                            tablebase.probe))
+            die = after_duel(offense_rest, defense_rest,
+                             bump(counters, DIE_OFFENSE), tablebase.probe)
+            better = die > dare
+        else:
+            die = after_duel(offense_rest, defense_rest,
+                             bump(counters, DIE_DEFENSE), tablebase.probe)
+            better = die < dare
+        if better:
+            return constants.Action.DIE
+        return constants.Action.DARE
+
+
+def main(file_path=TABLEBASE_FILE_PATH, max_decks=MAX_DECKS):
+    start = time.perf_counter()
+    num_positions = generate(file_path, max_decks)
+    elapsed = time.perf_counter() - start
+    table = numpy.load(file_path, mmap_mode='r')
+    print('{} entries ({} positions solved) written to {} in {:.3f} '
+          'seconds'.format(table.size, num_positions, file_path, elapsed))
+    values = numpy.bincount(table.ravel(), minlength=WIN + 1)
+    for name, value in (('LOSS', LOSS), ('UNDECIDED', UNDECIDED),
+                        ('WIN', WIN)):
+        print('{:30}{}'.format(name, values[value]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Solve the last duels of DieOrDare into a tablebase.')
+    parser.add_argument('-o', '--output', help='path of the .npy file',
+                        default=TABLEBASE_FILE_PATH)
+    parser.add_argument('-k', '--max-decks', type=int, default=MAX_DECKS,
+                        help='undisclosed decks per player to cover')
+    args = parser.parse_args()
+    main(args.output, args.max_decks)
@@ -0,0 +1,186 @@
+import argparse
+import collections
+import concurrent.futures
+import constants
+import die_or_dare
+import inspect
+import itertools
+import os
+import simulation
+import time
+
+STRATEGY_FAMILIES = (
+    ('joker_value_strategy', die_or_dare.JokerValueStrategy),
+    ('joker_position_strategy', die_or_dare.JokerPositionStrategy),
+    ('offense_deck_index_strategy', die_or_dare.OffenseDeckChoiceStrategy),
+    ('defense_deck_index_strategy', die_or_dare.DefenseDeckChoiceStrategy),
+    ('action_choice_strategy', die_or_dare.ActionChoiceStrategy),
+)
+
+
+def concrete_strategies(base):
+    strategies = []
+    for subclass in base.__subclasses__():
+        if not inspect.isabstract(subclass):
+            strategies.append(subclass)
+        strategies.extend(concrete_strategies(subclass))
+    return strategies
+
+
+def strategy_combinations(families=STRATEGY_FAMILIES):
+    """Yield every combination of concrete strategies as ComputerPlayer kwargs.
+    """
+    keys = [key for key, _ in families]
+    choices = [concrete_strategies(base) for _, base in families]
+    for combination in itertools.product(*choices):
+        yield dict(zip(keys, combination))
+
+
+def describe(strategies):
+    return '/'.join(strategies[key].__name__ for key, _ in STRATEGY_FAMILIES
+                    if key in strategies)
+
+
+class PairingStats(object):
+    def __init__(self):
+        self.num_games = 0
+        self.wins = collections.Counter()
+        self.results = collections.Counter()
+        self.duels = collections.Counter()
+
+    def add(self, records):
+        for record in records:
+            self.num_games += 1
+            self.wins[record.winner] += 1
+            self.results[record.result] += 1
+            self.duels[record.duel_index + 1] += 1
+
+    def merge(self, other):
+        self.num_games += other.num_games
+        self.wins.update(other.wins)
+        self.results.update(other.results)
+        self.duels.update(other.duels)
+
+    def win_rate(self, alias):
+        if not self.num_games:
+            return 0.
+        return self.wins[alias] / self.num_games
+
+    def mean_duels(self):
+        if not self.num_games:
+            return 0.
+        total = sum(num * count for num, count in self.duels.items())
+        return total / self.num_games
+
+
+def play_batch(pairing_index, red_strategies, black_strategies, num_games,
+               seed):
+    """Worker entry point; returns the stats of one chunk of a pairing."""
+    stats = PairingStats()
+    records = simulation.simulate(num_games, red_strategies, black_strategies,
+                                  seed)
+    stats.add(records)
+    return pairing_index, stats
+
+
+def chunk_seed(master_seed, pairing_index, chunk_index):
+    # see seeding.SeedStream
+    return master_seed, pairing_index, chunk_index
+
+
+def run(pairings, games_per_pairing, chunk_size=50, max_workers=None,
+        master_seed=0):
+    """Play every (red, black) pairing across a pool of worker processes.
+
+    Each pairing is split into chunks of chunk_size games, and each chunk is
+    seeded from (master_seed, pairing index, chunk index), so the outcome does
+    not depend on the number of workers or the order of completion.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count()
+    stats = [PairingStats() for _ in pairings]
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = []
+        for pairing_index, (red, black) in enumerate(pairings):
+            num_chunks = -(-games_per_pairing // chunk_size)
+            for chunk_index in range(num_chunks):
+                start = chunk_index * chunk_size
+                num_games = min(chunk_size, games_per_pairing - start)
+                seed = chunk_seed(master_seed, pairing_index, chunk_index)
+                future = executor.submit(play_batch, pairing_index, red, black,
+                                         num_games, seed)
+                futures.append(future)
+        for future in concurrent.futures.as_completed(futures):
+            pairing_index, chunk_stats = future.result()
+            stats[pairing_index].merge(chunk_stats)
+    return stats
+
+
+def round_robin(combinations):
+    """Pair every combination with every other one in both seats."""
+    return list(itertools.product(combinations, repeat=2))
+
+
+def export_csv(pairings, stats, file_path):
+    results = list(constants.GameResult)
+    with open(file_path, 'w') as output:
+        column_names = ['red_strategies', 'black_strategies', 'games',
+                        'red_win_rate', 'black_win_rate', 'mean_duels']
+        column_names += [result.name.lower() for result in results]
+        output.write(','.join(column_names) + '\n')
+        for (red, black), pairing_stats in zip(pairings, stats):
+            row = [describe(red), describe(black), pairing_stats.num_games,
+                   round(pairing_stats.win_rate(constants.PLAYER_RED), 4),
+                   round(pairing_stats.win_rate(constants.PLAYER_BLACK), 4),
+                   round(pairing_stats.mean_duels(), 3)]
+            row += [pairing_stats.results[result] for result in results]
+            output.write(','.join(str(element) for element in row) + '\n')
+
+
+def standings(pairings, stats):
+    """Aggregate win rates of each combination over both seats."""
+    totals = collections.defaultdict(PairingStats)
+    wins = collections.Counter()
+    for (red, black), pairing_stats in zip(pairings, stats):
+        for strategies, alias in ((red, constants.PLAYER_RED),
+                                  (black, constants.PLAYER_BLACK)):
+            name = describe(strategies)
+            totals[name].merge(pairing_stats)
+            wins[name] += pairing_stats.wins[alias]
+    table = [(wins[name] / total.num_games, name) for name, total in
+             totals.items()]
+    return sorted(table, reverse=True)
+
+
+def main(games_per_pairing, chunk_size, max_workers, master_seed,
+         output_path):
+    combinations = list(strategy_combinations())
+    pairings = round_robin(combinations)
+    start = time.perf_counter()
+    stats = run(pairings, games_per_pairing, chunk_size, max_workers,
+                master_seed)
+    elapsed = time.perf_counter() - start
+    num_games = sum(pairing_stats.num_games for pairing_stats in stats)
+    print('{} pairings, {} games in {:.1f} seconds'.format(
+        len(pairings), num_games, elapsed))
+    for win_rate, name in standings(pairings, stats):
+        print('{:.4f}  {}'.format(win_rate, name))
+    if output_path is not None:
+        export_csv(pairings, stats, output_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Play a round-robin tournament between strategies.')
+    parser.add_argument('-n', '--games', help='number of games per pairing',
+                        type=int, default=100)
+    parser.add_argument('-c', '--chunk-size', help='games per worker task',
+                        type=int, default=50)
+    parser.add_argument('-w', '--workers', help='number of worker processes',
+                        type=int, default=None)
+    parser.add_argument('-s', '--seed', help='master seed', type=int,
+                        default=0)
+    parser.add_argument('-o', '--output', help='CSV file to write per-pairing '
+                                               'results to', default=None)
+    args = parser.parse_args()
+    main(args.games, args.chunk_size, args.workers, args.seed, args.output)